@@ -0,0 +1,225 @@
+"""
+Admission Control Module
+
+Limits how much OCR work a worker runs at once. Each job's memory is
+estimated from the image dimensions in the file header, before anything is
+decoded. Jobs are admitted while they fit in a per-worker memory budget and
+concurrency limit. The rest wait in a bounded queue for a bounded time, and
+are rejected (HTTP 429) when the queue is full or the wait runs out.
+"""
+
+import struct
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+# JPEG start-of-frame markers that carry the image size
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot be admitted; ``retry_after`` is a hint in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _jpeg_size(f) -> Optional[Tuple[int, int]]:
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue  # Markers without a length field
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker in _JPEG_SOF_MARKERS:
+            header = f.read(5)
+            if len(header) < 5:
+                return None
+            height, width = struct.unpack('>HH', header[1:5])
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def read_image_size(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Read the pixel dimensions of a JPEG or PNG image from its header.
+
+    Args:
+        path (str): Path of the image file.
+
+    Returns:
+        Optional[Tuple[int, int]]: ``(width, height)``, or None when the
+        format is not recognised or the header is damaged.
+    """
+    with open(path, 'rb') as f:
+        signature = f.read(24)
+        if signature[:8] == b'\x89PNG\r\n\x1a\n' and signature[12:16] == b'IHDR':
+            return struct.unpack('>II', signature[16:24])
+        if signature[:2] == b'\xff\xd8':
+            return _jpeg_size(f)
+    return None
+
+
+def estimate_job_bytes(size: Optional[Tuple[int, int]], bytes_per_pixel: float,
+                       overhead_bytes: int, default_bytes: int) -> int:
+    """
+    Estimate the peak memory of an OCR job.
+
+    Args:
+        size (Tuple[int, int]): Image ``(width, height)`` or None if unknown.
+        bytes_per_pixel (float): Peak bytes held per source pixel (decoded
+                                 image, rotated and grayscale copies, OCR
+                                 working buffers).
+        overhead_bytes (int): Fixed cost of any job.
+        default_bytes (int): Estimate used when the size is unknown.
+
+    Returns:
+        int: Estimated peak bytes.
+    """
+    if not size:
+        return default_bytes
+    width, height = size
+    return int(width * height * bytes_per_pixel) + overhead_bytes
+
+
+class AdmissionController:
+    """
+    Admits jobs against a memory budget and a concurrency limit.
+
+    Waiting jobs are served in arrival order, so a large job at the head of
+    the queue is not starved by a stream of small ones. A job larger than
+    the whole budget is admitted only when nothing else is running.
+    """
+
+    def __init__(self, memory_budget: int, max_concurrent: int, max_queue: int, max_wait: float):
+        """
+        Initialize the AdmissionController.
+
+        Args:
+            memory_budget (int): Bytes that running jobs may use together.
+            max_concurrent (int): Jobs that may run at the same time.
+            max_queue (int): Jobs that may wait; further jobs are rejected.
+            max_wait (float): Seconds a job waits before it is rejected.
+        """
+        self.memory_budget = memory_budget
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._running = 0
+        self._in_use = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._mean_seconds = 1.0
+
+    def _fits(self, cost: int) -> bool:
+        if self._running >= self.max_concurrent:
+            return False
+        return self._running == 0 or self._in_use + cost <= self.memory_budget
+
+    def _retry_after(self) -> int:
+        # Time for the jobs ahead to drain, with at least one second
+        pending = self._running + len(self._queue)
+        return max(1, int(round(self._mean_seconds * pending / self.max_concurrent)))
+
+    def acquire(self, cost: int) -> int:
+        """
+        Wait until a job of ``cost`` bytes may run.
+
+        Args:
+            cost (int): Estimated peak bytes of the job.
+
+        Returns:
+            int: The cost charged against the budget, to pass to ``release``.
+
+        Raises:
+            AdmissionRejected: The queue is full or the wait timed out.
+        """
+        cost = min(cost, self.memory_budget)
+        with self._condition:
+            if not self._queue and self._fits(cost):
+                return self._admit(cost)
+            if len(self._queue) >= self.max_queue:
+                self._rejected += 1
+                raise AdmissionRejected('Too many OCR jobs queued', self._retry_after())
+
+            ticket = object()
+            self._queue.append(ticket)
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while not (self._queue[0] is ticket and self._fits(cost)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise AdmissionRejected('Timed out waiting for OCR capacity', self._retry_after())
+                    self._condition.wait(remaining)
+            finally:
+                self._queue.remove(ticket)
+                # The next job in line may fit now that this one left the queue
+                self._condition.notify_all()
+            return self._admit(cost)
+
+    def _admit(self, cost: int) -> int:
+        self._running += 1
+        self._in_use += cost
+        self._admitted += 1
+        return cost
+
+    def release(self, cost: int, seconds: Optional[float] = None):
+        """
+        Return a job's budget.
+
+        Args:
+            cost (int): The value returned by ``acquire``.
+            seconds (float): How long the job ran, used for Retry-After hints.
+        """
+        with self._condition:
+            self._running -= 1
+            self._in_use -= cost
+            if seconds is not None:
+                self._mean_seconds = 0.8 * self._mean_seconds + 0.2 * seconds
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, cost: int):
+        """Run the body of a ``with`` block once the job is admitted"""
+        charged = self.acquire(cost)
+        started = time.perf_counter()
+        try:
+            yield charged
+        finally:
+            self.release(charged, time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get a snapshot of the admission state.
+
+        Returns:
+            Dict[str, Any]: Running and waiting jobs, memory in use and the
+            configured limits, plus admitted and rejected totals.
+        """
+        with self._condition:
+            return {
+                'running': self._running,
+                'waiting': len(self._queue),
+                'memory_in_use_mb': round(self._in_use / 2 ** 20, 1),
+                'memory_budget_mb': round(self.memory_budget / 2 ** 20, 1),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'admitted': self._admitted,
+                'rejected': self._rejected
+            }
@@ -0,0 +1,184 @@
+"""
+Spend Analytics Module
+
+Grouped spend aggregates (sum, count, mean, percentiles) over the processed
+receipts in the report index, computed with vectorized pandas operations.
+
+The receipts are held in memory as one DataFrame per process. It is kept up
+to date incrementally: the index's change counter is polled, and when only
+new reports were added since the last look, just those rows are read and
+appended. Any other change (updates, removals) triggers a full reload.
+Aggregates are cached per query and dropped whenever the data changes.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+GROUP_KEYS = ['category', 'merchant', 'currency', 'day', 'week', 'month', 'quarter', 'year']
+LOADED_COLUMNS = ['date', 'amount', 'currency', 'category', 'merchant', 'date_defaulted']
+PERIOD_KEYS = ['day', 'week', 'month', 'quarter', 'year']
+UNDATED = 'undated'
+MAX_CACHED_QUERIES = 128
+
+
+def _derive_columns(frame):
+    """
+    Add period columns from the receipt date, vectorized over the whole frame.
+
+    Receipts whose date was not read (defaulted to the day they were
+    processed) have no date here: they fall in the undated periods and out
+    of date ranges.
+    """
+    import pandas as pd
+
+    defaulted = frame['date_defaulted'].fillna(0).astype(bool)
+    frame['date'] = frame['date'].where(~defaulted)
+    # Dates are stored as YYYY-MM-DD, so periods are slices of the valid ones
+    dates = pd.to_datetime(frame['date'], format='%Y-%m-%d', errors='coerce')
+    day = frame['date'].astype('string').where(dates.notna())
+    frame['day'] = day
+    frame['month'] = day.str[:7]
+    frame['year'] = day.str[:4]
+    frame['quarter'] = frame['year'] + '-Q' + ((dates.dt.month - 1) // 3 + 1).astype('Int64').astype('string')
+    iso = dates.dt.isocalendar()
+    frame['week'] = iso['year'].astype('string') + '-W' + iso['week'].astype('string').str.zfill(2)
+    for column in PERIOD_KEYS:
+        frame[column] = frame[column].fillna(UNDATED)
+    frame['category'] = frame['category'].fillna('Uncategorized')
+    frame['merchant'] = frame['merchant'].fillna('Unknown Merchant')
+    frame['currency'] = frame['currency'].fillna('USD')
+    frame['amount'] = pd.to_numeric(frame['amount'], errors='coerce')
+    return frame
+
+
+class SpendAnalytics:
+    """
+    In-memory, incrementally maintained spend data with cached aggregates.
+    """
+
+    def __init__(self, report_index):
+        """
+        Initialize the SpendAnalytics.
+
+        Args:
+            report_index (ReportIndex): Source of the processed receipts.
+        """
+        self.report_index = report_index
+        self._lock = threading.Lock()
+        self._frame = None
+        self._version = None
+        self._last_rowid = 0
+        self._cache: 'OrderedDict[Any, Dict[str, Any]]' = OrderedDict()
+
+    def _read_rows(self, after_rowid: int):
+        import pandas as pd
+
+        rows = self.report_index.rows_after(after_rowid, LOADED_COLUMNS)
+        frame = pd.DataFrame.from_records(rows, columns=['rowid'] + LOADED_COLUMNS)
+        return _derive_columns(frame)
+
+    def refresh(self) -> bool:
+        """
+        Bring the in-memory data up to date with the index.
+
+        Returns:
+            bool: True if the data changed since the last call.
+        """
+        import pandas as pd
+
+        version = self.report_index.version()
+        with self._lock:
+            if version == self._version and self._frame is not None:
+                return False
+            appended = self._read_rows(self._last_rowid) if self._frame is not None else None
+            # Appends alone advance the version by one per new row; anything else needs a reload
+            if appended is not None and self._version + len(appended) == version:
+                self._frame = pd.concat([self._frame, appended], ignore_index=True) if len(appended) else self._frame
+            else:
+                self._frame = self._read_rows(0)
+            if len(self._frame):
+                self._last_rowid = int(self._frame['rowid'].iloc[-1])
+            self._version = version
+            self._cache.clear()
+            return True
+
+    def summary(self, group_by: Sequence[str] = ('category',), percentiles: Sequence[float] = (50, 90),
+                date_from: Optional[str] = None, date_to: Optional[str] = None,
+                category: Optional[str] = None, merchant: Optional[str] = None,
+                currency: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Aggregate spend by one or more keys.
+
+        Amounts in different currencies are never added up: ``currency`` is
+        always one of the group keys.
+
+        Args:
+            group_by (Sequence[str]): Keys from GROUP_KEYS, e.g. ('category', 'month').
+            percentiles (Sequence[float]): Percentiles of the amount (0-100).
+            date_from (str): Earliest receipt date (YYYY-MM-DD), inclusive.
+            date_to (str): Latest receipt date (YYYY-MM-DD), inclusive.
+            category (str): Only this category.
+            merchant (str): Only merchants starting with this, case-insensitive.
+            currency (str): Only this currency.
+
+        Returns:
+            Dict[str, Any]: ``groups`` (one dict per group with the keys,
+            ``count``, ``total``, ``mean`` and ``p<N>`` values), ``receipts``
+            matched and ``cached`` (whether the result came from the cache).
+
+        Raises:
+            ValueError: Unknown group key or percentile out of range.
+        """
+        keys = list(dict.fromkeys(list(group_by) + ['currency']))
+        unknown = set(keys) - set(GROUP_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown group keys: {', '.join(sorted(unknown))}")
+        percentiles = sorted(set(float(p) for p in percentiles))
+        if any(p < 0 or p > 100 for p in percentiles):
+            raise ValueError('Percentiles must be between 0 and 100')
+
+        self.refresh()
+        cache_key = (tuple(keys), tuple(percentiles), date_from, date_to, category,
+                     merchant.lower() if merchant else None, currency)
+        with self._lock:
+            frame = self._frame
+            if cache_key in self._cache:
+                self._cache.move_to_end(cache_key)
+                return dict(self._cache[cache_key], cached=True)
+
+        result = self._aggregate(frame, keys, percentiles, date_from, date_to, category, merchant, currency)
+        with self._lock:
+            # Only cache results computed from the current data
+            if frame is self._frame:
+                self._cache[cache_key] = result
+                if len(self._cache) > MAX_CACHED_QUERIES:
+                    self._cache.popitem(last=False)
+        return dict(result, cached=False)
+
+    @staticmethod
+    def _aggregate(frame, keys: List[str], percentiles: List[float], date_from, date_to,
+                   category, merchant, currency) -> Dict[str, Any]:
+        mask = frame['amount'].notna()
+        if date_from:
+            mask &= frame['date'] >= date_from
+        if date_to:
+            mask &= frame['date'] <= date_to
+        if category:
+            mask &= frame['category'] == category
+        if merchant:
+            mask &= frame['merchant'].str.lower().str.startswith(merchant.lower())
+        if currency:
+            mask &= frame['currency'] == currency.upper()
+        selected = frame.loc[mask, keys + ['amount']]
+
+        grouped = selected.groupby(keys, sort=True)['amount']
+        table = grouped.agg(['count', 'sum', 'mean']).rename(columns={'sum': 'total'})
+        if percentiles and len(selected):
+            quantiles = grouped.quantile([p / 100.0 for p in percentiles]).unstack()
+            quantiles.columns = [f"p{p:g}" for p in percentiles]
+            table = table.join(quantiles)
+        table = table.round(2).reset_index()
+
+        groups = table.astype(object).where(table.notna(), None).to_dict(orient='records')
+        return {'group_by': keys, 'groups': groups, 'receipts': int(len(selected))}
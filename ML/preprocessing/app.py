@@ -1,33 +1,136 @@
+from __future__ import annotations
+
 import os
 import json
 import re
 import uuid
-import cv2
-import numpy as np
-import easyocr
-import requests
+import hmac
+import functools
+import logging
 from datetime import datetime, date
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Tuple, Union
-from flask import Flask, request, jsonify, send_file, make_response
+from flask import Flask, request, jsonify, send_file, make_response, g
 from flask_cors import CORS
-import pandas as pd
-from PIL import Image
-import io
-from odoo.ML.preprocessing.report_generator import ReportGenerator
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+# Heavy dependencies (cv2, numpy, easyocr/torch, pandas, TextBlob, requests)
+# are imported at first use so that importing the app stays fast
+from odoo.ML.preprocessing.ocr_engine import ReaderPool, read_text, downscale, correct_orientation
+from odoo.ML.preprocessing.ocr_workers import OcrProcessPool
+from odoo.ML.preprocessing import metrics
+from odoo.ML.preprocessing.autotune import load_tuning
+from odoo.ML.preprocessing.admission import (
+    AdmissionController, AdmissionRejected, estimate_job_bytes, read_image_size
+)
+from odoo.ML.preprocessing.profiler import SamplingProfiler
+from odoo.ML.preprocessing.storage import LocalStorage, RetentionCollector
+from odoo.ML.preprocessing import report_codec
+from odoo.ML.preprocessing.analytics import SpendAnalytics
+from odoo.ML.preprocessing.expense_dataset import ExpenseDatasetWriter, expense_record
+from odoo.ML.preprocessing.expense_dataset import available as dataset_available
+from odoo.ML.preprocessing.expense_duplicates import ExpenseDuplicateIndex
+from odoo.ML.preprocessing.archival import CONTENT_TYPES, archive_upload, extension_for
+from odoo.ML.preprocessing.image_hash import DEFAULT_MAX_DISTANCE, phash, to_hex
+from odoo.ML.preprocessing.report_index import ReportIndex, file_sha256, record_from_report, text_from_report
+from odoo.ML.preprocessing.structured_logging import configure_logging, set_correlation_id
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+tuning = load_tuning()  # Best thread/pool configuration measured by autotune.py on this machine
 app.config.update(
     UPLOAD_FOLDER='uploads',
     REPORTS_FOLDER='reports',
     MAX_CONTENT_LENGTH=16 * 1024 * 1024,  # 16MB max file size
     SECRET_KEY=os.urandom(24),
-    REST_COUNTRIES_API='https://restcountries.com/v3.1/all?fields=name,currencies',
-    EXCHANGE_RATE_API='https://api.exchangerate-api.com/v4/latest/{}',
-    DEFAULT_CURRENCY='INR'
+    REST_COUNTRIES_API=os.environ.get(
+        'REST_COUNTRIES_API', 'https://restcountries.com/v3.1/all?fields=name,currencies'),
+    EXCHANGE_RATE_API=os.environ.get(
+        'EXCHANGE_RATE_API', 'https://api.exchangerate-api.com/v4/latest/{}'),
+    DEFAULT_CURRENCY='INR',
+    OCR_READER_POOL_SIZE=int(os.environ.get(
+        'OCR_READER_POOL_SIZE', tuning.get('reader_pool_size', 1))),  # EasyOCR readers per process
+    OCR_TORCH_THREADS=int(os.environ.get(
+        'OCR_TORCH_THREADS', tuning.get('torch_threads', 0))),  # Intra-op threads per process, 0 = all cores
+    OCR_PROCESS_WORKERS=int(os.environ.get('OCR_PROCESS_WORKERS', 0)),  # >0 runs OCR in that many processes
+    OCR_PROGRESSIVE=True,  # Try a low-resolution pass before full resolution
+    OCR_LOW_RES_MAX_SIDE=960,  # Longest side (px) of the low-resolution pass
+    OCR_MIN_CONFIDENCE=0.5,  # Mean confidence required to accept the low-res pass
+    OCR_TOTAL_TOLERANCE=0.01,  # Allowed shortfall of the total against the item sum
+    OCR_MAX_SURCHARGE=0.35,  # Allowed tax/service excess of the total over the item sum
+    OCR_AUTO_ORIENT=True,  # Fix rotated and skewed photos before OCR
+    OCR_ORIENT_MAX_SIDE=800,  # Longest side (px) of the orientation thumbnail
+    OCR_MAX_SKEW=10.0,  # Largest skew angle (degrees) corrected
+    DUPLICATE_DETECTION=os.environ.get('DUPLICATE_DETECTION', '1') == '1',  # Flag photos of earlier receipts
+    DUPLICATE_MAX_DISTANCE=int(os.environ.get(
+        'DUPLICATE_MAX_DISTANCE', DEFAULT_MAX_DISTANCE)),  # pHash bits that may differ (max 31)
+    DUPLICATE_MAX_RESULTS=5,  # Earlier receipts listed per upload
+    DUPLICATE_REUSE_OCR=os.environ.get(
+        'DUPLICATE_REUSE_OCR', '0') == '1',  # Take a confirmed duplicate's text instead of full-res OCR
+    EXPENSE_DUPLICATE_DETECTION=os.environ.get(
+        'EXPENSE_DUPLICATE_DETECTION', '1') == '1',  # Flag expenses matching earlier ones field by field
+    EXPENSE_DUPLICATE_TOLERANCE=float(os.environ.get(
+        'EXPENSE_DUPLICATE_TOLERANCE', 0.01)),  # Largest amount difference of duplicate expenses
+    OCR_WARMUP_IMAGE=os.environ.get('OCR_WARMUP_IMAGE', str(
+        Path(__file__).resolve().parents[2] / 'realistic_test_receipts' / 'receipt_realistic_01.jpg')),
+    WARMUP_RETRY_SECONDS=float(os.environ.get(
+        'WARMUP_RETRY_SECONDS', 5)),  # Wait before retrying a failed warm-up, doubled per failure
+    WARMUP_RETRY_MAX_SECONDS=300,  # Longest wait between warm-up attempts
+    READY_MAX_QUEUE_DEPTH=int(os.environ.get('READY_MAX_QUEUE_DEPTH', 4)),  # Waiting OCR calls before not-ready
+    ADMISSION_MEMORY_BUDGET_MB=int(os.environ.get('ADMISSION_MEMORY_BUDGET_MB', 1536)),  # Per worker
+    ADMISSION_MAX_CONCURRENT=int(os.environ.get('ADMISSION_MAX_CONCURRENT', 2)),  # OCR jobs running per worker
+    ADMISSION_MAX_QUEUE=int(os.environ.get('ADMISSION_MAX_QUEUE', 8)),  # OCR jobs waiting per worker
+    ADMISSION_MAX_WAIT=float(os.environ.get('ADMISSION_MAX_WAIT', 15.0)),  # Seconds before a 429
+    ADMISSION_BYTES_PER_PIXEL=24,  # Peak bytes per source pixel: decoded, rotated and gray copies plus OCR buffers
+    ADMISSION_JOB_OVERHEAD_MB=32,  # Fixed cost of every OCR job
+    ADMISSION_UNKNOWN_SIZE_MB=256,  # Estimate for files whose header cannot be read
+    PROFILE_TOKEN=os.environ.get('PROFILE_TOKEN'),  # Secret that enables on-demand profiling
+    PROFILE_SAMPLE_RATE=int(os.environ.get('PROFILE_SAMPLE_RATE', 0)),  # Profile 1 in N requests (0 = off)
+    PROFILE_INTERVAL=0.005,  # Seconds between two stack samples
+    PROFILE_MAX_SECONDS=120.0,  # Stop sampling a request after this long
+    PROFILE_MAX_CONCURRENT=1,  # Profiles running at the same time in one process
+    ARCHIVE_UPLOADS=os.environ.get('ARCHIVE_UPLOADS', '0') == '1',  # Replace originals with archival images
+    ARCHIVE_FORMAT=os.environ.get('ARCHIVE_FORMAT', 'webp'),  # 'webp' or 'jpeg'
+    ARCHIVE_MAX_SIDE=int(os.environ.get('ARCHIVE_MAX_SIDE', 2000)),  # Longest side (px) of archival images
+    ARCHIVE_QUALITY=int(os.environ.get('ARCHIVE_QUALITY', 60)),  # Encoder quality of archival images
+    ARCHIVE_GRAYSCALE=True,  # Archive and thumbnail in grayscale
+    THUMBNAIL_MAX_SIDE=320,  # Longest side (px) of thumbnails
+    THUMBNAIL_QUALITY=70,  # Encoder quality of thumbnails
+    THUMBNAIL_MAX_AGE=365 * 24 * 3600,  # Cache lifetime (s); a report's thumbnail never changes
+    STORAGE_RETENTION_DAYS={  # Days each artifact type is kept, 0 = forever; deletion is opt-in
+        'uploads': float(os.environ.get('RETENTION_UPLOADS_DAYS', 0)),
+        'archive': float(os.environ.get('RETENTION_ARCHIVE_DAYS', 0)),
+        'thumbnails': float(os.environ.get('RETENTION_THUMBNAILS_DAYS', 0)),
+        'json': float(os.environ.get('RETENTION_JSON_DAYS', 0)),
+        'xlsx': float(os.environ.get('RETENTION_XLSX_DAYS', 0))
+    },
+    REPORT_COMPRESSION=report_codec.available_encoding(
+        os.environ.get('REPORT_COMPRESSION', 'gzip')),  # JSON reports at rest: 'gzip', 'zstd' or 'none'
+    REPORT_INDEX_PATH=os.environ.get(
+        'REPORT_INDEX_PATH', os.path.join('reports', 'index.sqlite3')),  # SQLite index behind /api/reports
+    EXPENSE_DATASET_DIR=os.environ.get(
+        'EXPENSE_DATASET_DIR', os.path.join('reports', 'dataset')),  # Parquet dataset of records, '' = off
+    EXPENSE_DATASET_BATCH=int(os.environ.get('EXPENSE_DATASET_BATCH', 500)),  # Records per Parquet write
+    EXPENSE_DATASET_FLUSH_SECONDS=float(os.environ.get('EXPENSE_DATASET_FLUSH_SECONDS', 300)),  # Max buffering
+    STORAGE_GC_INTERVAL=float(os.environ.get('STORAGE_GC_INTERVAL', 3600)),  # Seconds between retention runs, 0 = off
+    LOG_LEVEL=os.environ.get('LOG_LEVEL', 'INFO'),
+    LOG_FORMAT=os.environ.get('LOG_FORMAT', 'json'),  # 'json' or 'text'
+    LOG_SAMPLE_RATE=float(os.environ.get('LOG_SAMPLE_RATE', 1.0))  # Share of requests with DEBUG/INFO logs
 )
 
+logger = logging.getLogger(__name__)
+
+def setup_logging():
+    """
+    Route all logging through the structured logger
+    
+    Called by the server entry points (gunicorn.conf.py, asgi.py and
+    __main__) rather than on import, so importing the app leaves the root
+    logger of the importing program alone.
+    """
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_SAMPLE_RATE'], app.config['LOG_FORMAT'])
+
 # Ensure required directories exist
 Path(app.config['UPLOAD_FOLDER']).mkdir(exist_ok=True)
 Path(app.config['REPORTS_FOLDER']).mkdir(exist_ok=True)
@@ -40,6 +143,79 @@ class CurrencyService:
     _exchange_rates = {}
     _last_updated = {}
     CACHE_DURATION = 3600  # 1 hour cache
+    _category_index = None  # Compiled keyword matcher, see build_category_index
+
+    # Keywords that map receipt text to a category (can be enhanced with ML/NLP)
+    CATEGORY_KEYWORDS = {
+        'food': ['restaurant', 'cafe', 'food', 'dining', 'coffee', 'lunch', 'dinner', 'breakfast', 'groceries'],
+        'travel': ['flight', 'hotel', 'airbnb', 'vacation', 'trip', 'travel'],
+        'transportation': ['taxi', 'uber', 'lyft', 'train', 'bus', 'subway', 'metro', 'gas', 'fuel', 'parking'],
+        'shopping': ['store', 'shop', 'mall', 'amazon', 'purchase', 'order'],
+        'utilities': ['electricity', 'water', 'gas', 'internet', 'phone', 'mobile', 'cable', 'tv'],
+        'entertainment': ['movie', 'netflix', 'spotify', 'game', 'concert', 'event', 'show'],
+        'healthcare': ['doctor', 'hospital', 'pharmacy', 'medicine', 'dental', 'clinic'],
+        'education': ['school', 'university', 'course', 'tuition', 'book', 'learning'],
+        'bills': ['bill', 'payment', 'subscription', 'membership', 'fee'],
+        'home': ['rent', 'mortgage', 'maintenance', 'repair', 'furniture', 'appliance']
+    }
+
+    # Common currency symbol mapping for better display
+    CURRENCY_SYMBOLS = {
+        'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥', 'AUD': 'A$',
+        'CAD': 'C$', 'CHF': 'CHF', 'CNY': '¥', 'INR': '₹', 'MXN': 'MX$',
+        'BRL': 'R$', 'RUB': '₽', 'KRW': '₩', 'TRY': '₺', 'THB': '฿',
+        'IDR': 'Rp', 'HUF': 'Ft', 'CZK': 'Kč', 'DKK': 'kr', 'NOK': 'kr',
+        'SEK': 'kr', 'PLN': 'zł', 'BGN': 'лв', 'RON': 'lei', 'HRK': 'kn',
+        'BDT': 'Tk',  # Bangladeshi Taka
+        'AFN': 'Af',  # Afghan Afghani
+        'PKR': '₨',  # Pakistani Rupee
+        'LKR': '₨',  # Sri Lankan Rupee
+        'NPR': '₨',  # Nepalese Rupee
+        'MVR': 'Rf', # Maldivian Rufiyaa
+        'BTN': 'Nu', # Bhutanese Ngultrum
+        'MMK': 'K',  # Burmese Kyat
+        'KHR': '៛',  # Cambodian Riel
+        'LAK': '₭',  # Lao Kip
+        'VND': '₫',  # Vietnamese Dong
+        'PHP': '₱',  # Philippine Peso
+        'KZT': '₸',  # Kazakhstani Tenge
+        'UAH': '₴',  # Ukrainian Hryvnia
+        'GEL': '₾',  # Georgian Lari
+        'AMD': '֏',  # Armenian Dram
+        'GHS': 'GH₵', # Ghanaian Cedi
+        'NGN': '₦',  # Nigerian Naira
+        'ZAR': 'R',  # South African Rand
+        'EGP': 'E£', # Egyptian Pound
+        'MAD': 'DH', # Moroccan Dirham
+        'DZD': 'DA', # Algerian Dinar
+        'TND': 'DT', # Tunisian Dinar
+        'JOD': 'JD', # Jordanian Dinar
+        'LBP': 'ل.ل', # Lebanese Pound
+        'SYP': '£S', # Syrian Pound
+        'YER': '﷼',  # Yemeni Rial
+        'OMR': 'ر.ع.', # Omani Rial
+        'QAR': 'ر.ق', # Qatari Riyal
+        'SAR': 'ر.س', # Saudi Riyal
+        'KWD': 'د.ك', # Kuwaiti Dinar
+        'BHD': '.د.ب', # Bahraini Dinar
+        'AED': 'د.إ', # UAE Dirham
+        'ILS': '₪',  # Israeli New Shekel
+        'JMD': 'J$', # Jamaican Dollar
+        'BBD': 'Bds$', # Barbadian Dollar
+        'BZD': 'BZ$', # Belize Dollar
+        'BMD': 'BD$', # Bermudian Dollar
+        'KYD': 'CI$', # Cayman Islands Dollar
+        'FJD': 'FJ$', # Fijian Dollar
+        'GYD': 'G$',  # Guyanese Dollar
+        'LRD': 'L$',  # Liberian Dollar
+        'NAD': 'N$',  # Namibian Dollar
+        'SBD': 'SI$', # Solomon Islands Dollar
+        'SRD': 'SRD', # Surinamese Dollar
+        'TTD': 'TT$', # Trinidad and Tobago Dollar
+        'TVD': 'TV$', # Tuvaluan Dollar
+        'XCD': 'EC$', # East Caribbean Dollar
+        'ZWD': 'Z$'  # Zimbabwean Dollar
+    }
 
     def __new__(cls):
         if cls._instance is None:
@@ -67,65 +243,8 @@ class CurrencyService:
         self._categories.update(common_categories)
     def _load_currencies(self):
         """Load currencies from REST Countries API with fallback"""
-        # Common currency symbol mapping for better display
-        CURRENCY_SYMBOLS = {
-            'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥', 'AUD': 'A$',
-            'CAD': 'C$', 'CHF': 'CHF', 'CNY': '¥', 'INR': '₹', 'MXN': 'MX$',
-            'BRL': 'R$', 'RUB': '₽', 'KRW': '₩', 'TRY': '₺', 'THB': '฿',
-            'IDR': 'Rp', 'HUF': 'Ft', 'CZK': 'Kč', 'DKK': 'kr', 'NOK': 'kr',
-            'SEK': 'kr', 'PLN': 'zł', 'BGN': 'лв', 'RON': 'lei', 'HRK': 'kn',
-            'BDT': 'Tk',  # Bangladeshi Taka
-            'AFN': 'Af',  # Afghan Afghani
-            'PKR': '₨',  # Pakistani Rupee
-            'LKR': '₨',  # Sri Lankan Rupee
-            'NPR': '₨',  # Nepalese Rupee
-            'MVR': 'Rf', # Maldivian Rufiyaa
-            'BTN': 'Nu', # Bhutanese Ngultrum
-            'MMK': 'K',  # Burmese Kyat
-            'KHR': '៛',  # Cambodian Riel
-            'LAK': '₭',  # Lao Kip
-            'VND': '₫',  # Vietnamese Dong
-            'PHP': '₱',  # Philippine Peso
-            'KZT': '₸',  # Kazakhstani Tenge
-            'UAH': '₴',  # Ukrainian Hryvnia
-            'GEL': '₾',  # Georgian Lari
-            'AMD': '֏',  # Armenian Dram
-            'GHS': 'GH₵', # Ghanaian Cedi
-            'NGN': '₦',  # Nigerian Naira
-            'ZAR': 'R',  # South African Rand
-            'EGP': 'E£', # Egyptian Pound
-            'MAD': 'DH', # Moroccan Dirham
-            'DZD': 'DA', # Algerian Dinar
-            'TND': 'DT', # Tunisian Dinar
-            'JOD': 'JD', # Jordanian Dinar
-            'LBP': 'ل.ل', # Lebanese Pound
-            'SYP': '£S', # Syrian Pound
-            'YER': '﷼',  # Yemeni Rial
-            'OMR': 'ر.ع.', # Omani Rial
-            'QAR': 'ر.ق', # Qatari Riyal
-            'SAR': 'ر.س', # Saudi Riyal
-            'KWD': 'د.ك', # Kuwaiti Dinar
-            'BHD': '.د.ب', # Bahraini Dinar
-            'AED': 'د.إ', # UAE Dirham
-            'ILS': '₪',  # Israeli New Shekel
-            'JMD': 'J$', # Jamaican Dollar
-            'BBD': 'Bds$', # Barbadian Dollar
-            'BZD': 'BZ$', # Belize Dollar
-            'BMD': 'BD$', # Bermudian Dollar
-            'KYD': 'CI$', # Cayman Islands Dollar
-            'FJD': 'FJ$', # Fijian Dollar
-            'GYD': 'G$',  # Guyanese Dollar
-            'LRD': 'L$',  # Liberian Dollar
-            'NAD': 'N$',  # Namibian Dollar
-            'SBD': 'SI$', # Solomon Islands Dollar
-            'SRD': 'SRD', # Surinamese Dollar
-            'TTD': 'TT$', # Trinidad and Tobago Dollar
-            'TVD': 'TV$', # Tuvaluan Dollar
-            'XCD': 'EC$', # East Caribbean Dollar
-            'ZWD': 'Z$'  # Zimbabwean Dollar
-        }
-
         try:
+            import requests
             response = requests.get(
                 app.config['REST_COUNTRIES_API'], 
                 timeout=10
@@ -139,7 +258,7 @@ class CurrencyService:
                     for code, details in country['currencies'].items():
                         if code not in self._currencies:
                             # Use our symbol mapping if available, otherwise use the one from API
-                            symbol = CURRENCY_SYMBOLS.get(code, details.get('symbol', code))
+                            symbol = self.CURRENCY_SYMBOLS.get(code, details.get('symbol', code))
                             self._currencies[code] = {
                                 'name': details.get('name', code),
                                 'symbol': symbol,
@@ -153,10 +272,10 @@ class CurrencyService:
                 currency['countries'] = list(currency['countries'])
                 # Ensure we have a symbol for all currencies
                 if not currency['symbol'] or currency['symbol'] == code:
-                    currency['symbol'] = CURRENCY_SYMBOLS.get(code, code)
+                    currency['symbol'] = self.CURRENCY_SYMBOLS.get(code, code)
                 
         except Exception as e:
-            print(f"Error loading currencies: {e}")
+            logger.warning("Error loading currencies: %s", e)
             # Fallback to major currencies with our symbol mapping
             self._currencies = {
                 'USD': {'name': 'US Dollar', 'symbol': '$', 'countries': ['United States']},
@@ -211,6 +330,39 @@ class CurrencyService:
             min(count, len(self._categories))
         ))
 
+    @classmethod
+    def build_category_index(cls) -> Dict[str, Any]:
+        """
+        Compile CATEGORY_KEYWORDS into a single matcher
+        
+        The pattern is a lookahead alternation, so one pass over the text
+        reports every keyword position. Keywords contained in a longer
+        matched keyword are added through 'contained'; together this finds
+        exactly the keywords for which 'keyword in text' holds.
+        
+        Returns:
+            Dict with the compiled 'pattern', the keyword 'order', the
+            'weight' (number of categories listing a keyword), the first
+            'category' of each keyword and the 'contained' keywords
+        """
+        if cls._category_index is None:
+            order, weight, category_of = [], {}, {}
+            for category, keywords in cls.CATEGORY_KEYWORDS.items():
+                for keyword in keywords:
+                    if keyword not in weight:
+                        order.append(keyword)
+                        category_of[keyword] = category
+                    weight[keyword] = weight.get(keyword, 0) + 1
+            alternation = '|'.join(re.escape(k) for k in sorted(order, key=len, reverse=True))
+            cls._category_index = {
+                'pattern': re.compile(f"(?=({alternation}))"),
+                'order': order,
+                'weight': weight,
+                'category': category_of,
+                'contained': {k: [other for other in order if other != k and other in k] for k in order}
+            }
+        return cls._category_index
+
     def detect_category(self, text: str) -> str:
         """
         Try to detect the most relevant category from text
@@ -226,41 +378,27 @@ class CurrencyService:
             
         text = text.lower().strip()
         
-        # Simple keyword matching (can be enhanced with ML/NLP)
-        category_keywords = {
-            'food': ['restaurant', 'cafe', 'food', 'dining', 'coffee', 'lunch', 'dinner', 'breakfast', 'groceries'],
-            'travel': ['flight', 'hotel', 'airbnb', 'vacation', 'trip', 'travel'],
-            'transportation': ['taxi', 'uber', 'lyft', 'train', 'bus', 'subway', 'metro', 'gas', 'fuel', 'parking'],
-            'shopping': ['store', 'shop', 'mall', 'amazon', 'purchase', 'order'],
-            'utilities': ['electricity', 'water', 'gas', 'internet', 'phone', 'mobile', 'cable', 'tv'],
-            'entertainment': ['movie', 'netflix', 'spotify', 'game', 'concert', 'event', 'show'],
-            'healthcare': ['doctor', 'hospital', 'pharmacy', 'medicine', 'dental', 'clinic'],
-            'education': ['school', 'university', 'course', 'tuition', 'book', 'learning'],
-            'bills': ['bill', 'payment', 'subscription', 'membership', 'fee'],
-            'home': ['rent', 'mortgage', 'maintenance', 'repair', 'furniture', 'appliance']
-        }
-        
         # Check for exact matches first
         for category in self._categories:
             if category.lower() == text:
                 return category
                 
-        # Then check keyword matches
-        matched_keywords = {}
-        for category, keywords in category_keywords.items():
-            for keyword in keywords:
-                if keyword in text:
-                    matched_keywords[keyword] = matched_keywords.get(keyword, 0) + 1
+        # Then check keyword matches in a single scan of the text
+        index = self.build_category_index()
+        found = set()
+        for match in index['pattern'].finditer(text):
+            keyword = match.group(1)
+            if keyword not in found:
+                found.add(keyword)
+                found.update(index['contained'][keyword])
         
-        if matched_keywords:
-            # Get the most matched keyword
-            best_match = max(matched_keywords.items(), key=lambda x: x[1])
-            # Find the most specific category for this keyword
-            for category, keywords in category_keywords.items():
-                if best_match[0] in keywords:
-                    # Add this as a new category if it doesn't exist
-                    self.add_category(category.title())
-                    return category.title()
+        if found:
+            # Get the most matched keyword (the first one on ties, as listed)
+            best_match = max((k for k in index['order'] if k in found), key=lambda k: index['weight'][k])
+            # Add this as a new category if it doesn't exist
+            category = index['category'][best_match].title()
+            self.add_category(category)
+            return category
         
         # If no good match, add as a new category
         self.add_category(text.title())
@@ -269,6 +407,79 @@ class CurrencyService:
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'ok'})
+
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness: models, caches and indexes are warm and the OCR queue has room
+    
+    Returns 503 while warming up or while more than READY_MAX_QUEUE_DEPTH
+    OCR calls are waiting for a reader, so the load balancer can shed load.
+    A failed warm-up is retried from here, with exponential backoff.
+    """
+    if warm_up_due():
+        start_warm_up()
+    
+    pool = ocr_pool_stats()
+    checks = {
+        'models_loaded': pool['loaded'] >= pool['size'],
+        'warmed_up': warmup_state['done'],
+        'currency_catalog': _currency_service is not None,
+        'category_index': CurrencyService._category_index is not None
+    }
+    admission = admission_controller.stats()
+    saturated = (pool['waiting'] >= app.config['READY_MAX_QUEUE_DEPTH'] or
+                 admission['waiting'] >= admission['max_queue'])
+    warm = all(checks.values())
+    ready = warm and not saturated
+    
+    response = jsonify({
+        'status': 'ready' if ready else ('saturated' if warm else 'warming_up'),
+        'checks': checks,
+        'warmup': dict(warmup_state),
+        'saturation': {
+            'queue_depth': pool['waiting'],
+            'max_queue_depth': app.config['READY_MAX_QUEUE_DEPTH'],
+            'busy_readers': pool['busy'],
+            'utilization': round(pool['busy'] / pool['size'], 4),
+            'in_flight': in_flight_requests,
+            'admission': admission
+        }
+    })
+    if ready:
+        return response
+    response.status_code = 503
+    response.headers['Retry-After'] = '1' if warm else '5'
+    return response
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Get processing counters for the OCR pipeline"""
+    pool = ocr_pool_stats()
+    return jsonify({
+        'status': 'success',
+        'in_flight': in_flight_requests,
+        'queue_depth': pool['waiting'],
+        'ocr': get_ocr_stats(),
+        'reader_pool': pool,
+        'expense_dataset': expense_dataset.stats() if expense_dataset is not None else None,
+        'expenses_indexed': len(expense_duplicates) if expense_duplicates is not None else None,
+        'ocr_backend': 'processes' if ocr_process_pool is not None else 'threads',
+        'admission': admission_controller.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose pipeline metrics in the Prometheus text format"""
+    body, content_type = metrics.render_metrics()
+    response = make_response(body)
+    response.headers['Content-Type'] = content_type
+    return response
 @app.route('/api/categories', methods=['GET', 'POST'])
 def handle_categories():
         """
@@ -283,7 +494,7 @@ def handle_categories():
         """
         # Handle category detection
         if request.method == 'GET' and 'detect' in request.args:
-            detected = currency_service.detect_category(request.args['detect'])
+            detected = get_currency_service().detect_category(request.args['detect'])
             return jsonify({
                 'status': 'success',
                 'detected_category': detected
@@ -293,11 +504,11 @@ def handle_categories():
         if request.method == 'POST':
             data = request.get_json() or {}
             if 'categories' in data and isinstance(data['categories'], list):
-                added = currency_service.add_categories(data['categories'])
+                added = get_currency_service().add_categories(data['categories'])
                 return jsonify({
                     'status': 'success',
                     'added': added,
-                    'total_categories': len(currency_service.get_categories())
+                    'total_categories': len(get_currency_service().get_categories())
                 })
             return jsonify({'status': 'error', 'message': 'Invalid request'}), 400
         
@@ -309,7 +520,7 @@ def handle_categories():
             
         return jsonify({
             'status': 'success',
-            'categories': list(currency_service.get_categories(count=count))
+            'categories': list(get_currency_service().get_categories(count=count))
         })
 async def get_exchange_rates(self, base_currency: str) -> Dict:
         """Get exchange rates for a base currency"""
@@ -324,6 +535,7 @@ async def get_exchange_rates(self, base_currency: str) -> Dict:
             return self._exchange_rates
             
         try:
+            import requests
             url = app.config['EXCHANGE_RATE_API'].format(base_currency)
             response = requests.get(url, timeout=10)
             response.raise_for_status()
@@ -333,25 +545,356 @@ async def get_exchange_rates(self, base_currency: str) -> Dict:
             return self._exchange_rates
             
         except Exception as e:
-            print(f"Error fetching exchange rates: {e}")
+            logger.warning("Error fetching exchange rates: %s", e)
             return {
                 'base': base_currency,
                 'date': datetime.now().strftime('%Y-%m-%d'),
                 'rates': {base_currency: 1.0}  # Fallback to 1:1 if API fails
             }
 
-# Initialize services
-currency_service = CurrencyService()
+# Uploads and reports are sharded under their folders; files from before
+# sharding are still found in the flat folders
+storage = LocalStorage(
+    roots={
+        'uploads': app.config['UPLOAD_FOLDER'],
+        'archive': os.path.join(app.config['UPLOAD_FOLDER'], 'archive'),
+        'thumbnails': os.path.join(app.config['UPLOAD_FOLDER'], 'thumbnails'),
+        'json': os.path.join(app.config['REPORTS_FOLDER'], 'json'),
+        'xlsx': os.path.join(app.config['REPORTS_FOLDER'], 'xlsx')
+    },
+    legacy_dirs={
+        'json': [app.config['REPORTS_FOLDER']],
+        'xlsx': [app.config['REPORTS_FOLDER']]
+    }
+)
+retention_collector = RetentionCollector(
+    storage,
+    app.config['STORAGE_RETENTION_DAYS'],
+    app.config['STORAGE_GC_INTERVAL'],
+    lock_path=os.path.join(app.config['REPORTS_FOLDER'], '.retention.lock')
+)
 
-def preprocess_image(image_path: str) -> np.ndarray:
-    """Preprocess image for better OCR results"""
-    # Read the image
+# Metadata of every processed receipt, for listing and filtering
+report_index = ReportIndex(app.config['REPORT_INDEX_PATH'])
+
+# Spend aggregates over the index, refreshed as reports are added by any worker
+spend_analytics = SpendAnalytics(report_index)
+
+# Expenses by merchant, date, currency and amount, for field-level duplicate checks
+expense_duplicates = ExpenseDuplicateIndex(
+    report_index, tolerance=app.config['EXPENSE_DUPLICATE_TOLERANCE']
+) if app.config['EXPENSE_DUPLICATE_DETECTION'] else None
+
+# Extracted records are appended to a Parquet dataset partitioned by month
+expense_dataset = None
+if app.config['EXPENSE_DATASET_DIR']:
+    if dataset_available():
+        expense_dataset = ExpenseDatasetWriter(
+            app.config['EXPENSE_DATASET_DIR'],
+            batch_size=app.config['EXPENSE_DATASET_BATCH'],
+            flush_interval=app.config['EXPENSE_DATASET_FLUSH_SECONDS']
+        )
+    else:
+        logger.warning("pyarrow is not installed; the expense dataset is disabled",
+                       extra={'fields': {'dataset_dir': app.config['EXPENSE_DATASET_DIR']}})
+
+# Archival transcoding runs one upload at a time, after the upload's response
+_archive_executor = None
+_archive_executor_lock = threading.Lock()
+
+def run_archival(filepath: str, report_id: str):
+    """Write the archival image and thumbnail of an upload, logging instead of raising"""
+    set_correlation_id(report_id)
+    try:
+        with metrics.stage_timer('archive'):
+            sizes = archive_upload(
+                filepath, report_id, storage,
+                image_format=app.config['ARCHIVE_FORMAT'],
+                max_side=app.config['ARCHIVE_MAX_SIDE'],
+                quality=app.config['ARCHIVE_QUALITY'],
+                grayscale=app.config['ARCHIVE_GRAYSCALE'],
+                thumbnail_side=app.config['THUMBNAIL_MAX_SIDE'],
+                thumbnail_quality=app.config['THUMBNAIL_QUALITY'],
+                keep_original=not app.config['ARCHIVE_UPLOADS']
+            )
+        if sizes:
+            logger.info("Upload archived", extra={'fields': {'bytes': sizes}})
+    except Exception:
+        logger.exception("Archiving upload failed")
+    finally:
+        set_correlation_id(None)
+
+def schedule_archival(filepath: str, report_id: str):
+    """Queue an upload for archival transcoding in the background"""
+    global _archive_executor
+    with _archive_executor_lock:
+        # Created on first use, so a pre-fork master never owns the thread
+        if _archive_executor is None:
+            _archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='archive')
+    _archive_executor.submit(run_archival, filepath, report_id)
+
+def start_retention_gc() -> Optional[threading.Thread]:
+    """
+    Start the background retention collector unless STORAGE_GC_INTERVAL is 0
+    
+    Artifacts are only deleted for the types given a retention period in
+    STORAGE_RETENTION_DAYS; otherwise the collector just removes stale
+    temporary files.
+    """
+    if app.config['STORAGE_GC_INTERVAL'] <= 0:
+        return None
+    return retention_collector.start()
+
+# Initialize services; the currency catalog is fetched on first use, not at import
+_currency_service = None
+_currency_service_lock = threading.Lock()
+
+def get_currency_service() -> CurrencyService:
+    """Get the shared CurrencyService, loading the currency catalog on first use"""
+    global _currency_service
+    if _currency_service is None:
+        with _currency_service_lock:
+            if _currency_service is None:
+                _currency_service = CurrencyService()
+    return _currency_service
+
+reader_pool = ReaderPool(
+    ['en'],
+    size=app.config['OCR_READER_POOL_SIZE'],
+    torch_threads=app.config['OCR_TORCH_THREADS'] or None
+)
+# With OCR_PROCESS_WORKERS the readers live in separate processes and images
+# are passed through shared memory; otherwise reader_pool serves OCR in-process
+ocr_process_pool = OcrProcessPool(
+    app.config['OCR_PROCESS_WORKERS'],
+    ['en'],
+    torch_threads=app.config['OCR_TORCH_THREADS'] or None
+) if app.config['OCR_PROCESS_WORKERS'] > 0 else None
+metrics.set_reader_pool(0, (ocr_process_pool or reader_pool).size)
+
+def ocr_pool_stats() -> Dict[str, int]:
+    """Get size, loaded, busy and waiting counts of whichever OCR pool is in use"""
+    return (ocr_process_pool or reader_pool).stats()
+
+def preload_models():
+    """Load the currency catalog, category index and every EasyOCR reader of the pool now instead of on the first requests"""
+    get_currency_service().build_category_index()
+    # OCR processes are started per worker by warm_up, never in a pre-fork master
+    created = reader_pool.warm() if ocr_process_pool is None else 0
+    logger.info("Preloaded OCR models", extra={'fields': {'readers': created, 'pool': ocr_pool_stats()}})
+
+# Memory and concurrency budget for OCR jobs in this worker
+admission_controller = AdmissionController(
+    memory_budget=app.config['ADMISSION_MEMORY_BUDGET_MB'] * 2 ** 20,
+    max_concurrent=app.config['ADMISSION_MAX_CONCURRENT'],
+    max_queue=app.config['ADMISSION_MAX_QUEUE'],
+    max_wait=app.config['ADMISSION_MAX_WAIT']
+)
+
+def estimate_upload_bytes(image_path: str) -> int:
+    """Estimate the peak memory of OCR on an uploaded image from its header, without decoding it"""
+    try:
+        size = read_image_size(image_path)
+    except OSError:
+        size = None
+    return estimate_job_bytes(
+        size,
+        bytes_per_pixel=app.config['ADMISSION_BYTES_PER_PIXEL'],
+        overhead_bytes=app.config['ADMISSION_JOB_OVERHEAD_MB'] * 2 ** 20,
+        default_bytes=app.config['ADMISSION_UNKNOWN_SIZE_MB'] * 2 ** 20
+    )
+
+# Warm-up progress, reported by /api/health/ready
+_warmup_lock = threading.Lock()
+warmup_state = {'started': False, 'done': False, 'error': None, 'elapsed_ms': None, 'attempts': 0}
+_warmup_failed_at = None
+
+def load_warmup_image() -> np.ndarray:
+    """Load the bundled warm-up receipt, or draw a small one if it is missing"""
+    import cv2
+    import numpy as np
+    
+    path = app.config['OCR_WARMUP_IMAGE']
+    if path and os.path.exists(path):
+        return load_image(path)
+    image = np.full((400, 600, 3), 255, np.uint8)
+    for row, line in enumerate(['WARM UP STORE', 'Coffee 2 x 3.50', 'Total 7.00']):
+        cv2.putText(image, line, (20, 80 + 90 * row), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    return image
+
+def warm_up():
+    """Preload models, caches and indexes, then run one OCR pass on every reader"""
+    global _warmup_failed_at
+    with _warmup_lock:
+        if warmup_state['started'] and not warmup_state['error']:
+            return
+        warmup_state.update(started=True, error=None, attempts=warmup_state['attempts'] + 1)
+    
+    started = time.perf_counter()
+    try:
+        preload_models()
+        if ocr_process_pool is not None:
+            ocr_process_pool.warm()
+        image = preprocess_image(load_warmup_image(), max_side=app.config['OCR_LOW_RES_MAX_SIDE'])
+        # One concurrent pass per reader, so every reader (or process) runs once
+        size = ocr_pool_stats()['size']
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            list(executor.map(run_ocr, [image] * size))
+        # Load the spend data and expenses now rather than on the first request
+        spend_analytics.refresh()
+        if expense_duplicates is not None:
+            expense_duplicates.refresh()
+        warmup_state['done'] = True
+    except Exception as e:
+        _warmup_failed_at = time.monotonic()
+        warmup_state['error'] = str(e)
+        logger.exception("Warm-up failed")
+    finally:
+        warmup_state['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    logger.info("Warm-up finished", extra={'fields': dict(warmup_state)})
+
+def warm_up_due() -> bool:
+    """Whether warm-up has not started yet, or failed longer ago than its retry delay"""
+    if not warmup_state['started']:
+        return True
+    if not warmup_state['error'] or _warmup_failed_at is None:
+        return False
+    delay = min(app.config['WARMUP_RETRY_SECONDS'] * 2 ** (warmup_state['attempts'] - 1),
+                app.config['WARMUP_RETRY_MAX_SECONDS'])
+    return time.monotonic() - _warmup_failed_at >= delay
+
+def start_warm_up() -> threading.Thread:
+    """Run warm_up in a background thread so the process can answer health checks meanwhile"""
+    thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+# Requests currently being handled, exposed through /api/stats
+_in_flight_lock = threading.Lock()
+in_flight_requests = 0
+
+@app.before_request
+def track_request_start():
+    global in_flight_requests
+    with _in_flight_lock:
+        in_flight_requests += 1
+    metrics.IN_FLIGHT.inc()
+
+@app.teardown_request
+def track_request_end(exc=None):
+    global in_flight_requests
+    with _in_flight_lock:
+        in_flight_requests -= 1
+    metrics.IN_FLIGHT.dec()
+    set_correlation_id(None)
+
+# On-demand request profiling
+_profile_lock = threading.Lock()
+_profile_slots = threading.BoundedSemaphore(app.config['PROFILE_MAX_CONCURRENT'])
+profile_request_count = 0
+
+def has_profile_token() -> bool:
+    """Check the X-Profile-Token header or profile query parameter against PROFILE_TOKEN"""
+    token = app.config['PROFILE_TOKEN']
+    supplied = request.headers.get('X-Profile-Token') or request.args.get('profile')
+    return bool(token and supplied) and hmac.compare_digest(supplied, token)
+
+def profile_requested() -> bool:
+    """Decide whether the current request should be profiled"""
+    global profile_request_count
+    if has_profile_token():
+        return True
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    if rate <= 0:
+        return False
+    with _profile_lock:
+        profile_request_count += 1
+        return profile_request_count % rate == 0
+
+def save_profile(profile_id: str, profiler: SamplingProfiler, report_id: Optional[str] = None) -> str:
+    """Store the folded stacks and their metadata under REPORTS_FOLDER/profiles"""
+    profiles_dir = os.path.join(app.config['REPORTS_FOLDER'], 'profiles')
+    path = profiler.write(os.path.join(profiles_dir, f"{profile_id}.folded"))
+    with open(os.path.join(profiles_dir, f"{profile_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump({
+            'profile_id': profile_id,
+            'endpoint': request.endpoint,
+            'report_id': report_id,
+            'created_at': datetime.utcnow().isoformat(),
+            **profiler.summary()
+        }, f, indent=2)
+    return path
+
+def profiled(view):
+    """
+    Profile a view when profile_requested() says so
+    
+    The profile link is returned in the X-Profile header and kept in
+    g.profile_id so the view can add it to its response body. When
+    PROFILE_MAX_CONCURRENT profiles are already running the request is
+    served without profiling.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profile_requested() or not _profile_slots.acquire(blocking=False):
+            return view(*args, **kwargs)
+        try:
+            g.profile_id = uuid.uuid4().hex
+            profiler = SamplingProfiler(
+                threading.get_ident(),
+                interval=app.config['PROFILE_INTERVAL'],
+                max_seconds=app.config['PROFILE_MAX_SECONDS']
+            )
+            profiler.start()
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                profiler.stop()
+            save_profile(g.profile_id, profiler, kwargs.get('report_id') or g.get('report_id'))
+            response.headers['X-Profile'] = f'/api/profile/{g.profile_id}.folded'
+            return response
+        finally:
+            _profile_slots.release()
+    return wrapper
+
+# Counters for the progressive OCR tiers, exposed through /api/stats
+_ocr_stats_lock = threading.Lock()
+ocr_tier_stats = {
+    'low_res': 0,
+    'full_res': 0,
+    'reused': 0,
+    'escalations': {'low_confidence': 0, 'no_total': 0, 'items_mismatch': 0}
+}
+
+# Item lines that are really totals, taxes or charges rather than purchases
+SUMMARY_LINE_PATTERN = re.compile(
+    r'\b(?:sub\s*total|total|tax|vat|gst|cgst|sgst|service|discount|tip|'
+    r'change|cash|balance|amount due|round)',
+    re.IGNORECASE
+)
+
+def load_image(image_path: str) -> np.ndarray:
+    """Decode an image file into a BGR array"""
+    import cv2
+    
     img = cv2.imread(image_path)
     if img is None:
         raise ValueError("Could not read the image file")
+    return img
+
+def preprocess_image(image: Union[str, np.ndarray], max_side: Optional[int] = None) -> np.ndarray:
+    """Preprocess image for better OCR results, optionally downscaling it first"""
+    import cv2
+    import numpy as np
+    
+    # Read the image
+    img = load_image(image) if isinstance(image, str) else image
+    
+    if max_side:
+        img = downscale(img, max_side)
     
     # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
     
     # Apply thresholding to preprocess the image
     gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
@@ -363,53 +906,242 @@ def preprocess_image(image_path: str) -> np.ndarray:
     
     return gray
 
-def extract_text_from_image(image_path: str) -> str:
-    """Extract text from an image using OCR with EasyOCR as the primary engine"""
-    import traceback
-    
-    def use_easyocr(img_path: str) -> str:
-        """Extract text using EasyOCR"""
+def run_ocr(image: np.ndarray) -> Tuple[str, float]:
+    """Run EasyOCR on an image array in an OCR process or with a pooled reader"""
+    if ocr_process_pool is not None:
+        metrics.QUEUE_DEPTH.inc()
         try:
-            print(f"[DEBUG] Using EasyOCR on {img_path}")
-            if not os.path.exists(img_path):
-                print(f"[ERROR] File not found: {img_path}")
-                return ""
-                
-            if os.path.getsize(img_path) == 0:
-                print(f"[ERROR] File is empty: {img_path}")
-                return ""
-                
-            import easyocr
-            print("[DEBUG] Initializing EasyOCR reader...")
-            # Initialize with English and other common languages if needed
-            reader = easyocr.Reader(['en'])  # Add more languages if needed: ['en', 'es', 'fr', 'de', ...]
-            print("[DEBUG] Reading text from image...")
-            result = reader.readtext(img_path, detail=0)
-            print(f"[DEBUG] EasyOCR extracted {len(result)} text blocks")
-            return "\n".join(result).strip()
-        except Exception as e:
-            error_msg = f"[ERROR] EasyOCR failed: {str(e)}\n{traceback.format_exc()}"
-            print(error_msg)
-            return ""
+            return ocr_process_pool.run(image)
+        finally:
+            metrics.QUEUE_DEPTH.dec()
+            metrics.set_reader_pool(ocr_process_pool.stats()['busy'], ocr_process_pool.size)
+    
+    metrics.QUEUE_DEPTH.inc()
+    queued = True
+    try:
+        with reader_pool.reader() as reader:
+            metrics.QUEUE_DEPTH.dec()
+            queued = False
+            metrics.set_reader_pool(reader_pool.stats()['busy'], reader_pool.size)
+            return read_text(reader, image)
+    finally:
+        if queued:
+            metrics.QUEUE_DEPTH.dec()
+        metrics.set_reader_pool(reader_pool.stats()['busy'], reader_pool.size)
+
+def validate_ocr_text(text: str, confidence: float) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Check whether an OCR result is good enough to skip a full-resolution pass
     
-    print(f"\n{'='*50}")
-    print(f"[DEBUG] Processing image: {image_path}")
-    print(f"[DEBUG] File exists: {os.path.exists(image_path)}")
+    Returns:
+        Tuple of None if the text is acceptable, otherwise the reason for
+        escalating, and the 'total_amount' and 'items' read from the text
+        (None when the confidence is too low to read them), which
+        extract_expense_data can reuse
+    """
+    if confidence < app.config['OCR_MIN_CONFIDENCE']:
+        return 'low_confidence', None
     
-    if not os.path.exists(image_path):
-        print(f"[ERROR] Image file not found: {image_path}")
-        return ""
+    total_amount = extract_total_amount(text)
+    parsed = {'total_amount': total_amount, 'items': extract_items(text, total_amount)}
+    if parsed['total_amount'] <= 0:
+        return 'no_total', parsed
+    
+    line_items = [item for item in parsed['items']
+                  if not SUMMARY_LINE_PATTERN.search(item['description'])]
+    if line_items:
+        items_sum = sum(item['amount'] for item in line_items)
+        lower = items_sum * (1 - app.config['OCR_TOTAL_TOLERANCE'])
+        upper = items_sum * (1 + app.config['OCR_MAX_SURCHARGE'])
+        if not lower <= parsed['total_amount'] <= upper:
+            return 'items_mismatch', parsed
+    
+    return None, parsed
+
+def confirms_duplicate(text: str, parsed: Optional[Dict[str, Any]], earlier: Dict[str, Any]) -> bool:
+    """
+    Check whether a low-resolution reading matches an earlier report
+    
+    Receipts from one template can hash alike, so a near-duplicate's text is
+    only reused when this reading has the earlier report's total and a date
+    that was actually printed on it.
+    """
+    if earlier.get('amount') is None or not earlier.get('date') or earlier.get('date_defaulted'):
+        return False
+    total_amount = parsed['total_amount'] if parsed else extract_total_amount(text)
+    return (find_date(text) == earlier['date']
+            and abs(total_amount - earlier['amount']) <= app.config['OCR_TOTAL_TOLERANCE'])
+
+def record_ocr_tier(tier: str, escalation_reason: Optional[str] = None):
+    """Update the progressive OCR counters"""
+    with _ocr_stats_lock:
+        ocr_tier_stats[tier] += 1
+        if escalation_reason:
+            ocr_tier_stats['escalations'][escalation_reason] += 1
+
+def get_ocr_stats() -> Dict[str, Any]:
+    """Get a copy of the progressive OCR counters"""
+    with _ocr_stats_lock:
+        stats = dict(ocr_tier_stats)
+        stats['escalations'] = dict(ocr_tier_stats['escalations'])
+    processed = stats['low_res'] + stats['full_res']
+    stats['low_res_ratio'] = round(stats['low_res'] / processed, 4) if processed else 0.0
+    return stats
+
+def extract_text_with_details(image_path: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Extract text from an image using EasyOCR with progressive resolution
+    
+    When OCR_AUTO_ORIENT is enabled, sideways, upside-down and skewed photos
+    are straightened before any OCR pass. When DUPLICATE_DETECTION is enabled
+    the straightened photo's perceptual hash is looked up among earlier
+    receipts. With DUPLICATE_REUSE_OCR the closest match's text is used
+    instead of OCR once the match is confirmed, by identical file bytes or by
+    the low-resolution pass reading the same total and date. When OCR_PROGRESSIVE is enabled the image is first
+    recognised at OCR_LOW_RES_MAX_SIDE and only escalated to full resolution
+    when the result fails validate_ocr_text. Both passes run on the same
+    preprocessed (binarized) image, at different scales.
+    
+    Returns:
+        Tuple of the extracted text and details about the OCR tier,
+        orientation correction, near-duplicates and per-stage timings in
+        milliseconds. When the low-resolution text was accepted, 'parsed'
+        holds the total and items validate_ocr_text read from it, for
+        extract_expense_data; pop it before storing the details.
+    """
+    details = {
+        'tier': None,
+        'confidence': 0.0,
+        'escalation_reason': None,
+        'orientation': None,
+        'image_hash': None,
+        'duplicates': [],
+        'timings_ms': {},
+        'parsed': None
+    }
+    timings = details['timings_ms']
+    
+    def elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 2)
+    
+    def reuse_text(report_id: str) -> str:
+        """An earlier report's OCR text, recorded in the details as reused"""
+        reused = (report_index.text(report_id) or {}).get('raw_text') or ""
+        if reused:
+            details.update(tier='reused', reused_from=report_id)
+            metrics.NEAR_DUPLICATES.labels(action='ocr_reused').inc()
+        return reused
+    
+    logger.debug("Processing image", extra={'fields': {'image_path': image_path}})
+    
+    try:
+        file_size = os.stat(image_path).st_size
+    except FileNotFoundError:
+        logger.error("Image file not found", extra={'fields': {'image_path': image_path}})
+        return "", details
+    
+    if file_size == 0:
+        logger.error("Image file is empty", extra={'fields': {'image_path': image_path}})
+        return "", details
+    
+    text = ""
+    reuse_candidate = None
+    try:
+        started = time.perf_counter()
+        image = load_image(image_path)
+        timings['decode'] = elapsed_ms(started)
+        
+        if app.config['OCR_AUTO_ORIENT']:
+            started = time.perf_counter()
+            image, orientation = correct_orientation(
+                image,
+                max_side=app.config['OCR_ORIENT_MAX_SIDE'],
+                max_skew=app.config['OCR_MAX_SKEW']
+            )
+            orientation['elapsed_ms'] = timings['orient'] = elapsed_ms(started)
+            details['orientation'] = orientation
+            if orientation['rotation'] or orientation['skew']:
+                logger.debug("Corrected orientation", extra={'fields': {
+                    'rotation': orientation['rotation'], 'skew': orientation['skew']}})
+        
+        if app.config['DUPLICATE_DETECTION']:
+            started = time.perf_counter()
+            image_hash = phash(image)
+            details['image_hash'] = to_hex(image_hash)
+            details['duplicates'] = report_index.similar_images(
+                image_hash, app.config['DUPLICATE_MAX_DISTANCE'], limit=app.config['DUPLICATE_MAX_RESULTS'])
+            timings['dedupe'] = elapsed_ms(started)
+            if details['duplicates']:
+                metrics.NEAR_DUPLICATES.labels(action='flagged').inc()
+                logger.info("Upload resembles earlier receipts", extra={'fields': {
+                    'duplicates': details['duplicates']}})
+            if details['duplicates'] and app.config['DUPLICATE_REUSE_OCR']:
+                earlier = report_index.get(details['duplicates'][0]['report_id'])
+                # A similar hash alone is not proof: the same file is, otherwise
+                # the low-res pass must read the earlier receipt's total and date
+                if earlier and earlier['file_hash'] == file_sha256(image_path):
+                    text = reuse_text(earlier['report_id'])
+                else:
+                    reuse_candidate = earlier
+        
+        if app.config['OCR_PROGRESSIVE'] and details['tier'] is None:
+            started = time.perf_counter()
+            low_res = preprocess_image(image, max_side=app.config['OCR_LOW_RES_MAX_SIDE'])
+            timings['preprocess'] = elapsed_ms(started)
+            started = time.perf_counter()
+            text, confidence = run_ocr(low_res)
+            timings['ocr_low_res'] = elapsed_ms(started)
+            reason, parsed = validate_ocr_text(text, confidence)
+            details.update(confidence=round(confidence, 4), escalation_reason=reason)
+            if reuse_candidate and confirms_duplicate(text, parsed, reuse_candidate):
+                text = reuse_text(reuse_candidate['report_id']) or text
+            if details['tier'] == 'reused':
+                logger.debug("Low-res pass confirmed the duplicate", extra={'fields': {
+                    'reused_from': details['reused_from']}})
+            elif reason is None:
+                details.update(tier='low_res', parsed=parsed)
+            else:
+                logger.debug("Escalating to full resolution", extra={'fields': {'reason': reason}})
+        
+        if details['tier'] is None:
+            started = time.perf_counter()
+            full_res = preprocess_image(image)
+            timings['preprocess'] = round(timings.get('preprocess', 0.0) + elapsed_ms(started), 2)
+            started = time.perf_counter()
+            text, confidence = run_ocr(full_res)
+            timings['ocr_full_res'] = elapsed_ms(started)
+            details.update(tier='full_res', confidence=round(confidence, 4))
+        
+        record_ocr_tier(details['tier'], details['escalation_reason'])
+    except Exception:
+        logger.exception("EasyOCR failed", extra={'fields': {'image_path': image_path}})
+        metrics.OCR_FAILURES.inc()
+        text = ""
+        details['parsed'] = None
     
-    # Use EasyOCR as the primary OCR engine
-    text = use_easyocr(image_path)
+    for stage, stage_ms in timings.items():
+        metrics.observe_stage(stage, stage_ms / 1000)
     
     if not text:
-        print("[WARNING] EasyOCR failed to extract text")
+        metrics.EMPTY_TEXT.inc()
+        logger.warning("EasyOCR failed to extract text", extra={'fields': {'timings_ms': timings}})
     else:
-        print(f"[DEBUG] Successfully extracted text: {text[:100]}...")
+        logger.info("OCR complete", extra={'fields': {
+            'tier': details['tier'],
+            'confidence': details['confidence'],
+            'escalation_reason': details['escalation_reason'],
+            'text_chars': len(text),
+            'timings_ms': timings
+        }})
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Extracted text", extra={'fields': {'text_preview': text[:100]}})
     
-    print(f"{'='*50}\n")
-    return text or ""  # Return the extracted text or empty string if no text was extracted
+    return text, details
+
+def extract_text_from_image(image_path: str) -> str:
+    """Extract text from an image using OCR with EasyOCR as the primary engine"""
+    return extract_text_with_details(image_path)[0]
+
 def extract_merchant(text: str) -> str:
     """Extract merchant name from receipt text"""
     # Look for common merchant patterns
@@ -430,17 +1162,18 @@ def extract_merchant(text: str) -> str:
     
     return "Unknown Merchant"
 
-def extract_date(text: str) -> str:
-    """Extract date from receipt text"""
+# Date formats recognised on receipts, tried in order
+DATE_PATTERNS = [
+    r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',  # DD/MM/YYYY or MM/DD/YYYY
+    r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',    # YYYY-MM-DD
+    r'(\d{1,2}\s+[A-Za-z]{3,9}\s+\d{2,4})',  # 01 Jan 2023
+    r'([A-Za-z]{3,9}\s+\d{1,2},\s+\d{4})'    # January 1, 2023
+]
+
+def find_date(text: str) -> Optional[str]:
+    """Find the receipt date in text, or None when no date can be parsed"""
     # Look for various date formats
-    date_patterns = [
-        r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',  # DD/MM/YYYY or MM/DD/YYYY
-        r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',    # YYYY-MM-DD
-        r'(\d{1,2}\s+[A-Za-z]{3,9}\s+\d{2,4})',  # 01 Jan 2023
-        r'([A-Za-z]{3,9}\s+\d{1,2},\s+\d{4})'    # January 1, 2023
-    ]
-    
-    for pattern in date_patterns:
+    for pattern in DATE_PATTERNS:
         match = re.search(pattern, text)
         if match:
             try:
@@ -452,7 +1185,11 @@ def extract_date(text: str) -> str:
             except:
                 continue
     
-    return datetime.now().strftime('%Y-%m-%d')  # Default to today if no date found
+    return None
+
+def extract_date(text: str) -> str:
+    """Extract date from receipt text"""
+    return find_date(text) or datetime.now().strftime('%Y-%m-%d')  # Default to today if no date found
 
 def extract_total_amount(text: str) -> float:
     """Extract total amount from receipt text"""
@@ -478,8 +1215,8 @@ def extract_total_amount(text: str) -> float:
     
     return 0.0
 
-def extract_items(text: str) -> List[Dict[str, Any]]:
-    """Extract line items from receipt text"""
+def extract_items(text: str, total_amount: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Extract line items from receipt text, given its total when already extracted"""
     items = []
     
     # Look for item patterns (this is a simple implementation)
@@ -515,7 +1252,7 @@ def extract_items(text: str) -> List[Dict[str, Any]]:
     
     # If no items found but we have a total, create a single item
     if not items:
-        total = extract_total_amount(text)
+        total = extract_total_amount(text) if total_amount is None else total_amount
         if total > 0:
             items.append({
                 'description': 'Purchase',
@@ -527,7 +1264,61 @@ def extract_items(text: str) -> List[Dict[str, Any]]:
 
 def detect_category_from_text(text: str) -> str:
     """Detect the most likely category from receipt text"""
-    return currency_service.detect_category(text)
+    return get_currency_service().detect_category(text)
+
+def extract_expense_data(text: str, parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Run all field extractors over receipt text and build the expense data
+    
+    Args:
+        text: Receipt text
+        parsed: 'total_amount' and 'items' already read from this text by
+                validate_ocr_text; they are extracted again when omitted
+    """
+    with metrics.stage_timer('extract_merchant'):
+        merchant = extract_merchant(text)
+    with metrics.stage_timer('extract_date'):
+        receipt_date = find_date(text)
+    if parsed is not None:
+        total_amount = parsed['total_amount']
+        # The fallback item below must not change the caller's list
+        items = list(parsed['items'])
+    else:
+        with metrics.stage_timer('extract_total_amount'):
+            total_amount = extract_total_amount(text)
+        with metrics.stage_timer('extract_items'):
+            items = extract_items(text, total_amount)
+    with metrics.stage_timer('detect_category'):
+        category = detect_category_from_text(text)
+    
+    # If no items found but we have a total, create a single item
+    if not items and total_amount > 0:
+        items = [{
+            'description': 'Purchase',
+            'quantity': 1,
+            'amount': total_amount
+        }]
+    
+    if merchant == "Unknown Merchant":
+        metrics.DEFAULTED_FIELDS.labels(field='merchant').inc()
+    date_defaulted = receipt_date is None
+    if date_defaulted:
+        metrics.DEFAULTED_FIELDS.labels(field='date').inc()
+        receipt_date = datetime.now().strftime('%Y-%m-%d')  # Default to today if no date found
+    if total_amount <= 0:
+        metrics.DEFAULTED_FIELDS.labels(field='amount').inc()
+    if not items or items[0]['description'] == 'Purchase':
+        metrics.DEFAULTED_FIELDS.labels(field='items').inc()
+    
+    return {
+        'merchant': merchant,
+        'date': receipt_date,
+        'date_defaulted': date_defaulted,  # The date is the processing day, not read from the receipt
+        'amount': total_amount,
+        'currency': 'USD',  # Default, can be extracted from text
+        'category': category,
+        'items': items
+    }
 
 @app.route('/')
 def index():
@@ -541,6 +1332,10 @@ def index():
             'upload': {'method': 'POST', 'path': '/api/upload'},
             'categories': {'method': 'GET', 'path': '/api/categories'},
             'currencies': {'method': 'GET', 'path': '/api/currencies'},
+            'stats': {'method': 'GET', 'path': '/api/stats'},
+            'liveness': {'method': 'GET', 'path': '/api/health/live'},
+            'readiness': {'method': 'GET', 'path': '/api/health/ready'},
+            'metrics': {'method': 'GET', 'path': '/metrics'},
             'exchange_rates': {
                 'method': 'GET', 
                 'path': '/api/exchange-rates/<base_currency>',
@@ -550,47 +1345,84 @@ def index():
                 'method': 'GET', 
                 'path': '/api/report/<report_id>.<format>', 
                 'formats': ['json', 'xlsx']
+            },
+            'reports': {
+                'method': 'GET',
+                'path': '/api/reports',
+                'params': ['limit', 'cursor', 'sort', 'order', 'date_from', 'date_to',
+                           'category', 'merchant', 'min_amount', 'max_amount']
+            },
+            'thumbnail': {
+                'method': 'GET',
+                'path': '/api/receipt/<report_id>/thumbnail'
+            },
+            'analytics': {
+                'method': 'GET',
+                'path': '/api/analytics',
+                'params': ['group_by', 'percentiles', 'date_from', 'date_to', 'category', 'merchant', 'currency']
+            },
+            'search': {
+                'method': 'GET',
+                'path': '/api/reports/search',
+                'params': ['q', 'limit', 'offset']
+            },
+            'profile': {
+                'method': 'GET',
+                'path': '/api/profile/<profile_id>.<format>',
+                'formats': ['folded', 'json']
             }
         }
     })
 
+def fetch_currencies() -> List[Dict[str, str]]:
+    """
+    Fetch the supported currencies with country information.
+    
+    Returns:
+        List[Dict[str, str]]: One entry per currency code.
+        
+    Raises:
+        requests.exceptions.RequestException: The countries API failed.
+    """
+    # Make sure the requests module is imported
+    import requests
+    
+    # Add a timeout to the request
+    response = requests.get(
+        app.config['REST_COUNTRIES_API'],
+        timeout=10  # 10 seconds timeout
+    )
+    
+    # Check if the request was successful
+    response.raise_for_status()
+    
+    # Parse the response
+    countries = response.json()
+    
+    # Process the data
+    currency_list = []
+    for country in countries:
+        if 'currencies' in country:
+            for currency_code, currency_info in country['currencies'].items():
+                currency_list.append({
+                    'code': currency_code.upper(),
+                    'name': currency_info.get('name', ''),
+                    'symbol': currency_info.get('symbol', ''),
+                    'country': country['name'].get('common', '')
+                })
+    
+    # Remove duplicates
+    return list({currency['code']: currency for currency in currency_list}.values())
+
 @app.route('/api/currencies', methods=['GET'])
 def get_currencies():
     """Get list of supported currencies with country information"""
+    import requests
+    
     try:
-        # Make sure the requests module is imported
-        import requests
-        
-        # Add a timeout to the request
-        response = requests.get(
-            'https://restcountries.com/v3.1/all?fields=name,currencies',
-            timeout=10  # 10 seconds timeout
-        )
-        
-        # Check if the request was successful
-        response.raise_for_status()
-        
-        # Parse the response
-        countries = response.json()
-        
-        # Process the data
-        currency_list = []
-        for country in countries:
-            if 'currencies' in country:
-                for currency_code, currency_info in country['currencies'].items():
-                    currency_list.append({
-                        'code': currency_code.upper(),
-                        'name': currency_info.get('name', ''),
-                        'symbol': currency_info.get('symbol', ''),
-                        'country': country['name'].get('common', '')
-                    })
-        
-        # Remove duplicates
-        unique_currencies = {currency['code']: currency for currency in currency_list}.values()
-        
         return jsonify({
             'status': 'success',
-            'currencies': list(unique_currencies)
+            'currencies': fetch_currencies()
         })
         
     except requests.exceptions.RequestException as e:
@@ -603,22 +1435,192 @@ def get_currencies():
             'status': 'error',
             'message': f'An error occurred: {str(e)}'
         }), 500
+
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
     """Get list of expense categories"""
-    return currency_service.get_categories()
+    return get_currency_service().get_categories()
 
 @app.route('/api/exchange-rates/<base_currency>', methods=['GET'])
 def get_exchange_rates(base_currency: str):
     """Get exchange rates for a base currency"""
-    rates = currency_service.get_exchange_rates(base_currency.upper())
+    rates = get_currency_service().get_exchange_rates(base_currency.upper())
     return jsonify({
         'status': 'success',
         'base_currency': base_currency.upper(),
         'rates': rates.get('rates', {})
     })
 
+def process_upload(filepath: str, report_id: str, timings: Dict[str, float]) -> Dict[str, Any]:
+    """
+    OCR a saved upload, extract its expense data and write the JSON and XLSX reports.
+    
+    This is the CPU-bound part of an upload, shared by the Flask view and the
+    ASGI mode, which runs it in a worker thread.
+    
+    Args:
+        filepath (str): Path of the saved upload.
+        report_id (str): Report ID, also the upload's file name stem.
+        timings (Dict[str, float]): Stage timings (ms), updated in place.
+        
+    Returns:
+        Dict[str, Any]: The report data, before cleaning.
+        
+    Raises:
+        AdmissionRejected: The OCR job did not fit in the worker's budget;
+                           the upload has been removed.
+    """
+    # Extract text from the image once the job fits in the worker's budget
+    job_bytes = estimate_upload_bytes(filepath)
+    try:
+        with admission_controller.admit(job_bytes):
+            text, ocr_details = extract_text_with_details(filepath)
+    except AdmissionRejected as e:
+        storage.remove(filepath)
+        metrics.ADMISSION_REJECTED.inc()
+        logger.warning("Upload rejected by admission control", extra={'fields': {
+            'reason': str(e), 'job_mb': round(job_bytes / 2 ** 20, 1), 'retry_after': e.retry_after}})
+        raise
+    timings.update(ocr_details['timings_ms'])
+    parsed = ocr_details.pop('parsed')
+    
+    # Process the extracted text to get receipt data
+    with metrics.stage_timer('extract', timings):
+        expense_data = extract_expense_data(text, parsed)
+    
+    # Prepare the report data
+    report_data = {
+        'report_id': report_id,
+        'filename': os.path.basename(filepath),
+        'uploaded_at': datetime.utcnow().isoformat(),
+        'status': 'processed',
+        'expense_data': expense_data,
+        'ocr': ocr_details,
+        'raw_text': text  # Include raw extracted text for debugging
+    }
+    
+    # Initialize ReportGenerator with the reports directory
+    from odoo.ML.preprocessing.report_generator import ReportGenerator
+    generator = ReportGenerator(
+        base_dir=app.config['REPORTS_FOLDER'],
+        storage=storage,
+        compression=app.config['REPORT_COMPRESSION']
+    )
+    
+    # Generate reports using the ReportGenerator, cleaning the data once for both formats
+    with metrics.stage_timer('correct', timings):
+        cleaned_data = generator.clean_data(report_data)
+    
+    # Compare the corrected fields, as they are stored in the index. The
+    # expense is added in the same step, so concurrent uploads of one
+    # expense in this worker see each other
+    if expense_duplicates is not None:
+        with metrics.stage_timer('expense_duplicates', timings):
+            matches = expense_duplicates.check_and_add(
+                report_id, cleaned_data['expense_data'], limit=app.config['DUPLICATE_MAX_RESULTS'])
+        report_data['expense_duplicates'] = cleaned_data['expense_duplicates'] = matches
+        if matches:
+            metrics.DUPLICATE_EXPENSES.inc()
+            logger.info("Expense matches earlier expenses", extra={'fields': {'matches': matches}})
+    try:
+        with metrics.stage_timer('render_json', timings):
+            report_data['reports'] = {'json': generator.write_json_report(report_id, cleaned_data)}
+        with metrics.stage_timer('render_xlsx', timings):
+            report_data['reports']['xlsx'] = generator.write_excel_report(report_id, cleaned_data)
+    except Exception:
+        # The expense never reaches the index, so it must not match later uploads
+        if expense_duplicates is not None:
+            expense_duplicates.discard(report_id)
+        raise
+    
+    # Record the report in the index with the values of the JSON report, and
+    # its uncorrected OCR text in the full-text index
+    with metrics.stage_timer('index', timings):
+        report_index.add(
+            record_from_report(cleaned_data, report_id, file_sha256(filepath)),
+            text_from_report(report_data)
+        )
+        if ocr_details['image_hash']:
+            report_index.add_image_hash(report_id, int(ocr_details['image_hash'], 16))
+    
+    if expense_dataset is not None:
+        expense_dataset.add(expense_record(
+            report_id, 'service', report_data['filename'], cleaned_data['expense_data'],
+            ocr_tier=ocr_details['tier'], timings_ms=timings
+        ))
+    
+    # Transcoding needs a decode of its own, so it is kept off the request path
+    schedule_archival(filepath, report_id)
+    return report_data
+
+def admission_rejected_body(error: AdmissionRejected) -> Dict[str, Any]:
+    """Body of the 429 response sent when an upload is rejected by admission control"""
+    return {
+        'status': 'error',
+        'message': f'Server busy: {error}',
+        'retry_after': error.retry_after
+    }
+
+def log_processed(report_data: Dict[str, Any], timings: Dict[str, float]):
+    """Log the outcome and stage timings of a processed upload"""
+    logger.info("Receipt processed", extra={'fields': {
+        'reports': report_data['reports'],
+        'ocr_tier': report_data['ocr']['tier'],
+        'merchant': report_data['expense_data']['merchant'],
+        'amount': report_data['expense_data']['amount'],
+        'timings_ms': timings
+    }})
+
+def find_report_path(report_id: str, format: str) -> Optional[str]:
+    """Path of a stored report, or None if it does not exist"""
+    if format != 'json':
+        return storage.find(format, f"{report_id}.{format}")
+    
+    # JSON reports may be stored with any encoding; try the current one first.
+    # Files from before sharding were never compressed, so only the plain
+    # name is looked up outside the shard
+    current = app.config['REPORT_COMPRESSION']
+    encodings = [current] + [e for e in [*report_codec.EXTENSIONS, None] if e != current]
+    return storage.find_any(
+        'json',
+        [report_codec.report_name(report_id, encoding) for encoding in encodings],
+        legacy_names=[report_codec.report_name(report_id, None)]
+    )
+
+def build_report_json(report_id: str, report_path: str,
+                      accept_encoding: Optional[str]) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Build the body of a JSON report download from the stored report.
+    
+    Reports are stored with their envelope, so if the client accepts the
+    stored encoding the stored bytes are sent as they are. Otherwise the
+    report is decompressed, and reports stored before the envelope are
+    wrapped in it.
+    
+    Args:
+        report_id (str): Report ID.
+        report_path (str): Path returned by ``find_report_path``.
+        accept_encoding (str): The request's Accept-Encoding header.
+        
+    Returns:
+        Tuple[bytes, Dict[str, str]]: Response body and headers.
+    """
+    with open(report_path, 'rb') as f:
+        stored = f.read()
+    encoding = report_codec.encoding_of(report_path)
+    
+    enveloped = report_codec.is_enveloped(stored, encoding)
+    headers = {'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'}
+    if enveloped and encoding and report_codec.accepts_encoding(accept_encoding, encoding):
+        headers['Content-Encoding'] = encoding
+        return stored, headers
+    body = report_codec.decompress(stored, encoding)
+    if not enveloped:
+        body = report_codec.envelope(report_id, body)
+    return body, headers
+
 @app.route('/api/upload', methods=['POST'])
+@profiled
 def upload_file():
     """Handle file uploads and process receipts using OCR"""
     if 'file' not in request.files:
@@ -631,6 +1633,10 @@ def upload_file():
     try:
         # Generate a unique report ID
         report_id = str(uuid.uuid4())
+        g.report_id = report_id
+        set_correlation_id(report_id)
+        request_started = time.perf_counter()
+        timings = {}
         
         # Save the uploaded file
         file_ext = Path(file.filename).suffix.lower()
@@ -638,70 +1644,40 @@ def upload_file():
             return jsonify({'error': 'Unsupported file type'}), 400
         
         filename = f"{report_id}{file_ext}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Extract text from the image
-        text = extract_text_from_image(filepath)
+        with metrics.stage_timer('save', timings):
+            with storage.writer('uploads', filename) as temp_path:
+                file.save(temp_path)
+        filepath = storage.path('uploads', filename)
         
-        # Process the extracted text to get receipt data
-        merchant = extract_merchant(text)
-        receipt_date = extract_date(text)
-        total_amount = extract_total_amount(text)
-        items = extract_items(text)
-        
-        # If no items found but we have a total, create a single item
-        if not items and total_amount > 0:
-            items = [{
-                'description': 'Purchase',
-                'quantity': 1,
-                'amount': total_amount
-            }]
+        try:
+            report_data = process_upload(filepath, report_id, timings)
+        except AdmissionRejected as e:
+            response = jsonify(admission_rejected_body(e))
+            response.status_code = 429
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
         
-        # Prepare the report data
-        report_data = {
-            'report_id': report_id,
-            'filename': filename,
-            'uploaded_at': datetime.utcnow().isoformat(),
-            'status': 'processed',
-            'expense_data': {
-                'merchant': merchant,
-                'date': receipt_date,
-                'amount': total_amount,
-                'currency': 'USD',  # Default, can be extracted from text
-                'category': detect_category_from_text(text),
-                'items': items
-            },
-            'raw_text': text  # Include raw extracted text for debugging
+        timings['total'] = round((time.perf_counter() - request_started) * 1000, 2)
+        log_processed(report_data, timings)
+        download_links = {
+            'json': f'/api/report/{report_id}.json',
+            'xlsx': f'/api/report/{report_id}.xlsx'
         }
-        
-        # Initialize ReportGenerator with the reports directory
-        generator = ReportGenerator(base_dir=app.config['REPORTS_FOLDER'])
-        
-        # Generate reports using the ReportGenerator
-        report_paths = generator.generate_reports(report_id, report_data)
-        
-        # Log the generated report paths
-        print(f"Generated reports:")
-        for format, path in report_paths.items():
-            print(f"- {format.upper()}: {path} ({os.path.getsize(path)} bytes)")
-            
-        print(f"Extracted text: {text[:200]}...")
+        if 'profile_id' in g:
+            download_links['profile'] = f'/api/profile/{g.profile_id}.folded'
         return jsonify({
             'status': 'success',
             'message': 'File uploaded and processed successfully',
             'report_id': report_id,
-            'download_links': {
-                'json': f'/api/report/{report_id}.json',
-                'xlsx': f'/api/report/{report_id}.xlsx'
-            }
+            'duplicates': report_data['ocr']['duplicates'],
+            'expense_duplicates': report_data.get('expense_duplicates', []),
+            'download_links': download_links
         })
         
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        print(f"Error processing file: {str(e)}")
-        print(f"Error details: {error_details}")
+        logger.exception("Error processing file")
         return jsonify({
             'status': 'error',
             'message': f'Failed to process file: {str(e)}',
@@ -710,33 +1686,132 @@ def upload_file():
 
 
 
+@app.route('/api/reports', methods=['GET'])
+def list_reports():
+    """
+    List processed reports, newest first, one page at a time
+    
+    GET params:
+        - limit: Page size (default 50, max 200)
+        - cursor: next_cursor of the previous page
+        - sort: uploaded_at (default), date or amount
+        - order: desc (default) or asc
+        - date_from, date_to: Receipt date range (YYYY-MM-DD), inclusive;
+                              needs sort=date
+        - category: Exact category
+        - merchant: Merchant name, case-insensitive
+        - min_amount, max_amount: Amount range, inclusive; needs sort=amount
+    """
+    args = request.args
+    try:
+        page = report_index.list(
+            limit=int(args.get('limit', 50)),
+            cursor=args.get('cursor'),
+            sort=args.get('sort', 'uploaded_at'),
+            descending=args.get('order', 'desc') != 'asc',
+            date_from=args.get('date_from'),
+            date_to=args.get('date_to'),
+            category=args.get('category'),
+            merchant=args.get('merchant'),
+            min_amount=float(args['min_amount']) if 'min_amount' in args else None,
+            max_amount=float(args['max_amount']) if 'max_amount' in args else None
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    for report in page['reports']:
+        report['download_links'] = {
+            'json': f"/api/report/{report['report_id']}.json",
+            'xlsx': f"/api/report/{report['report_id']}.xlsx"
+        }
+    return jsonify({
+        'status': 'success',
+        'reports': page['reports'],
+        'next_cursor': page['next_cursor']
+    })
+
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """
+    Spend totals, counts, means and percentiles over processed receipts
+    
+    GET params:
+        - group_by: Comma-separated keys: category, merchant, currency,
+                    day, week, month, quarter, year (default category).
+                    Results are always split by currency as well.
+        - percentiles: Comma-separated percentiles of the amount (default 50,90)
+        - date_from, date_to: Receipt date range (YYYY-MM-DD), inclusive
+        - category, merchant, currency: Filters; merchant is a prefix
+    """
+    args = request.args
+    try:
+        result = spend_analytics.summary(
+            group_by=[key.strip() for key in args.get('group_by', 'category').split(',') if key.strip()],
+            percentiles=[float(p) for p in args.get('percentiles', '50,90').split(',') if p.strip()],
+            date_from=args.get('date_from'),
+            date_to=args.get('date_to'),
+            category=args.get('category'),
+            merchant=args.get('merchant'),
+            currency=args.get('currency')
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    if result['cached']:
+        metrics.CACHE_HITS.labels(cache='analytics').inc()
+    return jsonify({'status': 'success', **result})
+
+@app.route('/api/reports/search', methods=['GET'])
+def search_reports():
+    """
+    Full-text search over receipt text, best matches first
+    
+    GET params:
+        - q: Words that must all appear; end a word with * to match a prefix
+        - limit: Page size (default 20, max 200)
+        - offset: next_offset of the previous page
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'status': 'error', 'message': 'Missing search query (q)'}), 400
+    try:
+        page = report_index.search(
+            query,
+            limit=int(request.args.get('limit', 20)),
+            offset=int(request.args.get('offset', 0))
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    for report in page['reports']:
+        report['download_links'] = {
+            'json': f"/api/report/{report['report_id']}.json",
+            'xlsx': f"/api/report/{report['report_id']}.xlsx"
+        }
+    return jsonify({
+        'status': 'success',
+        'query': query,
+        'reports': page['reports'],
+        'next_offset': page['next_offset']
+    })
+
 @app.route('/api/report/<report_id>.<format>', methods=['GET'])
+@profiled
 def get_report(report_id, format):
     """Download report in specified format"""
+    set_correlation_id(report_id)
     if format not in ['json', 'xlsx']:
         return jsonify({'error': 'Unsupported report format'}), 400
     
-    # Construct the path based on the new directory structure
-    report_path = os.path.join(app.config['REPORTS_FOLDER'], format, f"{report_id}.{format}")
-    
-    if not os.path.exists(report_path):
-        # Fallback to old path for backward compatibility
-        old_path = os.path.join(app.config['REPORTS_FOLDER'], f"{report_id}.{format}")
-        if os.path.exists(old_path):
-            report_path = old_path
-        else:
-            return jsonify({'error': 'Report not found'}), 404
+    report_path = find_report_path(report_id, format)
+    if report_path is None:
+        return jsonify({'error': 'Report not found'}), 404
     
     try:
         if format == 'json':
-            with open(report_path, 'r', encoding='utf-8') as f:
-                report_data = json.load(f)
-            response = make_response(jsonify({
-                'status': 'success',
-                'report_id': report_id,
-                'data': report_data
-            }))
-            response.headers['Content-Type'] = 'application/json'
+            body, headers = build_report_json(report_id, report_path, request.headers.get('Accept-Encoding'))
+            response = make_response(body)
+            response.headers.update(headers)
             return response
         else:  # xlsx
             return send_file(
@@ -751,24 +1826,79 @@ def get_report(report_id, format):
                 }
             )
     except Exception as e:
-        import traceback
-        print(f"Error in get_report: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Error in get_report")
         return jsonify({
             'status': 'error',
             'message': f'Failed to generate report: {str(e)}'
         }), 500
 
 
+@app.route('/api/receipt/<report_id>/thumbnail', methods=['GET'])
+def get_thumbnail(report_id):
+    """Serve the thumbnail of a receipt; it is written shortly after the upload is processed"""
+    thumbnail_path = None
+    # Try the configured format first, then thumbnails written with the other one
+    for image_format in dict.fromkeys([app.config['ARCHIVE_FORMAT'], 'webp', 'jpeg']):
+        extension = extension_for(image_format)
+        thumbnail_path = storage.find('thumbnails', f"{report_id}{extension}")
+        if thumbnail_path is not None:
+            break
+    if thumbnail_path is None:
+        return jsonify({'error': 'Thumbnail not found'}), 404
+    
+    # A thumbnail never changes, but with a retention period it does not outlive it
+    retention_seconds = app.config['STORAGE_RETENTION_DAYS'].get('thumbnails', 0) * 86400
+    max_age = app.config['THUMBNAIL_MAX_AGE']
+    if retention_seconds > 0:
+        max_age = int(min(max_age, retention_seconds))
+    response = send_file(
+        os.path.abspath(thumbnail_path),
+        mimetype=CONTENT_TYPES[extension],
+        max_age=max_age,
+        conditional=True,
+        etag=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = retention_seconds <= 0
+    return response
+
+@app.route('/api/profile/<profile_id>.<format>', methods=['GET'])
+def get_profile(profile_id, format):
+    """Download a request profile as folded stacks or its JSON metadata"""
+    if not has_profile_token():
+        return jsonify({'error': 'Profile token required'}), 403
+    if format not in ['folded', 'json'] or not re.fullmatch(r'[0-9a-f]{32}', profile_id):
+        return jsonify({'error': 'Profile not found'}), 404
+    
+    profile_path = os.path.join(app.config['REPORTS_FOLDER'], 'profiles', f"{profile_id}.{format}")
+    if not os.path.exists(profile_path):
+        return jsonify({'error': 'Profile not found'}), 404
+    
+    return send_file(
+        os.path.abspath(profile_path),
+        mimetype='text/plain' if format == 'folded' else 'application/json',
+        as_attachment=format == 'folded',
+        download_name=f"{profile_id}.{format}"
+    )
 
 if __name__ == '__main__':
+    setup_logging()
+    
     # Create required directories
     for folder in [
         app.config['UPLOAD_FOLDER'],
         app.config['REPORTS_FOLDER'],
         os.path.join(app.config['REPORTS_FOLDER'], 'json'),
-        os.path.join(app.config['REPORTS_FOLDER'], 'xlsx')
+        os.path.join(app.config['REPORTS_FOLDER'], 'xlsx'),
+        os.path.join(app.config['REPORTS_FOLDER'], 'profiles')
     ]:
         os.makedirs(folder, exist_ok=True)
     
-    # Start the Flask development server
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Start the Flask development server; use FLASK_DEBUG=1 for the debugger and reloader
+    start_warm_up()
+    start_retention_gc()
+    app.run(
+        debug=os.environ.get('FLASK_DEBUG', '0') == '1',
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', 5000))
+    )
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+Upload Archival Module
+
+Transcodes receipt photos into compact archival images and small thumbnails
+in one pass. The archival copy is downscaled, optionally grayscale, and
+encoded as WebP or JPEG at a configurable quality. It is typically several
+times smaller than a phone photo and still readable. The thumbnail is
+what approval dashboards load instead of the original.
+
+JPEG sources are decoded at a reduced scale (1/2, 1/4 or 1/8) when that
+still covers the archival size, which is much cheaper than a full decode.
+PDF uploads are left as they are.
+"""
+
+import os
+from typing import Dict, Optional
+
+from odoo.ML.preprocessing.admission import read_image_size
+from odoo.ML.preprocessing.ocr_engine import downscale
+
+# Content types of the archival formats, by file extension
+CONTENT_TYPES = {'.webp': 'image/webp', '.jpg': 'image/jpeg'}
+
+# Reduced-scale decode flags by factor, best (largest) factor first
+_REDUCED_FLAGS = {
+    True: [(8, 'IMREAD_REDUCED_GRAYSCALE_8'), (4, 'IMREAD_REDUCED_GRAYSCALE_4'),
+           (2, 'IMREAD_REDUCED_GRAYSCALE_2')],
+    False: [(8, 'IMREAD_REDUCED_COLOR_8'), (4, 'IMREAD_REDUCED_COLOR_4'),
+            (2, 'IMREAD_REDUCED_COLOR_2')]
+}
+
+
+def extension_for(image_format: str) -> str:
+    """File extension of an archival format, 'webp' or 'jpeg'"""
+    return '.webp' if image_format == 'webp' else '.jpg'
+
+
+def _decode(path: str, max_side: int, grayscale: bool):
+    import cv2
+
+    full_flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    size = read_image_size(path)
+    if size and path.lower().endswith(('.jpg', '.jpeg')):
+        for factor, name in _REDUCED_FLAGS[grayscale]:
+            if max(size) // factor >= max_side:
+                return cv2.imread(path, getattr(cv2, name))
+    return cv2.imread(path, full_flag)
+
+
+def _encode(image, image_format: str, quality: int) -> bytes:
+    import cv2
+
+    if image_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    ok, buffer = cv2.imencode(extension_for(image_format), image, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {image_format}")
+    return buffer.tobytes()
+
+
+def archive_upload(source_path: str, report_id: str, storage, image_format: str = 'webp',
+                   max_side: int = 2000, quality: int = 60, grayscale: bool = True,
+                   thumbnail_side: int = 320, thumbnail_quality: int = 70,
+                   keep_original: bool = True) -> Optional[Dict[str, int]]:
+    """
+    Write the archival image and thumbnail of an upload.
+
+    Args:
+        source_path (str): Path of the original upload.
+        report_id (str): Report ID; names the 'archive' and 'thumbnails' artifacts.
+        storage (Storage): Backend the artifacts are written to.
+        image_format (str): 'webp' or 'jpeg'.
+        max_side (int): Longest side (px) of the archival image.
+        quality (int): Encoder quality of the archival image (0-100).
+        grayscale (bool): Store the archival image and thumbnail in grayscale.
+        thumbnail_side (int): Longest side (px) of the thumbnail.
+        thumbnail_quality (int): Encoder quality of the thumbnail.
+        keep_original (bool): Keep the original upload; otherwise it is
+                              removed once the archival image is stored.
+
+    Returns:
+        Optional[Dict[str, int]]: Byte sizes of the original, archival
+        image and thumbnail, or None if the upload is not an image.
+    """
+    if not source_path.lower().endswith(('.jpg', '.jpeg', '.png')):
+        return None
+    image = _decode(source_path, max_side, grayscale)
+    if image is None:
+        return None
+
+    image = downscale(image, max_side)
+    archived = _encode(image, image_format, quality)
+    thumbnail = _encode(downscale(image, thumbnail_side), image_format, thumbnail_quality)
+
+    extension = extension_for(image_format)
+    with storage.writer('archive', f"{report_id}{extension}") as path:
+        with open(path, 'wb') as f:
+            f.write(archived)
+    with storage.writer('thumbnails', f"{report_id}{extension}") as path:
+        with open(path, 'wb') as f:
+            f.write(thumbnail)
+
+    sizes = {
+        'original': os.path.getsize(source_path),
+        'archive': len(archived),
+        'thumbnail': len(thumbnail)
+    }
+    if not keep_original:
+        storage.remove(source_path)
+    return sizes
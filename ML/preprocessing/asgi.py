@@ -0,0 +1,277 @@
+"""
+ASGI Serving Module
+
+Serves the receipt API from an ASGI server. Uploads, report downloads,
+categories and currencies are async endpoints. Request bodies are received
+and written to disk without holding a thread, and reports are streamed back
+in chunks. A slow client therefore costs an open connection, not a worker
+thread. Upload bodies are counted as they arrive and cut off past
+MAX_CONTENT_LENGTH, whether or not the client sent a Content-Length.
+
+The CPU-bound work (OCR, extraction, report rendering) and blocking calls
+(the currency catalog, the country list) run in worker threads. OCR runs
+through the same reader pool and admission control as the Flask app, behind
+a capacity limiter sized to the admission limits, so OCR concurrency stays
+bounded however many connections are open.
+
+Every other route is served by the Flask app through a WSGI bridge.
+On-demand profiling (X-Profile) is only available on the Flask routes.
+
+Usage:
+    uvicorn odoo.ML.preprocessing.asgi:application --host 0.0.0.0 --port 5000
+    python -m odoo.ML.preprocessing.asgi
+"""
+
+import functools
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import anyio
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.routing import Mount, Route
+
+from odoo.ML.preprocessing import app as service
+from odoo.ML.preprocessing import metrics
+from odoo.ML.preprocessing.admission import AdmissionRejected
+from odoo.ML.preprocessing.structured_logging import set_correlation_id
+
+config = service.app.config
+CHUNK_SIZE = 256 * 1024
+
+
+def tracked(endpoint):
+    """Count a native endpoint's requests in the in-flight stats, like the Flask request hooks"""
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        service.track_request_start()
+        try:
+            return await endpoint(request)
+        finally:
+            service.track_request_end()
+    return wrapper
+
+
+class BodyTooLarge(Exception):
+    """The request body grew past the size limit while being received"""
+
+
+def limit_body(receive, max_bytes: int):
+    """Wrap an ASGI receive callable so it raises BodyTooLarge once more than ``max_bytes`` arrived"""
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > max_bytes:
+                raise BodyTooLarge()
+        return message
+    return limited_receive
+
+
+def error(message: str, status_code: int, **fields) -> JSONResponse:
+    return JSONResponse({'status': 'error', 'message': message, **fields}, status_code=status_code)
+
+
+async def save_upload(upload, filepath: str) -> int:
+    """Write an uploaded file to disk chunk by chunk; returns the bytes written"""
+    written = 0
+    async with await anyio.open_file(filepath, 'wb') as f:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                return written
+            written += len(chunk)
+            if written > config['MAX_CONTENT_LENGTH']:
+                raise ValueError('File too large')
+            await f.write(chunk)
+
+
+@tracked
+async def upload_file(request):
+    """Handle file uploads and process receipts using OCR"""
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > config['MAX_CONTENT_LENGTH']:
+        return JSONResponse({'error': 'File too large'}, status_code=413)
+
+    # The multipart body is received asynchronously and spooled to a temporary file.
+    # A chunked body, or one longer than its Content-Length, is cut off at the limit.
+    request = Request(request.scope, limit_body(request.receive, config['MAX_CONTENT_LENGTH']))
+    try:
+        async with request.form(max_files=1) as form:
+            file = form.get('file')
+            if file is None or isinstance(file, str):
+                return JSONResponse({'error': 'No file part'}, status_code=400)
+            if not file.filename:
+                return JSONResponse({'error': 'No selected file'}, status_code=400)
+
+            file_ext = Path(file.filename).suffix.lower()
+            if file_ext not in ['.jpg', '.jpeg', '.png', '.pdf']:
+                return JSONResponse({'error': 'Unsupported file type'}, status_code=400)
+
+            report_id = str(uuid.uuid4())
+            set_correlation_id(report_id)
+            request_started = time.perf_counter()
+            timings = {}
+            filename = f"{report_id}{file_ext}"
+            try:
+                with metrics.stage_timer('save', timings):
+                    with service.storage.writer('uploads', filename) as temp_path:
+                        await save_upload(file, temp_path)
+            except ValueError:
+                return JSONResponse({'error': 'File too large'}, status_code=413)
+            filepath = service.storage.path('uploads', filename)
+    except BodyTooLarge:
+        return JSONResponse({'error': 'File too large'}, status_code=413)
+
+    try:
+        report_data = await anyio.to_thread.run_sync(
+            service.process_upload, filepath, report_id, timings,
+            limiter=request.app.state.ocr_limiter
+        )
+    except AdmissionRejected as e:
+        return JSONResponse(service.admission_rejected_body(e), status_code=429,
+                            headers={'Retry-After': str(e.retry_after)})
+    except Exception as e:
+        service.logger.exception("Error processing file")
+        return error(f'Failed to process file: {str(e)}', 500)
+
+    timings['total'] = round((time.perf_counter() - request_started) * 1000, 2)
+    service.log_processed(report_data, timings)
+    return JSONResponse({
+        'status': 'success',
+        'message': 'File uploaded and processed successfully',
+        'report_id': report_id,
+        'duplicates': report_data['ocr']['duplicates'],
+        'expense_duplicates': report_data.get('expense_duplicates', []),
+        'download_links': {
+            'json': f'/api/report/{report_id}.json',
+            'xlsx': f'/api/report/{report_id}.xlsx'
+        }
+    })
+
+
+@tracked
+async def get_report(request):
+    """Download report in specified format"""
+    report_id = request.path_params['report_id']
+    format = request.path_params['format']
+    set_correlation_id(report_id)
+    if format not in ['json', 'xlsx']:
+        return JSONResponse({'error': 'Unsupported report format'}, status_code=400)
+
+    report_path = await run_in_threadpool(service.find_report_path, report_id, format)
+    if report_path is None:
+        return JSONResponse({'error': 'Report not found'}, status_code=404)
+
+    try:
+        if format == 'json':
+            body, headers = await run_in_threadpool(
+                service.build_report_json, report_id, report_path, request.headers.get('accept-encoding'))
+            return Response(body, headers=headers)
+        # Streamed from disk in chunks as the client reads them
+        return FileResponse(
+            report_path,
+            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            filename=f"expense_report_{report_id}.xlsx"
+        )
+    except Exception as e:
+        service.logger.exception("Error in get_report")
+        return error(f'Failed to generate report: {str(e)}', 500)
+
+
+@tracked
+async def handle_categories(request):
+    """Detect a category (GET ?detect=), add categories (POST) or list them (GET ?count=)"""
+    # The first call fetches the currency catalog over the network
+    currency_service = await run_in_threadpool(service.get_currency_service)
+
+    if request.method == 'GET' and 'detect' in request.query_params:
+        return JSONResponse({
+            'status': 'success',
+            'detected_category': currency_service.detect_category(request.query_params['detect'])
+        })
+
+    if request.method == 'POST':
+        try:
+            data = await request.json() or {}
+        except ValueError:
+            data = {}
+        if isinstance(data, dict) and isinstance(data.get('categories'), list):
+            added = currency_service.add_categories(data['categories'])
+            return JSONResponse({
+                'status': 'success',
+                'added': added,
+                'total_categories': len(currency_service.get_categories())
+            })
+        return error('Invalid request', 400)
+
+    try:
+        count = min(int(request.query_params.get('count', 0)), 100) or None
+    except (TypeError, ValueError):
+        count = None
+    return JSONResponse({
+        'status': 'success',
+        'categories': list(currency_service.get_categories(count=count))
+    })
+
+
+@tracked
+async def get_currencies(request):
+    """Get list of supported currencies with country information"""
+    import requests
+
+    try:
+        return JSONResponse({
+            'status': 'success',
+            'currencies': await run_in_threadpool(service.fetch_currencies)
+        })
+    except requests.exceptions.RequestException as e:
+        return error(f'Failed to fetch currencies: {str(e)}', 500)
+    except Exception as e:
+        return error(f'An error occurred: {str(e)}', 500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    service.setup_logging()
+    for folder in [config['UPLOAD_FOLDER'], config['REPORTS_FOLDER']]:
+        os.makedirs(folder, exist_ok=True)
+    # Threads that may run uploads at once: the admitted jobs and the admission
+    # queue, plus one spare that turns further uploads into quick 429s from the
+    # full queue. Uploads beyond that wait here without holding a thread.
+    app.state.ocr_limiter = anyio.CapacityLimiter(
+        config['ADMISSION_MAX_CONCURRENT'] + config['ADMISSION_MAX_QUEUE'] + 1)
+    service.start_warm_up()
+    service.start_retention_gc()
+    yield
+
+
+application = Starlette(
+    routes=[
+        Route('/api/upload', upload_file, methods=['POST']),
+        Route('/api/report/{report_id}.{format}', get_report, methods=['GET']),
+        Route('/api/categories', handle_categories, methods=['GET', 'POST']),
+        Route('/api/currencies', get_currencies, methods=['GET']),
+        Mount('/', app=WSGIMiddleware(service.app))
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(
+        application,
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', 5000))
+    )
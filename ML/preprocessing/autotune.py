@@ -0,0 +1,230 @@
+"""
+CPU thread autotuner for OCR inference.
+
+torch uses every core for intra-op parallelism by default. With several
+reader threads per worker and several workers per machine, that
+oversubscribes the CPU and throughput drops as concurrency rises. This tool
+benchmarks the bundled receipts across combinations of torch intra-op
+threads, reader pool size and worker count on the current machine. It then
+stores the fastest combination in a JSON file.
+
+The service (``app.py``, ``gunicorn.conf.py``) and ``preprocess.py`` read that
+file at startup via ``load_tuning`` and ``apply_tuning``. Explicit
+environment variables (OCR_TORCH_THREADS, OCR_READER_POOL_SIZE,
+GUNICORN_WORKERS) still take precedence.
+
+Usage:
+    python autotune.py
+    python autotune.py --threads 1,2,4 --pool-sizes 1,2 --workers 1,2,4 --limit 12
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_TUNING_FILE = Path(__file__).resolve().parent / 'autotune.json'
+DEFAULT_IMAGES_DIR = Path(__file__).resolve().parents[2] / 'realistic_test_receipts'
+
+
+def tuning_file() -> Optional[Path]:
+    """Path of the tuning file; OCR_TUNING_FILE overrides it and an empty value disables tuning"""
+    path = os.environ.get('OCR_TUNING_FILE', str(DEFAULT_TUNING_FILE))
+    return Path(path) if path else None
+
+
+def load_tuning(path: Optional[Path] = None) -> Dict[str, int]:
+    """
+    Read the best configuration stored by a tuning run.
+
+    Args:
+        path (Path): Tuning file. Defaults to ``tuning_file()``.
+
+    Returns:
+        Dict[str, int]: ``torch_threads``, ``reader_pool_size`` and
+        ``workers``, or an empty dict when there is no usable tuning file.
+    """
+    path = path or tuning_file()
+    if not path or not path.exists():
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            tuning = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # A tuning made on another machine shape does not apply here
+    if tuning.get('machine', {}).get('cpu_count') != os.cpu_count():
+        return {}
+    return tuning.get('best', {})
+
+
+def apply_tuning(torch_threads: Optional[int] = None) -> Optional[int]:
+    """
+    Limit torch's intra-op threads for this process.
+
+    Sets the OpenMP/MKL environment for a torch that is not imported yet and
+    calls ``torch.set_num_threads`` on one that is.
+
+    Args:
+        torch_threads (int): Threads to use. Defaults to OCR_TORCH_THREADS,
+                             then to the tuning file.
+
+    Returns:
+        Optional[int]: The applied thread count, or None if nothing is set.
+    """
+    if torch_threads is None:
+        torch_threads = int(os.environ.get('OCR_TORCH_THREADS', 0)) or load_tuning().get('torch_threads')
+    if not torch_threads:
+        return None
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(variable, str(torch_threads))
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(torch_threads)
+    return torch_threads
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round((len(ordered) - 1) * pct / 100.0)))]
+
+
+def _worker(images: List[str], pool_size: int, torch_threads: int, barrier, results):
+    """Benchmark process: warm up the app pipeline, then OCR its share of the images"""
+    os.environ.update(
+        OCR_READER_POOL_SIZE=str(pool_size),
+        OCR_TORCH_THREADS=str(torch_threads),
+        OCR_TUNING_FILE='',
+        LOG_LEVEL='WARNING',
+        ADMISSION_MAX_CONCURRENT=str(pool_size)
+    )
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    os.chdir(tempfile.mkdtemp(prefix='autotune-'))
+    apply_tuning(torch_threads)
+
+    from odoo.ML.preprocessing.app import warm_up, extract_text_with_details
+    warm_up()
+
+    pending = list(images)
+    lock = threading.Lock()
+    latencies = []
+
+    def run():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                path = pending.pop()
+            started = time.perf_counter()
+            extract_text_with_details(path)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    barrier.wait()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run) for _ in range(pool_size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put({'wall': time.perf_counter() - started, 'latencies': latencies})
+
+
+def benchmark(images: List[str], torch_threads: int, pool_size: int, workers: int) -> Dict[str, Any]:
+    """Run one configuration and measure throughput and latency"""
+    import multiprocessing
+
+    # Spawn, not fork: torch's thread pool does not survive a fork
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(images[index::workers], pool_size, torch_threads, barrier, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = [value for outcome in outcomes for value in outcome['latencies']]
+    wall = max(outcome['wall'] for outcome in outcomes)
+    return {
+        'torch_threads': torch_threads,
+        'reader_pool_size': pool_size,
+        'workers': workers,
+        'receipts': len(latencies),
+        'throughput_per_second': round(len(latencies) / wall, 3) if wall else 0.0,
+        'p50_seconds': round(_percentile(latencies, 50), 3),
+        'p95_seconds': round(_percentile(latencies, 95), 3)
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return sorted({int(part) for part in value.split(',') if part.strip()})
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_counts = ','.join(str(n) for n in (1, 2, 4, 8, 16) if n <= cpus)
+    parser = argparse.ArgumentParser(description='Tune torch threads, reader pool size and workers')
+    parser.add_argument('--images', type=Path, default=DEFAULT_IMAGES_DIR, help='Directory of receipt images')
+    parser.add_argument('--limit', type=int, default=None, help='Number of images per configuration')
+    parser.add_argument('--threads', type=_int_list, default=_int_list(default_counts),
+                        help='torch intra-op thread counts to try')
+    parser.add_argument('--pool-sizes', type=_int_list, default=[1, 2], help='Reader pool sizes to try')
+    parser.add_argument('--workers', type=_int_list, default=_int_list(default_counts),
+                        help='Worker process counts to try')
+    parser.add_argument('--max-oversubscription', type=float, default=2.0,
+                        help='Skip configurations using more than this many threads per core')
+    parser.add_argument('--output', type=Path, default=None, help='Tuning file (defaults to OCR_TUNING_FILE)')
+    args = parser.parse_args()
+
+    images = sorted(str(path) for path in args.images.iterdir()
+                    if path.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    if args.limit:
+        images = images[:args.limit]
+    if not images:
+        parser.error(f"No images found in {args.images}")
+
+    results = []
+    for workers in args.workers:
+        for pool_size in args.pool_sizes:
+            for torch_threads in args.threads:
+                if workers * pool_size * torch_threads > cpus * args.max_oversubscription:
+                    continue
+                result = benchmark(images, torch_threads, pool_size, workers)
+                results.append(result)
+                print(f"workers={workers} pool={pool_size} torch_threads={torch_threads}: "
+                      f"{result['throughput_per_second']:.3f} receipts/s, p95 {result['p95_seconds']:.2f}s")
+
+    if not results:
+        parser.error('Every configuration exceeded --max-oversubscription')
+
+    best = max(results, key=lambda r: (r['throughput_per_second'], -r['p95_seconds']))
+    output = args.output or tuning_file() or DEFAULT_TUNING_FILE
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': {'cpu_count': cpus, 'platform': platform.platform(), 'python': platform.python_version()},
+            'images': len(images),
+            'best': {key: best[key] for key in ('torch_threads', 'reader_pool_size', 'workers')},
+            'results': results
+        }, f, indent=2)
+
+    print(f"\nBest: workers={best['workers']} pool={best['reader_pool_size']} "
+          f"torch_threads={best['torch_threads']} ({best['throughput_per_second']:.3f} receipts/s)")
+    print(f"Saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
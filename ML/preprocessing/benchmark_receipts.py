@@ -0,0 +1,248 @@
+"""
+End-to-end receipt benchmark.
+
+Runs the full OCR pipeline in-process (no server needed) over a directory of
+receipt images and scores the extracted fields against a ground-truth file.
+Reports field-level accuracy, per-stage latency percentiles, throughput and
+peak RSS, and writes everything as JSON so runs can be compared.
+
+Usage:
+    python benchmark_receipts.py
+    python benchmark_receipts.py --output run.json --compare baseline.json
+"""
+
+import argparse
+import json
+import platform
+import re
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from odoo.ML.preprocessing.app import app, extract_text_with_details, extract_expense_data
+from odoo.ML.preprocessing.report_generator import ReportGenerator
+
+DEFAULT_IMAGES_DIR = Path(__file__).resolve().parents[2] / 'realistic_test_receipts'
+STAGES = ['decode', 'orient', 'preprocess', 'ocr', 'extract', 'correct', 'render', 'total']
+FIELDS = ['merchant', 'date', 'total', 'currency']
+AMOUNT_TOLERANCE = 0.01
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile with linear interpolation between ranks"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in megabytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase a merchant name and drop everything but letters and digits"""
+    return re.sub(r'[^a-z0-9]', '', (name or '').lower())
+
+
+def score_items(predicted: List[Dict[str, Any]], expected: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Match predicted line items to expected ones by amount"""
+    remaining = [item['amount'] for item in expected]
+    matched = 0
+    for item in predicted:
+        for index, amount in enumerate(remaining):
+            if abs(float(item.get('amount', 0)) - amount) <= AMOUNT_TOLERANCE:
+                matched += 1
+                del remaining[index]
+                break
+    return {'matched': matched, 'predicted': len(predicted), 'expected': len(expected)}
+
+
+def score_receipt(expense: Dict[str, Any], truth: Dict[str, Any]) -> Dict[str, Any]:
+    """Compare extracted expense data with its ground truth entry"""
+    scores = {
+        'merchant': normalize_name(expense['merchant']) == normalize_name(truth['merchant']),
+        'total': abs(float(expense['amount']) - float(truth['total'])) <= AMOUNT_TOLERANCE,
+        'currency': expense.get('currency') == truth.get('currency'),
+        # Receipts whose date is not legible have no expected date
+        'date': expense['date'] == truth['date'] if truth.get('date') else None
+    }
+    scores['items'] = score_items(expense.get('items', []), truth.get('items', []))
+    return scores
+
+
+def process_receipt(image_path: Path, generator: ReportGenerator) -> Dict[str, Any]:
+    """Run one receipt through every pipeline stage and time each of them"""
+    started = time.perf_counter()
+    text, ocr_details = extract_text_with_details(str(image_path))
+    timings = dict(ocr_details['timings_ms'])
+    timings['ocr'] = timings.pop('ocr_low_res', 0.0) + timings.pop('ocr_full_res', 0.0)
+
+    stage_started = time.perf_counter()
+    expense_data = extract_expense_data(text, ocr_details.pop('parsed'))
+    timings['extract'] = (time.perf_counter() - stage_started) * 1000
+
+    report_id = image_path.stem
+    report_data = {
+        'report_id': report_id,
+        'filename': image_path.name,
+        'status': 'processed',
+        'expense_data': expense_data,
+        'ocr': ocr_details,
+        'raw_text': text
+    }
+
+    stage_started = time.perf_counter()
+    cleaned_data = generator.clean_data(report_data)
+    timings['correct'] = (time.perf_counter() - stage_started) * 1000
+
+    stage_started = time.perf_counter()
+    generator.write_json_report(report_id, cleaned_data)
+    generator.write_excel_report(report_id, cleaned_data)
+    timings['render'] = (time.perf_counter() - stage_started) * 1000
+
+    timings['total'] = (time.perf_counter() - started) * 1000
+    return {
+        'file': image_path.name,
+        'ocr_tier': ocr_details['tier'],
+        'expense_data': expense_data,
+        'timings_ms': {stage: round(timings.get(stage, 0.0), 2) for stage in STAGES}
+    }
+
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Aggregate per-receipt results into accuracy and latency figures"""
+    accuracy = {}
+    for field in FIELDS:
+        scored = [r['scores'][field] for r in results if r['scores'][field] is not None]
+        accuracy[field] = round(sum(scored) / len(scored), 4) if scored else None
+
+    matched = sum(r['scores']['items']['matched'] for r in results)
+    predicted = sum(r['scores']['items']['predicted'] for r in results)
+    expected = sum(r['scores']['items']['expected'] for r in results)
+    precision = matched / predicted if predicted else 0.0
+    recall = matched / expected if expected else 0.0
+    accuracy['items'] = {
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(2 * precision * recall / (precision + recall), 4) if matched else 0.0
+    }
+
+    latency = {}
+    for stage in STAGES:
+        values = [r['timings_ms'][stage] for r in results]
+        latency[stage] = {
+            'p50': round(percentile(values, 50), 2),
+            'p95': round(percentile(values, 95), 2),
+            'p99': round(percentile(values, 99), 2),
+            'mean': round(sum(values) / len(values), 2) if values else 0.0
+        }
+
+    tiers = {}
+    for result in results:
+        tiers[result['ocr_tier']] = tiers.get(result['ocr_tier'], 0) + 1
+
+    return {
+        'receipts': len(results),
+        'accuracy': accuracy,
+        'latency_ms': latency,
+        'throughput_per_second': round(len(results) / wall_seconds, 3) if wall_seconds else 0.0,
+        'wall_seconds': round(wall_seconds, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'ocr_tiers': tiers
+    }
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]):
+    """Print accuracy and latency deltas against an earlier run"""
+    print("\n=== Comparison with previous run ===")
+    for field in FIELDS:
+        now, before = current['accuracy'][field], previous['accuracy'].get(field)
+        if now is not None and before is not None:
+            print(f"{field:>10} accuracy: {before:.2%} -> {now:.2%} ({now - before:+.2%})")
+    now, before = current['accuracy']['items']['f1'], previous['accuracy']['items']['f1']
+    print(f"{'items':>10} F1:       {before:.3f} -> {now:.3f} ({now - before:+.3f})")
+    for stage in STAGES:
+        now = current['latency_ms'][stage]['p50']
+        before = previous['latency_ms'].get(stage, {}).get('p50', 0.0)
+        change = f"{(now - before) / before:+.1%}" if before else "n/a"
+        print(f"{stage:>10} p50: {before:9.2f} ms -> {now:9.2f} ms ({change})")
+    now, before = current['throughput_per_second'], previous['throughput_per_second']
+    print(f"{'throughput':>10}: {before:.3f}/s -> {now:.3f}/s")
+
+
+def run_benchmark(images_dir: Path, ground_truth_path: Path, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Benchmark every image listed in the ground-truth file"""
+    with open(ground_truth_path, 'r', encoding='utf-8') as f:
+        ground_truth = json.load(f)
+
+    names = sorted(ground_truth)[:limit] if limit else sorted(ground_truth)
+    missing = [name for name in names if not (images_dir / name).exists()]
+    if missing:
+        raise FileNotFoundError(f"Images listed in {ground_truth_path} not found: {missing}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as reports_dir:
+        generator = ReportGenerator(base_dir=reports_dir)
+        started = time.perf_counter()
+        for name in names:
+            result = process_receipt(images_dir / name, generator)
+            result['scores'] = score_receipt(result['expense_data'], ground_truth[name])
+            results.append(result)
+            print(f"{name}: {result['timings_ms']['total']:.0f} ms, tier={result['ocr_tier']}, "
+                  f"total {'ok' if result['scores']['total'] else 'MISS'}")
+        wall_seconds = time.perf_counter() - started
+
+    return {
+        'generated_at': datetime.utcnow().isoformat(),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version()},
+        'config': {
+            key: app.config[key] for key in app.config
+            if key.startswith('OCR_')
+        },
+        'images_dir': str(images_dir),
+        'summary': summarize(results, wall_seconds),
+        'receipts': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end receipt benchmark')
+    parser.add_argument('--images', type=Path, default=DEFAULT_IMAGES_DIR,
+                        help='Directory containing the receipt images')
+    parser.add_argument('--ground-truth', type=Path, default=None,
+                        help='Ground-truth JSON (defaults to <images>/ground_truth.json)')
+    parser.add_argument('--limit', type=int, default=None, help='Only process the first N receipts')
+    parser.add_argument('--output', type=Path, default=None, help='Write the JSON results here')
+    parser.add_argument('--compare', type=Path, default=None, help='Earlier JSON results to compare with')
+    args = parser.parse_args()
+
+    ground_truth_path = args.ground_truth or args.images / 'ground_truth.json'
+    report = run_benchmark(args.images, ground_truth_path, args.limit)
+    summary = report['summary']
+
+    print("\n=== Benchmark Summary ===")
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(summary, json.load(f)['summary'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Microbenchmarks for the OCR-free text pipeline.
+
+Times the field extractors, category detection, ``ReportGenerator.clean_data``
+and both report writers over a deterministic corpus of OCR-style receipt
+texts, including pathological inputs (very long receipts, text without line
+breaks, digit soup). Every run is compared with a stored baseline and fails
+with exit code 1 when a stage is slower than the baseline by more than the
+allowed threshold, or with exit code 2 when there is no baseline to compare
+with (checked before anything is timed) or it lacks some of the stages.
+
+Timings depend on the machine, so no baseline is checked in. Record one on
+the machine that runs the gate (e.g. the CI runner), from the commit the
+gate should compare against, and keep it there; record it again after an
+intended slowdown or when stages are added:
+
+    python benchmark_text.py --save-baseline
+
+Usage:
+    python benchmark_text.py                         # compare with BASELINE
+    python benchmark_text.py --baseline other.json --threshold 0.25
+    python benchmark_text.py --no-baseline           # only print the timings
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from odoo.ML.preprocessing.app import (
+    extract_merchant, extract_date, extract_total_amount, extract_items,
+    detect_category_from_text
+)
+from odoo.ML.preprocessing.report_generator import ReportGenerator
+
+GROUND_TRUTH = Path(__file__).resolve().parents[2] / 'realistic_test_receipts' / 'ground_truth.json'
+BASELINE = Path(__file__).resolve().with_name('benchmark_text_baseline.json')
+
+ADDRESSES = ['Park Street, Kolkata', 'Connaught Place, Delhi', 'Bandra Kurla, Mumbai',
+             'Brigade Road, Bangalore', 'Sector 18, Noida', 'MG Road, Pune']
+DATE_FORMATS = ['%d-%m-%Y', '%d/%m/%y', '%Y-%m-%d', '%d %b %Y', '%B %d, %Y']
+PAYMENT_METHODS = ['Cash', 'Card', 'UPI', 'NetBanking']
+OCR_CONFUSIONS = {'0': 'O', 'O': '0', '1': 'l', 'l': '1', '5': 'S', 'S': '5', '8': 'B', 'e': 'c'}
+
+
+def _load_catalogue() -> Tuple[List[str], List[Tuple[str, float]]]:
+    """Merchants and priced items taken from the checked-in ground truth"""
+    with open(GROUND_TRUTH, 'r', encoding='utf-8') as f:
+        ground_truth = json.load(f)
+    merchants = sorted({entry['merchant'] for entry in ground_truth.values()})
+    items = sorted({
+        (item['description'], item['amount'] / item['quantity'])
+        for entry in ground_truth.values() for item in entry['items']
+    })
+    return merchants, items
+
+
+def _add_ocr_noise(text: str, rng: random.Random, rate: float) -> str:
+    """Swap characters the way OCR engines commonly confuse them"""
+    return ''.join(
+        OCR_CONFUSIONS[char] if char in OCR_CONFUSIONS and rng.random() < rate else char
+        for char in text
+    )
+
+
+def make_receipt_text(rng: random.Random, merchants: List[str], catalogue: List[Tuple[str, float]],
+                      item_count: int, noise: float = 0.0, same_line: bool = False) -> str:
+    """Render a receipt the way EasyOCR returns it: one text block per line"""
+    issued = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+    lines = [
+        rng.choice(merchants),
+        rng.choice(ADDRESSES),
+        f"Phone: +91-{rng.randrange(10, 99)}-{rng.randrange(1000, 9999)}-{rng.randrange(1000, 9999)}",
+        f"Invoice #{rng.randrange(100000, 999999)}",
+        f"Date/Time: {issued.strftime(rng.choice(DATE_FORMATS))} {rng.randrange(24):02d}:{rng.randrange(60):02d}"
+    ]
+
+    subtotal = 0.0
+    for _ in range(item_count):
+        description, unit_price = rng.choice(catalogue)
+        quantity = rng.randint(1, 3)
+        amount = unit_price * quantity
+        subtotal += amount
+        if same_line:
+            lines.append(f"{description} x{quantity}    {amount:.2f}")
+        else:
+            lines.extend([f"{description} x{quantity}", f"{amount:.2f}"])
+
+    tax = round(subtotal * rng.choice([0.05, 0.12, 0.18]), 2)
+    lines.extend([
+        'Subtotal', f"{subtotal:.2f}",
+        'Tax', f"{tax:.2f}",
+        'Total', f"{subtotal + tax:.2f} INR",
+        f"Payment Method: {rng.choice(PAYMENT_METHODS)}",
+        f"Cashier: {rng.choice('ABCD')}{rng.randint(1, 4)}",
+        'Thank you for your visit!'
+    ])
+    return _add_ocr_noise("\n".join(lines), rng, noise) if noise else "\n".join(lines)
+
+
+def build_corpus(size: int = 200, seed: int = 42) -> Dict[str, List[str]]:
+    """
+    Build the benchmark corpus.
+
+    Returns:
+        Dict[str, List[str]]: ``typical`` receipts shaped like real OCR
+        output and ``pathological`` inputs that stress the regexes and the
+        spelling correction.
+    """
+    rng = random.Random(seed)
+    merchants, catalogue = _load_catalogue()
+
+    typical = [
+        make_receipt_text(
+            rng, merchants, catalogue,
+            item_count=rng.randint(1, 8),
+            noise=rng.choice([0.0, 0.0, 0.02, 0.05]),
+            same_line=rng.random() < 0.3
+        )
+        for _ in range(size)
+    ]
+
+    words = [description for description, _ in catalogue] + ['Total', 'Subtotal', 'INR', 'x1']
+    pathological = [
+        # A very long itemised bill
+        make_receipt_text(rng, merchants, catalogue, item_count=1500, same_line=True),
+        # OCR that merged everything into a single line
+        ' '.join(rng.choice(words) for _ in range(5000)),
+        # Capitalised words without newlines defeat the lazy merchant patterns
+        ' '.join(rng.choice(merchants).upper() for _ in range(3000)),
+        # Long runs of numbers with no labels
+        ' '.join(f"{rng.uniform(0, 9999):.2f}" for _ in range(5000)),
+        # Noisy, non-ASCII heavy text
+        _add_ocr_noise('₹ € £ ¥ ' * 2000, rng, 0.1),
+        ''
+    ]
+    return {'typical': typical, 'pathological': pathological}
+
+
+def _report_data(text: str, index: int) -> Dict[str, Any]:
+    """Wrap a text in the report structure produced by upload_file"""
+    return {
+        'report_id': f"bench-{index}",
+        'status': 'processed',
+        'expense_data': {
+            'merchant': extract_merchant(text),
+            'date': extract_date(text),
+            'amount': extract_total_amount(text),
+            'currency': 'INR',
+            'category': 'Food & Dining',
+            'items': extract_items(text)
+        },
+        'raw_text': text
+    }
+
+
+def time_stage(func: Callable[[Any], Any], inputs: List[Any], repeat: int) -> Dict[str, float]:
+    """Time one pass of ``func`` over ``inputs``, keeping the fastest of ``repeat`` passes"""
+    passes = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for value in inputs:
+            func(value)
+        passes.append(time.perf_counter() - started)
+    best = min(passes)
+    return {
+        'calls': len(inputs),
+        'best_seconds': round(best, 6),
+        'per_call_us': round(best / len(inputs) * 1e6, 2) if inputs else 0.0
+    }
+
+
+def run_benchmarks(corpus: Dict[str, List[str]], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Run every text-side stage over both corpus groups"""
+    results = {}
+    with tempfile.TemporaryDirectory() as reports_dir:
+        generator = ReportGenerator(base_dir=reports_dir)
+
+        for group, texts in corpus.items():
+            reports = [_report_data(text, index) for index, text in enumerate(texts)]
+            # TextBlob correction dominates; the writers only need a sample
+            sample = reports[:20] if group == 'typical' else reports
+            cleaned = [generator.clean_data(report) for report in sample]
+
+            stages = {
+                'extract_merchant': (extract_merchant, texts),
+                'extract_date': (extract_date, texts),
+                'extract_total_amount': (extract_total_amount, texts),
+                'extract_items': (extract_items, texts),
+                'detect_category': (detect_category_from_text, texts),
+                'clean_data': (generator.clean_data, sample),
+                'write_json_report': (
+                    lambda data: generator.write_json_report(data['report_id'], data), cleaned),
+                'write_excel_report': (
+                    lambda data: generator.write_excel_report(data['report_id'], data), cleaned)
+            }
+            for stage, (func, inputs) in stages.items():
+                name = f"{group}.{stage}"
+                results[name] = time_stage(func, inputs, repeat)
+                print(f"{name:<40} {results[name]['per_call_us']:>14.2f} us/call")
+    return results
+
+
+def check_regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                      threshold: float) -> List[str]:
+    """List the stages that are slower than the baseline by more than ``threshold``"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous['best_seconds']:
+            continue
+        change = result['best_seconds'] / previous['best_seconds'] - 1
+        if change > threshold:
+            regressions.append(f"{name}: {previous['best_seconds']:.4f}s -> "
+                               f"{result['best_seconds']:.4f}s ({change:+.1%})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Text pipeline microbenchmarks')
+    parser.add_argument('--size', type=int, default=200, help='Number of typical receipts')
+    parser.add_argument('--repeat', type=int, default=3, help='Passes per stage (fastest wins)')
+    parser.add_argument('--seed', type=int, default=42, help='Corpus random seed')
+    parser.add_argument('--baseline', type=Path, default=BASELINE,
+                        help=f'Baseline JSON to compare with (default {BASELINE.name})')
+    parser.add_argument('--no-baseline', action='store_true', help='Print the timings without comparing')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', type=Path, nargs='?', const=BASELINE, default=None,
+                        help=f'Store results as a baseline (default {BASELINE.name}) instead of comparing')
+    args = parser.parse_args(argv)
+
+    compare = not (args.no_baseline or args.save_baseline)
+    if compare and not args.baseline.is_file():
+        # Fail before the run: without a baseline the gate would pass whatever the timings
+        print(f"No baseline at {args.baseline}. Record one on this machine with:\n"
+              f"  python {Path(__file__).name} --save-baseline {args.baseline}", file=sys.stderr)
+        sys.exit(2)
+
+    corpus = build_corpus(args.size, args.seed)
+    results = run_benchmarks(corpus, args.repeat)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'machine': {'platform': platform.platform(), 'python': platform.python_version()},
+                'settings': {'size': args.size, 'repeat': args.repeat, 'seed': args.seed},
+                'results': results
+            }, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if compare:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        settings = {'size': args.size, 'repeat': args.repeat, 'seed': args.seed}
+        if baseline.get('settings') != settings:
+            print(f"\nWarning: baseline was recorded with {baseline.get('settings')}, "
+                  f"this run used {settings}")
+        missing = [name for name in results if name not in baseline['results']]
+        if missing:
+            print(f"\nThe baseline has no timings for {', '.join(missing)}; record it again "
+                  f"with --save-baseline", file=sys.stderr)
+            sys.exit(2)
+        regressions = check_regressions(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"\nNo stage regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Test setup shared by the service tests.
+
+The modules import each other as ``odoo.ML.preprocessing.*``. When the
+repository is not checked out as a directory named ``odoo`` (as in CI), an
+``odoo`` namespace package pointing at the checkout is registered, so the
+tests import the code under test whatever the directory is called.
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# Scripts that exercise a running server, started by hand (see their __main__)
+collect_ignore = ['test.py', 'test_receipts_new.py', 'load_test.py']
+
+if REPO_ROOT.name == 'odoo':
+    if str(REPO_ROOT.parent) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT.parent))
+elif importlib.util.find_spec('odoo') is None:
+    package = types.ModuleType('odoo')
+    package.__path__ = [str(REPO_ROOT)]
+    sys.modules['odoo'] = package
+
+
+@pytest.fixture(scope='session')
+def service(tmp_path_factory):
+    """
+    The Flask service module (app.py).
+
+    It is imported with a temporary working directory, so the folders and
+    index it creates at import time do not land in the checkout. Tests
+    replace ``service.storage`` etc. where they need isolated state.
+    """
+    for dependency in ['flask', 'flask_cors', 'prometheus_client']:
+        pytest.importorskip(dependency)
+    module = 'odoo.ML.preprocessing.app'
+    if module not in sys.modules:
+        previous = os.getcwd()
+        os.environ.setdefault('EXPENSE_DATASET_DIR', '')
+        os.chdir(tmp_path_factory.mktemp('service'))
+        try:
+            importlib.import_module(module)
+        finally:
+            os.chdir(previous)
+    return sys.modules[module]
@@ -0,0 +1,312 @@
+"""
+Expense Dataset Module
+
+Appends extracted expense records to a columnar Parquet dataset, so that
+analytics scan one table instead of parsing thousands of per-receipt JSON
+and XLSX files. The dataset is hive-partitioned by receipt month:
+
+    <root>/month=2026-10/part-<timestamp>-<pid>-<id>.parquet
+
+Records are buffered and written in batches. Each flush writes one new file
+per month touched, with the batch as row groups, and existing files are
+never rewritten. Items are kept as a nested list column. pyarrow, pandas,
+DuckDB and Spark read the directory as one table, with ``month`` as a
+partition column.
+
+A batch that cannot be written (full disk, permissions) is not dropped.
+It is spooled to ``<root>/.spool``, which readers skip, and written on a
+later flush by any process.
+
+Requires ``pyarrow``; check ``available()`` before enabling the writer.
+"""
+
+import atexit
+import importlib.util
+import logging
+import os
+import pickle
+import threading
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ROW_GROUP_SIZE = 10000
+SPOOL_DIR = '.spool'
+RETRY_SECONDS = 60.0
+
+
+def available() -> bool:
+    """Whether pyarrow is installed, checked without importing it"""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('report_id', pa.string()),
+        ('source', pa.string()),
+        ('source_file', pa.string()),
+        ('processed_at', pa.timestamp('ms')),
+        ('merchant', pa.string()),
+        ('date', pa.date32()),
+        ('amount', pa.float64()),
+        ('currency', pa.string()),
+        ('category', pa.string()),
+        ('items', pa.list_(pa.struct([
+            ('description', pa.string()),
+            ('quantity', pa.float64()),
+            ('unit_price', pa.float64()),
+            ('amount', pa.float64())
+        ]))),
+        ('ocr_tier', pa.string()),
+        ('timings_ms', pa.map_(pa.string(), pa.float64()))
+    ])
+
+
+def _to_date(value: Any) -> Optional[date]:
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def expense_record(report_id: Optional[str], source: str, source_file: str,
+                   expense_data: Dict[str, Any], ocr_tier: Optional[str] = None,
+                   timings_ms: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Build a dataset record from extracted expense data.
+
+    Args:
+        report_id (str): Report ID, or None for batch runs.
+        source (str): Producer, e.g. 'service' or 'batch'.
+        source_file (str): Name of the receipt file.
+        expense_data (Dict[str, Any]): Merchant, date (YYYY-MM-DD), amount,
+                                       currency, category and items.
+        ocr_tier (str): OCR pass that produced the text.
+        timings_ms (Dict[str, float]): Stage timings in milliseconds.
+
+    Returns:
+        Dict[str, Any]: A record matching the dataset schema.
+    """
+    items = []
+    for item in expense_data.get('items') or []:
+        amount = _to_float(item.get('amount'))
+        items.append({
+            'description': str(item.get('description', '')),
+            'quantity': _to_float(item.get('quantity', 1)),
+            'unit_price': _to_float(item.get('unit_price', amount)),
+            'amount': amount
+        })
+    return {
+        'report_id': report_id,
+        'source': source,
+        'source_file': source_file,
+        'processed_at': datetime.utcnow(),
+        'merchant': expense_data.get('merchant'),
+        'date': _to_date(expense_data.get('date')),
+        'amount': _to_float(expense_data.get('amount')),
+        'currency': expense_data.get('currency'),
+        'category': expense_data.get('category'),
+        'items': items,
+        'ocr_tier': ocr_tier,
+        'timings_ms': [(key, float(value)) for key, value in (timings_ms or {}).items()]
+    }
+
+
+class ExpenseDatasetWriter:
+    """
+    Buffers expense records and appends them to the dataset in batches.
+
+    A batch is written when it reaches ``batch_size`` records, when the
+    oldest buffered record is ``flush_interval`` seconds old, on ``close``
+    and at interpreter exit. Batches that fail are spooled and retried
+    every ``RETRY_SECONDS`` and on every later flush.
+    """
+
+    def __init__(self, root: str, batch_size: int = 500, flush_interval: float = 300.0):
+        """
+        Initialize the ExpenseDatasetWriter.
+
+        Args:
+            root (str): Dataset directory.
+            batch_size (int): Records buffered before a write.
+            flush_interval (float): Longest time (s) a record stays buffered;
+                                    0 disables time-based flushes.
+        """
+        self.root = root
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffer: List[Dict[str, Any]] = []
+        self._timer = None
+        self._pid = os.getpid()
+        self._written = 0
+        self._failed = 0
+        atexit.register(self.close)
+
+    def add(self, record: Dict[str, Any]):
+        """Buffer a record built by ``expense_record``"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Records buffered before a fork belong to the parent
+                self._buffer, self._timer, self._pid = [], None, os.getpid()
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.batch_size
+            if not full and self.flush_interval > 0:
+                self._schedule(self.flush_interval)
+        if full:
+            self.flush()
+
+    def _schedule(self, delay: float):
+        # Called with the lock held
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> int:
+        """
+        Write the buffered records, then any spooled batches.
+
+        Returns:
+            int: Number of records written.
+        """
+        with self._lock:
+            records, self._buffer = self._buffer, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        written = 0
+        if records:
+            try:
+                self._write(records)
+                written += len(records)
+            except Exception:
+                logger.exception("Writing %d expense records failed; spooling them", len(records))
+                with self._lock:
+                    self._failed += 1
+                self._spool(records)
+                return 0
+        written += self._write_spooled()
+        with self._lock:
+            self._written += written
+        return written
+
+    def _spool_dir(self) -> str:
+        return os.path.join(self.root, SPOOL_DIR)
+
+    def _spool(self, records: List[Dict[str, Any]]):
+        name = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}.pickle"
+        try:
+            os.makedirs(self._spool_dir(), exist_ok=True)
+            temp_path = os.path.join(self._spool_dir(), f".{name}.tmp")
+            with open(temp_path, 'wb') as f:
+                pickle.dump(records, f)
+            os.replace(temp_path, os.path.join(self._spool_dir(), name))
+        except Exception:
+            # Keep them in memory for the next attempt rather than lose them
+            logger.exception("Spooling %d expense records failed", len(records))
+            with self._lock:
+                self._buffer = records + self._buffer
+        with self._lock:
+            self._schedule(RETRY_SECONDS)
+
+    def _spooled(self) -> List[str]:
+        try:
+            names = sorted(os.listdir(self._spool_dir()))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self._spool_dir(), name) for name in names if name.endswith('.pickle')]
+
+    def _write_spooled(self) -> int:
+        written = 0
+        for path in self._spooled():
+            # Renaming claims the batch, so two processes never write it twice
+            claimed = f"{path}.{os.getpid()}.claimed"
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                with open(claimed, 'rb') as f:
+                    records = pickle.load(f)
+                self._write(records)
+            except Exception:
+                logger.exception("Writing spooled expense records failed")
+                os.replace(claimed, path)
+                with self._lock:
+                    self._schedule(RETRY_SECONDS)
+                break
+            os.remove(claimed)
+            written += len(records)
+        return written
+
+    def _write(self, records: List[Dict[str, Any]]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            day = record.get('date') or record['processed_at'].date()
+            by_month.setdefault(day.strftime('%Y-%m'), []).append(record)
+
+        schema = _schema()
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+        # Every month is written before any is published, so a failed batch
+        # leaves nothing behind and can be retried whole
+        written = []
+        try:
+            for month, rows in by_month.items():
+                table = pa.Table.from_pylist(rows, schema=schema)
+                directory = os.path.join(self.root, f"month={month}")
+                os.makedirs(directory, exist_ok=True)
+                name = f"part-{stamp}-{os.getpid()}-{uuid.uuid4().hex[:8]}.parquet"
+                # Readers skip dot files, so the partial file is never part of the dataset
+                temp_path = os.path.join(directory, f".{name}.tmp")
+                written.append((temp_path, os.path.join(directory, name)))
+                pq.write_table(table, temp_path, row_group_size=ROW_GROUP_SIZE, compression='zstd')
+        except Exception:
+            for temp_path, _ in written:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+        for temp_path, path in written:
+            os.replace(temp_path, path)
+
+    def stats(self) -> Dict[str, int]:
+        """Records buffered and written and failed writes by this process, and batches spooled by any"""
+        with self._lock:
+            stats = {'buffered': len(self._buffer), 'written': self._written, 'failed_writes': self._failed}
+        stats['spooled_batches'] = len(self._spooled())
+        return stats
+
+    def close(self):
+        """Write what is buffered; called at exit"""
+        if self._pid == os.getpid():
+            self.flush()
+
+
+def read_dataset(root: str, columns: Optional[List[str]] = None, filters=None):
+    """
+    Read the dataset (or some columns / months of it) as a pandas DataFrame.
+
+    Args:
+        root (str): Dataset directory.
+        columns (List[str]): Columns to read; all by default.
+        filters: pyarrow filters, e.g. ``[('month', '>=', '2026-01')]``.
+    """
+    import pyarrow.parquet as pq
+
+    return pq.read_table(root, columns=columns, filters=filters, partitioning='hive').to_pandas()
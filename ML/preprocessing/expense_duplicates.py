@@ -0,0 +1,308 @@
+"""
+Expense Duplicates Module
+
+Finds the same expense submitted twice as different artifacts, such as a
+PDF invoice and a photo of its printout, which image hashes cannot match.
+Two expenses are duplicates when their normalized merchant, date and
+currency are equal and their amounts differ by at most a tolerance.
+Expenses whose date was not found on the receipt (``date_defaulted``,
+dated on the day they were processed) are never matched.
+
+Expenses are held in a dict keyed on (merchant, date, currency, amount
+bucket). Buckets are at least as wide as the tolerance, so a match is in
+the expense's own bucket or a neighbouring one, and a check is three
+lookups however many expenses are held. The report index is the persistent
+copy. The dict is loaded from it and kept up to date the way the spend
+analytics are: only new rows are read, unless something else changed.
+
+Usage (list duplicates across every JSON report, read in parallel):
+    python expense_duplicates.py reports/json --workers 8
+"""
+
+import argparse
+import functools
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Words that differ between an invoice header and a till receipt of the same merchant
+MERCHANT_STOP_WORDS = {
+    'the', 'inc', 'llc', 'llp', 'ltd', 'limited', 'co', 'corp', 'corporation',
+    'company', 'pvt', 'private', 'plc', 'gmbh', 'store', 'stores'
+}
+LOADED_COLUMNS = ['report_id', 'merchant', 'date', 'amount', 'currency', 'date_defaulted']
+MIN_BUCKET_WIDTH = 0.01
+
+
+# Merchants repeat across receipts, so a full reload normalizes each name once
+@functools.lru_cache(maxsize=65536)
+def normalize_merchant(merchant: Optional[str]) -> Optional[str]:
+    """
+    Reduce a merchant name to a comparison key.
+
+    Case, accents, punctuation, spacing and legal suffixes are dropped, so
+    "The Coffee-House Ltd." and "COFFEE HOUSE" give the same key.
+
+    Returns:
+        Optional[str]: The key, or None for missing and unknown merchants.
+    """
+    if not merchant:
+        return None
+    text = unicodedata.normalize('NFKD', str(merchant)).encode('ascii', 'ignore').decode('ascii')
+    words = [word for word in re.split(r'[^a-z0-9]+', text.lower()) if word]
+    key = ''.join(word for word in words if word not in MERCHANT_STOP_WORDS)
+    if not key or key == 'unknownmerchant':
+        return None
+    return key
+
+
+def _to_amount(value: Any) -> Optional[float]:
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        return None
+    return amount if amount > 0 and math.isfinite(amount) else None
+
+
+class ExpenseDuplicateIndex:
+    """
+    In-memory index of expenses by merchant, date, currency and amount.
+    """
+
+    def __init__(self, report_index=None, tolerance: float = 0.01):
+        """
+        Initialize the ExpenseDuplicateIndex.
+
+        Args:
+            report_index (ReportIndex): Persistent copy of the expenses; None
+                                        for an index filled with ``add``.
+            tolerance (float): Largest amount difference of duplicates.
+        """
+        self.report_index = report_index
+        self.tolerance = max(0.0, tolerance)
+        self._bucket_width = max(self.tolerance, MIN_BUCKET_WIDTH)
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str, str, int], Dict[str, float]] = {}
+        self._keys: Dict[str, Tuple[str, str, str, int]] = {}
+        # Expenses added by check_and_add that are not in the report index yet
+        self._pending: Dict[str, Tuple] = {}
+        self._version = None
+        self._last_rowid = 0
+
+    def _key(self, merchant, date, amount, currency, date_defaulted) -> Optional[Tuple[str, str, str, int]]:
+        if date_defaulted or not date or amount is None:
+            return None
+        merchant_key = normalize_merchant(merchant)
+        if merchant_key is None:
+            return None
+        return (merchant_key, str(date), str(currency or '').upper(),
+                int(math.floor(amount / self._bucket_width)))
+
+    def _add(self, report_id: str, merchant, date, amount, currency, date_defaulted) -> bool:
+        amount = _to_amount(amount)
+        key = self._key(merchant, date, amount, currency, date_defaulted)
+        previous = self._keys.pop(report_id, None)
+        if previous is not None:
+            self._buckets[previous].pop(report_id, None)
+            if not self._buckets[previous]:
+                del self._buckets[previous]
+        if key is None:
+            return False
+        self._buckets.setdefault(key, {})[report_id] = amount
+        self._keys[report_id] = key
+        return True
+
+    def add(self, report_id: str, expense_data: Dict[str, Any]) -> bool:
+        """
+        Add or replace an expense.
+
+        Args:
+            report_id (str): Report ID.
+            expense_data (Dict[str, Any]): Extracted merchant, date, amount
+                                           and currency.
+
+        Returns:
+            bool: False if the expense has no merchant, date read from the
+            receipt or positive amount and cannot be matched.
+        """
+        with self._lock:
+            return self._add(report_id, *self._fields(expense_data))
+
+    def discard(self, report_id: str):
+        """Drop an expense, e.g. one whose report was never written"""
+        with self._lock:
+            self._pending.pop(report_id, None)
+            self._add(report_id, None, None, None, None, None)
+
+    @staticmethod
+    def _fields(expense_data: Dict[str, Any]) -> Tuple:
+        return (expense_data.get('merchant'), expense_data.get('date'), expense_data.get('amount'),
+                expense_data.get('currency'), expense_data.get('date_defaulted'))
+
+    def refresh(self) -> bool:
+        """
+        Bring the index up to date with the report index.
+
+        Returns:
+            bool: True if expenses were read.
+        """
+        if self.report_index is None:
+            return False
+        version = self.report_index.version()
+        with self._lock:
+            if version == self._version:
+                return False
+            rows = None
+            if self._version is not None:
+                rows = self.report_index.rows_after(self._last_rowid, LOADED_COLUMNS)
+            # Appends alone advance the version by one per new row; anything else needs a reload
+            if rows is None or self._version + len(rows) != version:
+                self._buckets, self._keys = {}, {}
+                rows = self.report_index.rows_after(0, LOADED_COLUMNS)
+                for report_id, fields in self._pending.items():
+                    self._add(report_id, *fields)
+            for rowid, report_id, *fields in rows:
+                self._pending.pop(report_id, None)
+                self._add(report_id, *fields)
+            if rows:
+                self._last_rowid = rows[-1][0]
+            self._version = version
+            return True
+
+    def find(self, expense_data: Dict[str, Any], exclude: Optional[str] = None,
+             limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Find earlier expenses matching extracted expense data.
+
+        Args:
+            expense_data (Dict[str, Any]): Extracted merchant, date, amount
+                                           and currency.
+            exclude (str): Report ID never returned, e.g. the expense's own.
+            limit (int): Most matches returned.
+
+        Returns:
+            List[Dict[str, Any]]: ``report_id``, ``amount`` and amount
+            ``difference`` of the matches, closest first.
+        """
+        with self._lock:
+            return self._find(expense_data, exclude, limit)
+
+    def _find(self, expense_data: Dict[str, Any], exclude: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        merchant, date, amount, currency, date_defaulted = self._fields(expense_data)
+        amount = _to_amount(amount)
+        key = self._key(merchant, date, amount, currency, date_defaulted)
+        if key is None:
+            return []
+        matches = []
+        for bucket in (key[3] - 1, key[3], key[3] + 1):
+            for report_id, other in self._buckets.get(key[:3] + (bucket,), {}).items():
+                difference = abs(other - amount)
+                # The epsilon absorbs float error in amounts like 0.1 + 0.2
+                if report_id != exclude and difference <= self.tolerance + 1e-9:
+                    matches.append((difference, report_id, other))
+        matches.sort()
+        return [{'report_id': report_id, 'amount': other, 'difference': round(difference, 2)}
+                for difference, report_id, other in matches[:limit]]
+
+    def check(self, expense_data: Dict[str, Any], exclude: Optional[str] = None,
+              limit: int = 10) -> List[Dict[str, Any]]:
+        """``find`` after picking up expenses added by any process"""
+        self.refresh()
+        return self.find(expense_data, exclude=exclude, limit=limit)
+
+    def check_and_add(self, report_id: str, expense_data: Dict[str, Any],
+                      limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Find the matches of a new expense and add it, in one step.
+
+        Of two uploads of the same expense checked at the same time, the
+        second always sees the first. Uploads in other processes are seen
+        once they are in the report index.
+
+        Args:
+            report_id (str): Report ID of the new expense.
+            expense_data (Dict[str, Any]): Its extracted fields.
+            limit (int): Most matches returned.
+
+        Returns:
+            List[Dict[str, Any]]: Matches, as returned by ``find``.
+        """
+        self.refresh()
+        with self._lock:
+            matches = self._find(expense_data, report_id, limit)
+            self._pending[report_id] = self._fields(expense_data)
+            self._add(report_id, *self._pending[report_id])
+        return matches
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._keys)
+
+
+def read_expense(path: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Report ID and expense data of a stored JSON report, or None if unreadable"""
+    from odoo.ML.preprocessing.report_codec import read_report
+
+    try:
+        report = read_report(path)
+    except (OSError, ValueError):
+        return None
+    report_id = report.get('report_id') or os.path.basename(path).split('.', 1)[0]
+    return report_id, report.get('expense_data') or {}
+
+
+def scan(report_paths: Iterable[str], tolerance: float = 0.01,
+         workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Find duplicates among stored reports.
+
+    Reading and decompressing the reports is spread over worker processes;
+    matching runs in this process, in the order of ``report_paths``.
+
+    Args:
+        report_paths (Iterable[str]): Paths of JSON reports, compressed or not.
+        tolerance (float): Largest amount difference of duplicates.
+        workers (int): Reader processes; defaults to the CPU count.
+
+    Yields:
+        Dict[str, Any]: ``report_id`` of each report matching reports
+        before it in ``report_paths``, with those ``matches``.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    index = ExpenseDuplicateIndex(tolerance=tolerance)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                             mp_context=get_context('spawn')) as executor:
+        for result in executor.map(read_expense, report_paths, chunksize=64):
+            if result is None:
+                continue
+            report_id, expense_data = result
+            matches = index.find(expense_data, exclude=report_id)
+            if matches:
+                yield {'report_id': report_id, 'matches': matches}
+            index.add(report_id, expense_data)
+
+
+def main():
+    from odoo.ML.preprocessing.report_index import json_report_paths
+
+    parser = argparse.ArgumentParser(description='Find duplicate expenses among stored JSON reports')
+    parser.add_argument('directory', help='Directory of JSON reports')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='Largest amount difference of duplicates')
+    parser.add_argument('--workers', type=int, default=None, help='Reader processes (defaults to the CPU count)')
+    args = parser.parse_args()
+
+    found = 0
+    for duplicate in scan(sorted(json_report_paths(args.directory)), args.tolerance, args.workers):
+        print(json.dumps(duplicate))
+        found += 1
+    print(f"{found} reports duplicate earlier ones")
+
+
+if __name__ == '__main__':
+    main()
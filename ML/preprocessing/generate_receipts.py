@@ -0,0 +1,307 @@
+"""
+Synthetic receipt image generator.
+
+Renders receipt images with known ground truth for scale testing. Merchants,
+currencies (from ``CurrencyService.CURRENCY_SYMBOLS``), date formats (one for
+each of the ``DATE_PATTERNS`` used by ``extract_date``), item counts,
+resolution, blur, rotation and noise are all varied, with a long tail of
+long and degraded receipts. Alongside the images a ``ground_truth.json``
+manifest is written in the same format as
+``realistic_test_receipts/ground_truth.json``, so the output directory can
+be passed straight to ``benchmark_receipts.py --images`` or
+``load_test.py --images``.
+
+Usage:
+    python generate_receipts.py --count 5000 --output synthetic_receipts --workers 8
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+from datetime import date, timedelta
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from odoo.ML.preprocessing.app import CurrencyService, DATE_PATTERNS
+
+# (merchant, address, category, [(item, unit price in INR)])
+MERCHANTS = [
+    ("Domino's", 'Park Street, Kolkata', 'Food & Dining',
+     [('Margherita Pizza', 350), ('Garlic Bread', 120), ('Pasta Alfredo', 260), ('Veg Burger', 180), ('Coke', 60)]),
+    ('Starbucks', 'Connaught Place, Delhi', 'Coffee Shops',
+     [('Latte', 150), ('Cappuccino', 160), ('Iced Tea', 80), ('Muffin', 90), ('Sandwich', 140)]),
+    ('Hotel Taj', 'Marine Drive, Mumbai', 'Hotels',
+     [('Room Rent', 3500), ('Breakfast Buffet', 450), ('Laundry', 200), ('Mini Bar', 650)]),
+    ('Big Bazaar', 'Sector 18, Noida', 'Groceries',
+     [('Rice 5kg', 420), ('Cooking Oil', 180), ('A4 Paper Pack', 250), ('Detergent', 210), ('Biscuits', 40)]),
+    ('Local Stationery', 'Sector 9, Chandigarh', 'Office Supplies',
+     [('Pen Set', 80), ('Stapler', 150), ('Notebook', 120), ('Envelope Pack', 60), ('Marker', 45)]),
+    ('Apollo Pharmacy', 'Jubilee Hills, Hyderabad', 'Pharmacy',
+     [('Paracetamol', 30), ('Cough Syrup', 110), ('Bandages', 75), ('Vitamin C', 220)]),
+    ('Indian Oil', 'NH 48, Gurgaon', 'Fuel',
+     [('Petrol', 105), ('Diesel', 92), ('Engine Oil', 450)]),
+    ('Croma', 'Phoenix Mall, Pune', 'Electronics',
+     [('USB Cable', 399), ('Mouse', 699), ('Keyboard', 1299), ('Headphones', 1999)]),
+]
+PAYMENT_METHODS = ['Cash', 'Card', 'UPI', 'NetBanking']
+TAX_LABELS = ['Tax', 'GST', 'VAT', 'Service Charge']
+
+# One or more strftime formats for each entry of DATE_PATTERNS
+DATE_FORMATS = [
+    ['%d-%m-%Y', '%d/%m/%Y', '%d/%m/%y'],
+    ['%Y-%m-%d', '%Y/%m/%d'],
+    ['%d %b %Y', '%d %B %Y'],
+    ['%b %d, %Y', '%B %d, %Y'],
+]
+
+# Rough INR exchange rates so amounts stay plausible in every currency
+INR_PER_UNIT = {'INR': 1.0, 'USD': 83.0, 'EUR': 90.0, 'GBP': 105.0, 'JPY': 0.56, 'AED': 22.6,
+                'SGD': 62.0, 'AUD': 55.0, 'CAD': 61.0, 'CNY': 11.5, 'KRW': 0.062, 'IDR': 0.0053}
+
+FONT_CANDIDATES = [
+    'DejaVuSans.ttf', 'DejaVuSerif.ttf', 'DejaVuSansMono.ttf', 'LiberationSans-Regular.ttf',
+    'LiberationSerif-Regular.ttf', 'LiberationMono-Regular.ttf', 'FreeSans.ttf', 'Arial.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf',
+]
+
+
+def available_fonts() -> List[str]:
+    """Font files that Pillow can load on this machine"""
+    fonts = []
+    for candidate in FONT_CANDIDATES:
+        try:
+            ImageFont.truetype(candidate, 12)
+            fonts.append(candidate)
+        except OSError:
+            continue
+    return fonts
+
+
+def _load_font(fonts: List[str], name: Optional[str], size: int):
+    if name is None:
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:  # Pillow < 10.1 has a single fixed-size bitmap font
+            return ImageFont.load_default()
+    return ImageFont.truetype(name, size)
+
+
+def _check_date_formats():
+    """Make sure every generated date format is one that extract_date recognises"""
+    sample = date(2025, 9, 4)
+    for pattern, formats in zip(DATE_PATTERNS, DATE_FORMATS):
+        for fmt in formats:
+            if not re.fullmatch(pattern, sample.strftime(fmt)):
+                raise ValueError(f"Date format {fmt!r} does not match {pattern!r}")
+
+
+def pick_currency(rng: random.Random) -> str:
+    """Mostly INR, like our real traffic, with a tail of other currencies"""
+    if rng.random() < 0.7:
+        return 'INR'
+    common = [code for code in INR_PER_UNIT if code != 'INR']
+    if rng.random() < 0.8:
+        return rng.choice(common)
+    return rng.choice(sorted(CurrencyService.CURRENCY_SYMBOLS))
+
+
+def make_receipt(rng: random.Random, index: int) -> Dict[str, Any]:
+    """Choose the content of one receipt and its ground truth"""
+    merchant, address, category, catalogue = rng.choice(MERCHANTS)
+    currency = pick_currency(rng)
+    symbol = CurrencyService.CURRENCY_SYMBOLS.get(currency, currency)
+    rate = INR_PER_UNIT.get(currency, 1.0)
+
+    # Most receipts are short; a long tail has dozens of lines
+    item_count = min(60, max(1, int(rng.paretovariate(1.3))))
+    items = []
+    for _ in range(item_count):
+        description, unit_price = rng.choice(catalogue)
+        quantity = rng.choice([1, 1, 1, 2, 2, 3])
+        amount = round(unit_price * quantity / rate, 2)
+        items.append({'description': description, 'quantity': quantity, 'amount': amount})
+
+    subtotal = round(sum(item['amount'] for item in items), 2)
+    tax_rate = rng.choice([0.05, 0.12, 0.18])
+    tax = round(subtotal * tax_rate, 2)
+    total = round(subtotal + tax, 2)
+
+    issued = date(2024, 1, 1) + timedelta(days=rng.randrange(730))
+    pattern_index = rng.randrange(len(DATE_FORMATS))
+    date_format = rng.choice(DATE_FORMATS[pattern_index])
+
+    return {
+        'file': f"synthetic_{index:06d}.jpg",
+        'merchant': merchant,
+        'address': address,
+        'category': category,
+        'date': issued.isoformat(),
+        'date_text': issued.strftime(date_format),
+        'total': total,
+        'subtotal': subtotal,
+        'tax': tax,
+        'tax_label': f"{rng.choice(TAX_LABELS)} ({int(tax_rate * 100)}%)",
+        'currency': currency,
+        'symbol': symbol,
+        'items': items,
+        'invoice': rng.randrange(100000, 999999),
+        'payment': rng.choice(PAYMENT_METHODS),
+        'time': f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+        'render': {
+            'width': rng.choice([480, 640, 800, 800, 1080, 1600]),
+            'font_index': rng.randrange(1 << 16),
+            'blur': rng.choice([0, 0, 0, 0.6, 1.0, 1.6]),
+            'rotation': rng.choice([0] * 12 + [90, 180, 270]),
+            'skew': round(rng.uniform(-6, 6), 2) if rng.random() < 0.4 else 0.0,
+            'noise': rng.choice([0, 0, 4, 8, 16]),
+            'jpeg_quality': rng.choice([60, 75, 85, 95])
+        }
+    }
+
+
+def render_receipt(receipt: Dict[str, Any], fonts: List[str]) -> Image.Image:
+    """Draw a receipt and apply the configured degradations"""
+    render = receipt['render']
+    width = render['width']
+    scale = width / 800.0
+    font_name = fonts[render['font_index'] % len(fonts)] if fonts else None
+    title_font = _load_font(fonts, font_name, int(40 * scale))
+    body_font = _load_font(fonts, font_name, int(20 * scale))
+    total_font = _load_font(fonts, font_name, int(30 * scale))
+
+    line_height = int(30 * scale)
+    item_rows = len(receipt['items'])
+    height = int((420 + item_rows * 60 + 220) * scale)
+    image = Image.new('L', (width, height), color=255)
+    draw = ImageDraw.Draw(image)
+
+    left, right = int(60 * scale), int(width - 80 * scale)
+    y = int(60 * scale)
+
+    def amount_text(value: float) -> str:
+        return f"{value:.2f}"
+
+    draw.text((left, y), receipt['merchant'], font=title_font, fill=0)
+    y += int(70 * scale)
+    for line in [
+        receipt['address'],
+        f"Invoice #{receipt['invoice']}",
+        f"Date/Time: {receipt['date_text']} {receipt['time']}"
+    ]:
+        draw.text((left, y), line, font=body_font, fill=0)
+        y += line_height
+    y += line_height
+
+    for item in receipt['items']:
+        draw.text((left, y), f"{item['description']} x{item['quantity']}", font=body_font, fill=0)
+        draw.text((right, y), amount_text(item['amount']), font=body_font, fill=0, anchor='ra')
+        y += int(60 * scale)
+
+    draw.line((left, y, right, y), fill=160, width=1)
+    y += line_height // 2
+    for label, value in [('Subtotal', receipt['subtotal']), (receipt['tax_label'], receipt['tax'])]:
+        draw.text((left, y), label, font=body_font, fill=0)
+        draw.text((right, y), amount_text(value), font=body_font, fill=0, anchor='ra')
+        y += line_height + line_height // 2
+    draw.line((left, y, right, y), fill=160, width=1)
+    y += line_height // 2
+    draw.text((left, y), 'Total', font=total_font, fill=0)
+    draw.text((right, y), f"{amount_text(receipt['total'])} {receipt['currency']}",
+              font=total_font, fill=0, anchor='ra')
+    y += int(60 * scale)
+    draw.text((left, y), f"Payment Method: {receipt['payment']}", font=body_font, fill=0)
+
+    if render['skew']:
+        image = image.rotate(render['skew'], resample=Image.BICUBIC, expand=True, fillcolor=255)
+    if render['rotation']:
+        image = image.rotate(-render['rotation'], expand=True)
+    if render['blur']:
+        image = image.filter(ImageFilter.GaussianBlur(render['blur'] * scale))
+    if render['noise']:
+        noise_rng = np.random.default_rng(render['font_index'])
+        pixels = np.asarray(image, dtype=np.float32)
+        pixels += noise_rng.normal(0, render['noise'], pixels.shape)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return image
+
+
+def _generate_one(job: Tuple[int, int, str, List[str]]) -> Tuple[str, Dict[str, Any]]:
+    index, seed, output_dir, fonts = job
+    rng = random.Random(seed * 1_000_003 + index)
+    receipt = make_receipt(rng, index)
+    image = render_receipt(receipt, fonts)
+    image.save(os.path.join(output_dir, receipt['file']), 'JPEG',
+               quality=receipt['render']['jpeg_quality'])
+    return receipt['file'], {
+        'merchant': receipt['merchant'],
+        'date': receipt['date'],
+        'total': receipt['total'],
+        'currency': receipt['currency'],
+        'category': receipt['category'],
+        'items': receipt['items'],
+        'render': dict(receipt['render'], height=image.height, width=image.width)
+    }
+
+
+def generate(count: int, output_dir: Path, seed: int = 0, workers: int = 1) -> Dict[str, Any]:
+    """
+    Render ``count`` receipts into ``output_dir`` and write the manifest.
+
+    Returns:
+        Dict[str, Any]: The manifest, keyed by image file name.
+    """
+    _check_date_formats()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fonts = available_fonts()
+    if not fonts:
+        print("Warning: no TrueType fonts found, falling back to Pillow's default font")
+
+    jobs = [(index, seed, str(output_dir), fonts) for index in range(count)]
+    manifest = {}
+    if workers > 1:
+        with Pool(workers) as pool:
+            for position, (name, entry) in enumerate(pool.imap_unordered(_generate_one, jobs, chunksize=16), 1):
+                manifest[name] = entry
+                if position % 500 == 0:
+                    print(f"Rendered {position}/{count} receipts")
+    else:
+        for position, job in enumerate(jobs, 1):
+            name, entry = _generate_one(job)
+            manifest[name] = entry
+            if position % 500 == 0:
+                print(f"Rendered {position}/{count} receipts")
+
+    manifest = dict(sorted(manifest.items()))
+    with open(output_dir / 'ground_truth.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic receipt images with ground truth')
+    parser.add_argument('--count', type=int, default=1000, help='Number of receipts to render')
+    parser.add_argument('--output', type=Path, default=Path('synthetic_receipts'), help='Output directory')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Parallel render processes')
+    args = parser.parse_args()
+
+    manifest = generate(args.count, args.output, args.seed, args.workers)
+    currencies = {}
+    for entry in manifest.values():
+        currencies[entry['currency']] = currencies.get(entry['currency'], 0) + 1
+    long_receipts = sum(1 for entry in manifest.values() if len(entry['items']) >= 10)
+    print(f"\nGenerated {len(manifest)} receipts in {args.output}")
+    print(f"Long receipts (10+ items): {long_receipts}")
+    print(f"Currencies: {dict(sorted(currencies.items(), key=lambda kv: -kv[1])[:10])}")
+    print(f"Manifest: {args.output / 'ground_truth.json'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Gunicorn configuration for the receipt processing service.
+
+The app is imported once in the master (``preload_app``). The master also
+loads the EasyOCR models and the currency and category state before it
+forks, so workers share the model weights through copy-on-write pages
+instead of each loading its own copy. Each worker then runs a warm-up
+inference and reports ready on /api/health/ready once it is done.
+
+Usage:
+    gunicorn -c ML/preprocessing/gunicorn.conf.py
+
+Every setting can be overridden through the environment:
+    GUNICORN_BIND, GUNICORN_WORKERS, GUNICORN_THREADS, GUNICORN_TIMEOUT,
+    GUNICORN_GRACEFUL_TIMEOUT, GUNICORN_MAX_REQUESTS,
+    GUNICORN_MAX_REQUESTS_JITTER, OCR_READER_POOL_SIZE
+
+Reloads:
+    kill -HUP <master>    re-reads this file and replaces the workers
+                          gracefully; the preloaded code and models stay
+    kill -USR2 <master>   starts a new master with new code and models,
+                          then send QUIT to the old master once it is up
+"""
+
+import gc
+import os
+import shutil
+import tempfile
+
+from odoo.ML.preprocessing.autotune import load_tuning
+
+# Multiprocess metrics must be configured before prometheus_client is imported.
+# The directory is emptied on first start only, not when HUP re-reads this file.
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    _metrics_dir = os.path.join(tempfile.gettempdir(), f"receipt-metrics-{os.getpid()}")
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = _metrics_dir
+
+wsgi_app = 'odoo.ML.preprocessing.app:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+preload_app = True
+
+# OCR is CPU bound and each worker runs torch with its own thread pool, so
+# keep workers few; threads beyond OCR_READER_POOL_SIZE wait for a reader.
+# autotune.py measures the best worker count for this machine.
+workers = int(os.environ.get('GUNICORN_WORKERS', load_tuning().get('workers', 2)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 60))
+keepalive = 5
+
+# Recycle workers to bound memory growth from fragmentation in the OCR stack
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Logging is handled by the app's structured logger
+accesslog = None
+errorlog = '-'
+
+
+def on_starting(server):
+    """Route the app's logs through the structured logger; workers inherit it on fork"""
+    from odoo.ML.preprocessing.app import setup_logging
+
+    setup_logging()
+
+
+def when_ready(server):
+    """Load the models in the master before the first worker is forked"""
+    from odoo.ML.preprocessing.app import preload_models
+
+    preload_models()
+    # Move everything loaded so far out of the collector's reach, so garbage
+    # collection in the workers does not touch (and copy) the shared pages
+    gc.freeze()
+    server.log.info("Models loaded in master, forking %s workers", workers)
+
+
+def post_fork(server, worker):
+    """Run the warm-up inference in the worker; /api/health/ready stays 503 until it is done"""
+    from odoo.ML.preprocessing.app import start_warm_up, start_retention_gc
+
+    # Inference is kept out of the master: torch's thread pool does not survive a fork
+    start_warm_up()
+    start_retention_gc()
+    server.log.info("Worker %s started, warming up", worker.pid)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of the exited worker"""
+    from odoo.ML.preprocessing import metrics
+
+    metrics.mark_process_dead(worker.pid)
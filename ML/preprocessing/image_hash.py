@@ -0,0 +1,143 @@
+"""
+Image Hash Module
+
+Perceptual hashes of receipt photos, for finding the same paper receipt
+uploaded twice. Byte comparison (the report index's ``file_hash``) only
+catches re-uploads of the same file. A second photo of the receipt has
+different bytes but nearly the same pHash, and the Hamming distance between
+two hashes measures how alike the images are.
+
+Receipts printed from one template look alike at a glance, so the hash is
+taken from the receipt itself rather than the whole photo: the image is
+cropped to the paper (the largest bright region), shrunk to 64x64 and
+transformed with a DCT. Each of the 256 bits tells whether one of the 16x16
+lowest frequencies is above their median, which keeps enough of the line
+lengths and positions to tell receipts apart. On the bundled
+realistic_test_receipts, distinct receipts differ by 32 bits or more, and
+rescaled, recompressed, noisy, brightened, blurred or padded photos of one
+receipt by 10 or fewer. Cropping into the paper or rotating it by a degree
+moves the hash much further, so photos should be straightened first.
+
+Hashes are looked up with multi-index hashing. The 256 bits are split into
+sixteen 16-bit bands, stored as indexed keys. Two hashes within distance
+``d`` differ by at most ``d // 16`` bits in at least one band (pigeonhole),
+so probing every band for the values within that radius finds all of them.
+The probes are a few index seeks however many hashes are stored, and only
+the candidates they return are compared bit by bit.
+"""
+
+from itertools import combinations
+from typing import List
+
+HASH_BITS = 256
+BANDS = 16
+BAND_BITS = HASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Distances beyond this probe too many band values to stay cheap (radius 2 is
+# 137 values per band, eight times the seeks of radius 1)
+MAX_DISTANCE = 31
+
+# Default largest distance of duplicates, half the smallest distance between
+# distinct bundled test receipts
+DEFAULT_MAX_DISTANCE = 16
+
+# Longest side (px) the photo is shrunk to before the paper is found
+WORK_SIDE = 512
+# Side (px) of the thumbnail the paper is found on
+PAPER_SIDE = 128
+# Smallest share of the photo taken to be the paper rather than a bright spot
+MIN_PAPER_AREA = 0.2
+# Side of the square block of low DCT frequencies hashed
+DCT_SIZE = 16
+
+
+def crop_to_paper(gray):
+    """
+    Crop a grayscale photo to the receipt paper.
+
+    The paper is the largest bright connected region of an Otsu-thresholded
+    thumbnail. Photos where no region covers MIN_PAPER_AREA (a scan that is
+    all paper, or a dark one) are returned whole.
+    """
+    import cv2
+    import numpy as np
+
+    height, width = gray.shape
+    scale = PAPER_SIDE / max(height, width)
+    small = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                       interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(small, (5, 5), 0)
+    bright = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    count, _, stats, _ = cv2.connectedComponentsWithStats(bright)
+    if count < 2:
+        return gray
+    # Label 0 is the background
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    x, y, w, h = stats[largest, :4]
+    if w * h < MIN_PAPER_AREA * small.size:
+        return gray
+    return gray[int(y / scale):min(height, int((y + h) / scale)),
+                int(x / scale):min(width, int((x + w) / scale))]
+
+
+def phash(image) -> int:
+    """
+    Perceptual hash of a receipt photo.
+
+    Args:
+        image (np.ndarray): Decoded image, grayscale or BGR.
+
+    Returns:
+        int: 256-bit unsigned hash.
+    """
+    import cv2
+    import numpy as np
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    height, width = gray.shape
+    scale = WORK_SIDE / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    paper = crop_to_paper(gray)
+    side = 4 * DCT_SIZE
+    small = cv2.resize(paper.astype(np.float32), (side, side), interpolation=cv2.INTER_AREA)
+    frequencies = cv2.dct(small)[:DCT_SIZE, :DCT_SIZE].flatten()
+    bits = frequencies > np.median(frequencies)
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits of two hashes"""
+    return bin(a ^ b).count('1')
+
+
+def to_hex(value: int) -> str:
+    return f"{value:0{HASH_BITS // 4}x}"
+
+
+def bands(value: int) -> List[int]:
+    """The hash's 16-bit bands, most significant first"""
+    return [(value >> (BAND_BITS * (BANDS - 1 - band))) & BAND_MASK for band in range(BANDS)]
+
+
+def band_key(band: int, band_value: int) -> int:
+    """Index key of a band value: the band number above its bits"""
+    return (band << BAND_BITS) | band_value
+
+
+def band_probes(band_value: int, radius: int) -> List[int]:
+    """Every band value within ``radius`` bits of ``band_value``"""
+    probes = [band_value]
+    for flips in range(1, radius + 1):
+        for positions in combinations(range(BAND_BITS), flips):
+            flipped = band_value
+            for position in positions:
+                flipped ^= 1 << position
+            probes.append(flipped)
+    return probes
+
+
+def probe_radius(max_distance: int) -> int:
+    """Band radius that finds every hash within ``max_distance``"""
+    return max_distance // BANDS
@@ -0,0 +1,400 @@
+"""
+Load test harness for the expense processing API.
+
+Drives a mix of uploads, report downloads, category detection and currency
+lookups against either the Flask app in-process (``--in-process``) or a
+running server (``--url``). Supports closed-loop load (a fixed number of
+concurrent clients) and open-loop load (Poisson arrivals at ``--rate``
+requests per second, with latency measured from the scheduled arrival so
+queueing is not hidden). The server's in-flight requests and OCR queue
+depth are sampled from ``/api/stats`` while the test runs.
+
+The upstream currency and exchange-rate APIs are replaced by a local stub
+server. In-process runs are wired to it automatically; for a separate
+server, start it with the environment printed by ``--stub-only``.
+
+Usage:
+    python load_test.py --in-process --concurrency 8 --duration 60
+    python load_test.py --url http://localhost:5000 --rate 5 --duration 120 --output run.json
+    python load_test.py --stub-only --stub-port 8765
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_IMAGES_DIR = Path(__file__).resolve().parents[2] / 'realistic_test_receipts'
+DEFAULT_MIX = 'upload=5,report_json=3,report_xlsx=1,categories=1,currencies=1'
+DETECT_SAMPLES = ['Starbucks coffee', 'Hotel Taj room rent', 'Uber trip', 'Pharmacy medicine',
+                  'Big Bazaar groceries', 'Netflix subscription', 'Shell fuel station']
+
+STUB_COUNTRIES = [
+    {'name': {'common': 'India'}, 'currencies': {'INR': {'name': 'Indian rupee', 'symbol': '₹'}}},
+    {'name': {'common': 'United States'}, 'currencies': {'USD': {'name': 'United States dollar', 'symbol': '$'}}},
+    {'name': {'common': 'Germany'}, 'currencies': {'EUR': {'name': 'Euro', 'symbol': '€'}}},
+    {'name': {'common': 'United Kingdom'}, 'currencies': {'GBP': {'name': 'British pound', 'symbol': '£'}}},
+    {'name': {'common': 'Japan'}, 'currencies': {'JPY': {'name': 'Japanese yen', 'symbol': '¥'}}}
+]
+STUB_RATES = {'INR': 1.0, 'USD': 0.012, 'EUR': 0.011, 'GBP': 0.0095, 'JPY': 1.78}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Serves canned REST Countries and exchange-rate responses"""
+
+    def do_GET(self):
+        if self.path.startswith('/countries'):
+            body = STUB_COUNTRIES
+        elif self.path.startswith('/rates/'):
+            base = self.path.rsplit('/', 1)[-1].upper() or 'INR'
+            base_rate = STUB_RATES.get(base, 1.0)
+            body = {'base': base, 'date': time.strftime('%Y-%m-%d'),
+                    'rates': {code: rate / base_rate for code, rate in STUB_RATES.items()}}
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0) -> Tuple[ThreadingHTTPServer, Dict[str, str]]:
+    """
+    Start the upstream API stub in a background thread.
+
+    Returns:
+        The running server and the environment variables that point the
+        service at it.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, {
+        'REST_COUNTRIES_API': f"{base}/countries",
+        'EXCHANGE_RATE_API': f"{base}/rates/{{}}"
+    }
+
+
+class InProcessClient:
+    """Sends requests to the Flask app through its test client"""
+
+    def __init__(self):
+        from odoo.ML.preprocessing.app import app
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def get(self, path: str) -> Tuple[int, Any]:
+        response = self._client().get(path)
+        return response.status_code, response.get_json(silent=True)
+
+    def upload(self, path: str, image_path: Path) -> Tuple[int, Any]:
+        with open(image_path, 'rb') as f:
+            response = self._client().post(
+                path, data={'file': (f, image_path.name)}, content_type='multipart/form-data')
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Sends requests to a running server over HTTP"""
+
+    def __init__(self, base_url: str, timeout: float):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._requests = requests
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = self._requests.Session()
+        return self._local.session
+
+    def _json(self, response) -> Any:
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def get(self, path: str) -> Tuple[int, Any]:
+        response = self._session().get(self.base_url + path, timeout=self.timeout)
+        return response.status_code, self._json(response)
+
+    def upload(self, path: str, image_path: Path) -> Tuple[int, Any]:
+        with open(image_path, 'rb') as f:
+            response = self._session().post(
+                self.base_url + path,
+                files={'file': (image_path.name, f, 'image/jpeg')},
+                timeout=self.timeout
+            )
+        return response.status_code, self._json(response)
+
+
+class LoadTest:
+    """Generates the traffic mix and collects latency, error and queue samples"""
+
+    def __init__(self, client, images: List[Path], mix: Dict[str, int], seed: int = 0):
+        self.client = client
+        self.images = itertools.cycle(images)
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.report_ids: List[str] = []
+        self.samples: List[Dict[str, Any]] = []
+        self.queue_samples: List[Dict[str, Any]] = []
+
+    def _pick(self) -> str:
+        with self.lock:
+            kinds, weights = zip(*self.mix.items())
+            kind = self.rng.choices(kinds, weights)[0]
+            if kind.startswith('report') and not self.report_ids:
+                return 'upload'
+            return kind
+
+    def _request(self, kind: str) -> Tuple[int, Any]:
+        if kind == 'upload':
+            with self.lock:
+                image = next(self.images)
+            status, body = self.client.upload('/api/upload', image)
+            if status == 200 and body and body.get('report_id'):
+                with self.lock:
+                    self.report_ids.append(body['report_id'])
+            return status, body
+        if kind in ('report_json', 'report_xlsx'):
+            with self.lock:
+                report_id = self.rng.choice(self.report_ids)
+            return self.client.get(f"/api/report/{report_id}.{kind.split('_')[1]}")
+        if kind == 'categories':
+            with self.lock:
+                text = self.rng.choice(DETECT_SAMPLES)
+            return self.client.get(f"/api/categories?detect={text}")
+        if kind == 'currencies':
+            return self.client.get('/api/currencies')
+        raise ValueError(f"Unknown request kind: {kind}")
+
+    def execute(self, kind: str, scheduled: Optional[float] = None):
+        """Send one request and record its latency from ``scheduled`` (or now)"""
+        started = time.perf_counter()
+        origin = scheduled if scheduled is not None else started
+        try:
+            status, _ = self._request(kind)
+            error = None if status < 400 else f"HTTP {status}"
+        except Exception as e:
+            status, error = 0, type(e).__name__
+        finished = time.perf_counter()
+        with self.lock:
+            self.samples.append({
+                'kind': kind,
+                'status': status,
+                'error': error,
+                'latency_ms': (finished - origin) * 1000,
+                'service_ms': (finished - started) * 1000,
+                'finished': finished
+            })
+
+    def run_closed(self, concurrency: int, deadline: float):
+        """Each of ``concurrency`` clients sends its next request as soon as the last returns"""
+        def client_loop():
+            while time.perf_counter() < deadline:
+                self.execute(self._pick())
+
+        threads = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_open(self, rate: float, deadline: float, max_outstanding: int):
+        """Start requests on a Poisson schedule regardless of how fast earlier ones finish"""
+        with ThreadPoolExecutor(max_workers=max_outstanding) as executor:
+            next_arrival = time.perf_counter()
+            while next_arrival < deadline:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.execute, self._pick(), next_arrival)
+                next_arrival += self.rng.expovariate(rate)
+
+    def sample_queue(self, stop: threading.Event, interval: float, started: float):
+        """Poll /api/stats for in-flight requests and OCR queue depth"""
+        while not stop.wait(interval):
+            try:
+                status, body = self.client.get('/api/stats')
+            except Exception:
+                continue
+            if status == 200 and body:
+                self.queue_samples.append({
+                    'elapsed_s': round(time.perf_counter() - started, 2),
+                    # Subtract the stats request itself
+                    'in_flight': max(0, body.get('in_flight', 1) - 1),
+                    'queue_depth': body.get('queue_depth', 0),
+                    'reader_pool_busy': body.get('reader_pool', {}).get('busy', 0)
+                })
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile with linear interpolation between ranks"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(samples: List[Dict[str, Any]], queue_samples: List[Dict[str, Any]],
+              wall_seconds: float) -> Dict[str, Any]:
+    """Latency percentiles, throughput and error rate overall and per request kind"""
+    def describe(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+        latencies = [s['latency_ms'] for s in group]
+        errors = [s for s in group if s['error']]
+        error_kinds: Dict[str, int] = {}
+        for sample in errors:
+            error_kinds[sample['error']] = error_kinds.get(sample['error'], 0) + 1
+        return {
+            'requests': len(group),
+            'throughput_per_second': round(len(group) / wall_seconds, 3) if wall_seconds else 0.0,
+            'error_rate': round(len(errors) / len(group), 4) if group else 0.0,
+            'errors': error_kinds,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+                'max': round(max(latencies), 2) if latencies else 0.0
+            }
+        }
+
+    kinds = sorted({s['kind'] for s in samples})
+    depths = [q['queue_depth'] for q in queue_samples]
+    return {
+        'wall_seconds': round(wall_seconds, 3),
+        'overall': describe(samples),
+        'by_kind': {kind: describe([s for s in samples if s['kind'] == kind]) for kind in kinds},
+        'queue': {
+            'max_depth': max(depths) if depths else 0,
+            'mean_depth': round(sum(depths) / len(depths), 2) if depths else 0.0,
+            'timeline': queue_samples
+        }
+    }
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """Parse ``kind=weight,kind=weight`` into a dictionary"""
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        mix[kind.strip()] = int(weight or 1)
+    unknown = set(mix) - {'upload', 'report_json', 'report_xlsx', 'categories', 'currencies'}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown request kinds: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the expense processing API')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Base URL of a running server')
+    target.add_argument('--in-process', action='store_true', help='Drive the Flask app directly')
+    target.add_argument('--stub-only', action='store_true',
+                        help='Only run the upstream API stub and print its environment')
+    parser.add_argument('--concurrency', type=int, default=4, help='Closed-loop clients')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='Open-loop arrival rate in requests per second')
+    parser.add_argument('--max-outstanding', type=int, default=256,
+                        help='Open-loop cap on concurrent requests')
+    parser.add_argument('--duration', type=float, default=60.0, help='Test duration in seconds')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Request mix as kind=weight pairs (default: {DEFAULT_MIX})")
+    parser.add_argument('--images', type=Path, default=DEFAULT_IMAGES_DIR, help='Upload images directory')
+    parser.add_argument('--sample-interval', type=float, default=1.0, help='Seconds between queue samples')
+    parser.add_argument('--timeout', type=float, default=120.0, help='HTTP request timeout')
+    parser.add_argument('--stub-port', type=int, default=0, help='Port for the upstream API stub')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, default=None, help='Write the JSON results here')
+    args = parser.parse_args()
+
+    stub, stub_env = start_stub_server(args.stub_port)
+    if args.stub_only:
+        print("Upstream API stub running. Start the server with:")
+        for key, value in stub_env.items():
+            print(f"  export {key}='{value}'")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            stub.shutdown()
+        return
+
+    if args.in_process:
+        # The service reads these when it is imported
+        os.environ.update(stub_env)
+        client: Any = InProcessClient()
+    else:
+        print("Note: the server must have been started with these variables to use the stub:")
+        for key, value in stub_env.items():
+            print(f"  {key}={value}")
+        client = HttpClient(args.url, args.timeout)
+
+    images = sorted(args.images.glob('*.jpg')) + sorted(args.images.glob('*.png'))
+    if not images:
+        parser.error(f"No images found in {args.images}")
+
+    test = LoadTest(client, images, args.mix, args.seed)
+    stop = threading.Event()
+    started = time.perf_counter()
+    sampler = threading.Thread(target=test.sample_queue, args=(stop, args.sample_interval, started),
+                               daemon=True)
+    sampler.start()
+
+    deadline = started + args.duration
+    if args.rate:
+        print(f"Open loop: {args.rate} req/s for {args.duration}s")
+        test.run_open(args.rate, deadline, args.max_outstanding)
+    else:
+        print(f"Closed loop: {args.concurrency} clients for {args.duration}s")
+        test.run_closed(args.concurrency, deadline)
+
+    wall_seconds = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+    stub.shutdown()
+
+    summary = summarize(test.samples, test.queue_samples, wall_seconds)
+    summary['settings'] = {
+        'target': args.url or 'in-process',
+        'mode': 'open' if args.rate else 'closed',
+        'rate': args.rate,
+        'concurrency': None if args.rate else args.concurrency,
+        'duration': args.duration,
+        'mix': args.mix
+    }
+
+    print("\n=== Load Test Summary ===")
+    printable = dict(summary, queue={k: v for k, v in summary['queue'].items() if k != 'timeline'})
+    print(json.dumps(printable, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Metrics Module
+
+Prometheus metrics for the receipt processing service: a latency histogram
+per pipeline stage, counters for cache hits, OCR failures, empty results,
+defaulted fields, admission rejections, near-duplicate photos and
+duplicate expenses, and gauges for in-flight requests, OCR queue depth and
+reader pool utilization.
+
+Under a pre-fork server set ``PROMETHEUS_MULTIPROC_DIR`` to an empty,
+writable directory before the workers start. Each worker then writes its
+samples there and ``/metrics`` aggregates all of them, whichever worker
+serves the scrape. Call ``mark_process_dead`` when a worker exits so its
+live gauges are dropped.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+
+# Buckets from 1 ms (regex extractors) up to a minute (full-resolution OCR on a slow CPU)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    'receipt_stage_seconds',
+    'Time spent in each receipt pipeline stage',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+CACHE_HITS = Counter(
+    'receipt_cache_hits_total',
+    'Lookups answered from a cache',
+    ['cache']
+)
+OCR_FAILURES = Counter(
+    'receipt_ocr_failures_total',
+    'OCR runs that raised an error'
+)
+EMPTY_TEXT = Counter(
+    'receipt_ocr_empty_text_total',
+    'Receipts for which OCR returned no text'
+)
+DEFAULTED_FIELDS = Counter(
+    'receipt_defaulted_fields_total',
+    'Expense fields that fell back to a default value',
+    ['field']
+)
+ADMISSION_REJECTED = Counter(
+    'receipt_admission_rejected_total',
+    'Uploads rejected with 429 because the worker had no OCR capacity'
+)
+NEAR_DUPLICATES = Counter(
+    'receipt_near_duplicates_total',
+    'Uploads whose photo matched earlier receipts, by what was done about it',
+    ['action']
+)
+DUPLICATE_EXPENSES = Counter(
+    'receipt_duplicate_expenses_total',
+    'Uploads whose merchant, date, currency and amount matched earlier expenses'
+)
+IN_FLIGHT = Gauge(
+    'receipt_requests_in_flight',
+    'Requests currently being handled',
+    multiprocess_mode='livesum'
+)
+QUEUE_DEPTH = Gauge(
+    'receipt_ocr_queue_depth',
+    'OCR calls waiting for a free reader',
+    multiprocess_mode='livesum'
+)
+READERS_BUSY = Gauge(
+    'receipt_reader_pool_busy',
+    'Readers currently running OCR',
+    multiprocess_mode='livesum'
+)
+READERS_SIZE = Gauge(
+    'receipt_reader_pool_size',
+    'Maximum number of readers in the pool',
+    multiprocess_mode='livesum'
+)
+READER_UTILIZATION = Gauge(
+    'receipt_reader_pool_utilization',
+    'Fraction of the pool readers that are busy, per worker process',
+    multiprocess_mode='liveall'
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record the duration of a stage that was timed elsewhere"""
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str, timings: Optional[Dict[str, float]] = None):
+    """
+    Time the body of a ``with`` block as one pipeline stage.
+
+    When ``timings`` is given the duration is also stored there, in
+    milliseconds, under the stage name.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe_stage(stage, elapsed)
+        if timings is not None:
+            timings[stage] = round(elapsed * 1000, 2)
+
+
+def set_reader_pool(busy: int, size: int):
+    """Publish the reader pool usage of this process"""
+    READERS_BUSY.set(busy)
+    READERS_SIZE.set(size)
+    READER_UTILIZATION.set(busy / size if size else 0.0)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        Tuple[bytes, str]: The response body and its content type.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Drop the live gauges of an exited worker (call from the server's child exit hook)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,383 @@
+"""
+OCR Engine Module
+
+This module owns the EasyOCR readers used by the receipt pipeline and the
+small image helpers that prepare arrays for recognition. Readers are costly
+to build (each one loads the detection and recognition models), so they are
+created once and shared through a pool instead of per request.
+
+OpenCV, NumPy and EasyOCR are imported inside the functions that need them,
+so that importing this module (and the app) does not load them.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ReaderPool:
+    """
+    A fixed-size pool of EasyOCR readers.
+
+    Readers are created lazily up to ``size`` and handed out to one caller
+    at a time, so concurrent requests queue for a reader instead of each
+    loading its own copy of the models.
+    """
+
+    def __init__(self, languages: Optional[List[str]] = None, size: int = 1,
+                 torch_threads: Optional[int] = None):
+        """
+        Initialize the ReaderPool.
+
+        Args:
+            languages (List[str]): Languages passed to ``easyocr.Reader``.
+                                   Defaults to English only.
+            size (int): Maximum number of readers kept alive.
+            torch_threads (int): Intra-op threads torch may use in this
+                                 process. None keeps torch's default (all
+                                 cores).
+        """
+        self.languages = languages or ['en']
+        self.size = max(1, int(size))
+        self.torch_threads = torch_threads
+        self._readers = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._busy = 0
+        self._waiting = 0
+
+    def _create_reader(self):
+        import easyocr
+        if self.torch_threads:
+            import torch
+            torch.set_num_threads(self.torch_threads)
+        return easyocr.Reader(self.languages)
+
+    def _acquire(self, timeout: Optional[float] = None):
+        with self._lock:
+            create = self._readers.empty() and self._created < self.size
+            if create:
+                self._created += 1
+            else:
+                self._waiting += 1
+
+        if create:
+            try:
+                reader = self._create_reader()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        else:
+            try:
+                reader = self._readers.get(timeout=timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+        with self._lock:
+            self._busy += 1
+        return reader
+
+    def warm(self, count: Optional[int] = None) -> int:
+        """
+        Load readers ahead of the first request.
+
+        Loading in a pre-fork master lets every worker share the model
+        weights through copy-on-write pages instead of loading its own.
+
+        Args:
+            count (int): Readers to have loaded afterwards. Defaults to the
+                         pool size.
+
+        Returns:
+            int: Number of readers created by this call.
+        """
+        target = min(self.size, count or self.size)
+        created = 0
+        while True:
+            with self._lock:
+                if self._created >= target:
+                    return created
+                self._created += 1
+            try:
+                reader = self._create_reader()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            self._readers.put(reader)
+            created += 1
+
+    @contextmanager
+    def reader(self, timeout: Optional[float] = None):
+        """
+        Borrow a reader for the duration of a ``with`` block.
+
+        Args:
+            timeout (float): Seconds to wait for a free reader. ``None``
+                             waits forever.
+
+        Yields:
+            easyocr.Reader: A reader that is not used by anyone else.
+        """
+        reader = self._acquire(timeout)
+        try:
+            yield reader
+        finally:
+            with self._lock:
+                self._busy -= 1
+            self._readers.put(reader)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the pool state.
+
+        Returns:
+            Dict[str, int]: Pool size, loaded readers, readers in use and
+            callers waiting for a reader.
+        """
+        with self._lock:
+            return {
+                'size': self.size,
+                'loaded': self._created,
+                'busy': self._busy,
+                'waiting': self._waiting
+            }
+
+
+def read_text(reader, image: np.ndarray, **kwargs: Any) -> Tuple[str, float]:
+    """
+    Run recognition on an image array.
+
+    Args:
+        reader (easyocr.Reader): Reader borrowed from a ``ReaderPool``.
+        image (np.ndarray): Grayscale or BGR image.
+        **kwargs: Extra options forwarded to ``reader.readtext``.
+
+    Returns:
+        Tuple[str, float]: The recognised lines joined by newlines and the
+        mean confidence over all text blocks (0.0 when nothing was found).
+    """
+    results = reader.readtext(image, detail=1, **kwargs)
+    lines = [text for _, text, _ in results]
+    confidences = [float(confidence) for _, _, confidence in results]
+    mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return "\n".join(lines).strip(), mean_confidence
+
+
+def downscale(image: np.ndarray, max_side: int) -> np.ndarray:
+    """
+    Shrink an image so that its longest side is at most ``max_side`` pixels.
+
+    Args:
+        image (np.ndarray): Image to shrink.
+        max_side (int): Target length of the longest side.
+
+    Returns:
+        np.ndarray: The resized image, or the input if it is already small
+        enough.
+    """
+    import cv2
+
+    height, width = image.shape[:2]
+    scale = max_side / float(max(height, width))
+    if scale >= 1.0:
+        return image
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def _ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Binarize a grayscale image into a float mask where text pixels are 1."""
+    import cv2
+    import numpy as np
+
+    binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    return (binary > 0).astype(np.float32)
+
+
+def _line_contrast(ink: np.ndarray, axis: int = 1) -> float:
+    """
+    Score how strongly the ink forms text lines along an axis.
+
+    The mask is first smeared along the candidate text direction so that
+    characters merge into line bands. For the true direction the projection
+    profile then alternates between solid lines and empty gaps, giving a
+    high squared coefficient of variation; across the lines the smeared
+    blocks fill the profile evenly.
+    """
+    import cv2
+    import numpy as np
+
+    length = max(3, max(ink.shape) // 40)
+    kernel = np.ones((1, length) if axis == 1 else (length, 1), np.uint8)
+    profile = cv2.dilate(ink, kernel).mean(axis=axis)
+    mean = float(profile.mean())
+    if mean <= 0:
+        return 0.0
+    return float(profile.var()) / (mean * mean)
+
+
+def _skew_sharpness(ink: np.ndarray) -> float:
+    """Sum of squared differences between adjacent row sums of the ink mask."""
+    import numpy as np
+
+    row_sums = ink.sum(axis=1, dtype=np.float64)
+    return float(np.sum(np.diff(row_sums) ** 2))
+
+
+def _rotate_bound(image: np.ndarray, angle: float, border_value: int = 0) -> np.ndarray:
+    """Rotate an image by ``angle`` degrees, enlarging the canvas to keep all pixels."""
+    import cv2
+
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width = int(round(height * sin + width * cos))
+    new_height = int(round(height * cos + width * sin))
+    matrix[0, 2] += new_width / 2.0 - width / 2.0
+    matrix[1, 2] += new_height / 2.0 - height / 2.0
+    return cv2.warpAffine(
+        image, matrix, (new_width, new_height),
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=border_value
+    )
+
+
+def _is_upside_down(ink: np.ndarray, margin: float) -> bool:
+    """
+    Guess whether horizontal text is upside down.
+
+    In upright Latin text the dense x-height band sits in the lower part of
+    each line, because ascenders and capitals are far more common than
+    descenders. The ink centroid of each line is therefore below its middle;
+    when it is clearly above, the page is rotated by 180 degrees.
+
+    The cue is weak on receipts made mostly of digits and capitals, which
+    fill their lines evenly. When no side wins by ``margin`` the page is
+    taken as upright, so such a receipt photographed upside down stays
+    upside down (realistic_test_receipts/receipt_realistic_22.jpg is one).
+    """
+    import numpy as np
+
+    profile = ink.mean(axis=1)
+    if not profile.size or profile.max() <= 0:
+        return False
+
+    active = np.concatenate(([False], profile > profile.max() * 0.1, [False]))
+    edges = np.flatnonzero(active[1:] != active[:-1])
+    weighted_offset, total_mass = 0.0, 0.0
+    for start, end in zip(edges[::2], edges[1::2]):
+        height = end - start
+        if height < 4:
+            continue
+        rows = profile[start:end]
+        mass = float(rows.sum())
+        centroid = float(np.dot(np.arange(height), rows)) / mass
+        weighted_offset += (centroid - (height - 1) / 2.0) / (height / 2.0) * mass
+        total_mass += mass
+
+    if not total_mass:
+        return False
+    return weighted_offset / total_mass < -margin
+
+
+def _estimate_skew(ink: np.ndarray, max_skew: float) -> float:
+    """Find the small rotation that makes the row projection profile sharpest."""
+    import numpy as np
+
+    def best_angle(candidates: np.ndarray) -> float:
+        scores = [
+            _skew_sharpness(_rotate_bound(ink, float(angle)))
+            for angle in candidates
+        ]
+        return float(candidates[int(np.argmax(scores))])
+
+    coarse = best_angle(np.arange(-max_skew, max_skew + 1e-6, 1.0))
+    return best_angle(np.arange(coarse - 1.0, coarse + 1.0 + 1e-6, 0.25))
+
+
+def detect_orientation(image: np.ndarray, max_side: int = 800, max_skew: float = 10.0,
+                       upside_down_margin: float = 0.03) -> Dict[str, float]:
+    """
+    Detect page orientation and skew from a thumbnail using projection profiles.
+
+    Args:
+        image (np.ndarray): Grayscale or BGR image.
+        max_side (int): Longest side of the thumbnail used for detection.
+        max_skew (float): Largest skew angle (degrees) searched for.
+        upside_down_margin (float): Minimum line asymmetry before a page is
+                                    considered upside down.
+
+    Returns:
+        Dict[str, float]: ``rotation`` is the clockwise quarter turn (0, 90,
+        180 or 270 degrees) that makes the text upright, ``skew`` the
+        additional counter-clockwise angle that levels the text lines.
+    """
+    import cv2
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    ink = _ink_mask(downscale(gray, max_side))
+    if not ink.any():
+        return {'rotation': 0, 'skew': 0.0}
+
+    rotation = 0
+    if _line_contrast(ink, axis=0) > _line_contrast(ink, axis=1):
+        # Text lines run vertically; turn them horizontal first
+        ink = cv2.rotate(ink, cv2.ROTATE_90_CLOCKWISE)
+        rotation = 90
+
+    skew = _estimate_skew(ink, max_skew)
+    if skew:
+        ink = _rotate_bound(ink, skew)
+
+    if _is_upside_down(ink, upside_down_margin):
+        rotation = (rotation + 180) % 360
+
+    return {'rotation': rotation, 'skew': skew}
+
+
+_QUARTER_TURNS = {
+    90: 'ROTATE_90_CLOCKWISE',
+    180: 'ROTATE_180',
+    270: 'ROTATE_90_COUNTERCLOCKWISE'
+}
+
+
+def correct_orientation(image: np.ndarray, max_side: int = 800, max_skew: float = 10.0,
+                        min_skew: float = 0.5) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Rotate an image so that its text is upright and level.
+
+    Detection runs on a thumbnail; the full image is only touched when a
+    correction is needed. Quarter turns are lossless, while skews smaller
+    than ``min_skew`` degrees are left alone to avoid resampling.
+
+    Args:
+        image (np.ndarray): Grayscale or BGR image.
+        max_side (int): Longest side of the detection thumbnail.
+        max_skew (float): Largest skew angle (degrees) searched for.
+        min_skew (float): Smallest skew angle (degrees) that is corrected.
+
+    Returns:
+        Tuple[np.ndarray, Dict[str, Any]]: The corrected image and the applied
+        ``rotation`` and ``skew`` in degrees.
+    """
+    import cv2
+
+    orientation = detect_orientation(image, max_side=max_side, max_skew=max_skew)
+    if abs(orientation['skew']) < min_skew:
+        orientation['skew'] = 0.0
+
+    if orientation['rotation']:
+        image = cv2.rotate(image, getattr(cv2, _QUARTER_TURNS[orientation['rotation']]))
+    if orientation['skew']:
+        white = (255, 255, 255) if image.ndim == 3 else 255
+        image = _rotate_bound(image, orientation['skew'], border_value=white)
+
+    return image, orientation
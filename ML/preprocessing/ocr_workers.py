@@ -0,0 +1,216 @@
+"""
+OCR Worker Processes Module
+
+Runs EasyOCR in separate processes, so recognition for concurrent requests
+uses several cores instead of contending for one interpreter's GIL. Images
+are handed over through ``multiprocessing.shared_memory``. The request
+handler copies the decoded array into a segment and sends only the
+segment's name, shape and dtype, so no pixel data is pickled. The segment
+is unlinked as soon as the job completes, whether or not it succeeded.
+
+A worker that dies (killed for memory, or failing to load its reader)
+breaks the whole executor. The pool then replaces the executor and retries
+the job once, so one crash costs at most that job.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from odoo.ML.preprocessing.ocr_engine import read_text
+
+# Reader of the current worker process, created by _init_worker
+_reader = None
+
+
+def _init_worker(languages: List[str], torch_threads: Optional[int]):
+    global _reader
+    import easyocr
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+    _reader = easyocr.Reader(languages)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open an existing segment without letting this process's resource tracker claim it"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    segment = shared_memory.SharedMemory(name=name)
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+def _ocr_shared(name: str, shape: Tuple[int, ...], dtype: str, kwargs: Dict) -> Tuple[str, float]:
+    """Worker side of a job: view the shared segment as an array and recognise it"""
+    import numpy as np
+
+    segment = _attach(name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+        try:
+            return read_text(_reader, image, **kwargs)
+        finally:
+            # Drop the view before closing, or the buffer stays exported
+            del image
+    finally:
+        segment.close()
+
+
+def _ping(delay: float) -> int:
+    time.sleep(delay)
+    return os.getpid()
+
+
+class OcrProcessPool:
+    """
+    A pool of processes that each hold one EasyOCR reader.
+
+    The executor is started lazily and restarted after a fork, so a pool
+    created at import time in a pre-fork master is never shared by workers.
+    It is also replaced when broken by a dead worker.
+    """
+
+    # Worker-side functions, pickled by name for the spawned processes
+    initializer = staticmethod(_init_worker)
+    job = staticmethod(_ocr_shared)
+
+    def __init__(self, processes: int, languages: Optional[List[str]] = None,
+                 torch_threads: Optional[int] = None):
+        """
+        Initialize the OcrProcessPool.
+
+        Args:
+            processes (int): Number of OCR processes.
+            languages (List[str]): Languages passed to ``easyocr.Reader``.
+            torch_threads (int): Intra-op threads torch may use per process.
+        """
+        self.size = max(1, int(processes))
+        self.languages = languages or ['en']
+        self.torch_threads = torch_threads
+        self._lock = threading.Lock()
+        self._executor = None
+        self._owner_pid = None
+        self._loaded = 0
+        self._pending = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._owner_pid != os.getpid():
+                # Spawn, not fork: torch's thread pool does not survive a fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=get_context('spawn'),
+                    initializer=self.initializer,
+                    initargs=(self.languages, self.torch_threads)
+                )
+                self._owner_pid = os.getpid()
+                self._loaded = 0
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        """Drop a broken executor, unless another job has replaced it already"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._loaded = 0
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def warm(self, attempts: int = 5) -> int:
+        """
+        Start every process and load its reader.
+
+        Args:
+            attempts (int): Rounds of probe jobs sent to reach all processes.
+
+        Returns:
+            int: Number of processes known to be loaded.
+        """
+        executor = self._get_executor()
+        seen = set()
+        try:
+            for _ in range(attempts):
+                # Slow probes keep each process busy so the next probe goes elsewhere
+                futures = [executor.submit(_ping, 0.2) for _ in range(self.size)]
+                seen.update(future.result() for future in futures)
+                if len(seen) >= self.size:
+                    break
+        except BrokenProcessPool:
+            # A reader that fails to load breaks the executor; the next call starts afresh
+            self._discard(executor)
+            raise
+        with self._lock:
+            self._loaded = len(seen)
+        return len(seen)
+
+    def run(self, image, **kwargs) -> Tuple[str, float]:
+        """
+        Recognise an image in a worker process.
+
+        Args:
+            image (np.ndarray): Grayscale or BGR image.
+            **kwargs: Extra options forwarded to ``reader.readtext``.
+
+        Returns:
+            Tuple[str, float]: Recognised text and mean confidence, as
+            returned by ``read_text``.
+
+        Raises:
+            BrokenProcessPool: When the job's worker died on the retry too.
+        """
+        import numpy as np
+
+        image = np.ascontiguousarray(image)
+        segment = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        try:
+            np.ndarray(image.shape, dtype=image.dtype, buffer=segment.buf)[...] = image
+            with self._lock:
+                self._pending += 1
+            try:
+                for attempt in range(2):
+                    executor = self._get_executor()
+                    try:
+                        future = executor.submit(self.job, segment.name, image.shape, image.dtype.str, kwargs)
+                        return future.result()
+                    except BrokenProcessPool:
+                        self._discard(executor)
+                        if attempt:
+                            raise
+            finally:
+                with self._lock:
+                    self._pending -= 1
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the pool state, in the same shape as ``ReaderPool.stats``.
+
+        Returns:
+            Dict[str, int]: Pool size, loaded processes, jobs running and
+            jobs waiting for a process.
+        """
+        with self._lock:
+            pending = self._pending
+            return {
+                'size': self.size,
+                'loaded': self._loaded,
+                'busy': min(pending, self.size),
+                'waiting': max(0, pending - self.size)
+            }
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            if self._executor is not None and self._owner_pid == os.getpid():
+                self._executor.shutdown(wait=True)
+            self._executor = None
@@ -1,3 +1,4 @@
+import argparse
 import cv2
 import numpy as np
 import os
@@ -7,6 +8,10 @@ from textblob import TextBlob
 import re
 import requests
 import easyocr
+import time
+from pathlib import Path
+from odoo.ML.preprocessing.autotune import apply_tuning
+from odoo.ML.preprocessing.expense_dataset import ExpenseDatasetWriter, expense_record
 
 def preprocess_image_for_ocr(image_path: str) -> np.ndarray:
     """Enhanced image preprocessing for better OCR results"""
@@ -114,48 +119,79 @@ def extract_receipt_data(text: str, image_name: str) -> dict:
     
     return data
 
-def extract_text_from_image(image_path: str) -> str:
-    """Extract text from an image using EasyOCR"""
+def parse_receipt_date(date_time: str):
+    """Receipt date (YYYY-MM-DD) from a date/time line, or None"""
+    if not date_time:
+        return None
     try:
-        # Initialize EasyOCR reader (English only)
-        reader = easyocr.Reader(['en'])
+        from dateutil import parser
+        return parser.parse(date_time, fuzzy=True, dayfirst=True).strftime('%Y-%m-%d')
+    except (ValueError, OverflowError):
+        return None
+
+def dataset_record(receipt: dict, ocr_ms: float) -> dict:
+    """Map a receipt from extract_receipt_data to an expense dataset record"""
+    return expense_record(
+        None, 'batch', receipt['source_image'],
+        {
+            'merchant': receipt['restaurant_name'],
+            'date': parse_receipt_date(receipt['date_time']),
+            'amount': receipt['total'],
+            'items': [{'description': item['name'], 'amount': item['price']} for item in receipt['items']]
+        },
+        timings_ms={'ocr': ocr_ms}
+    )
+
+def extract_text_from_image(image_path: str, reader=None) -> tuple:
+    """
+    Extract text from an image using EasyOCR
+    
+    Args:
+        image_path: Path of the receipt image
+        reader: EasyOCR reader to use; a new English reader when None
         
-        # Read and preprocess image
-        processed_img = preprocess_image(image_path)
+    Returns:
+        Tuple of the raw OCR text and the text after correct_text
+    """
+    try:
+        if reader is None:
+            reader = easyocr.Reader(['en'])
         
-        # Save processed image to a temporary file for EasyOCR
-        temp_path = "temp_processed.jpg"
-        cv2.imwrite(temp_path, processed_img)
+        # Read and preprocess image; EasyOCR takes the array directly
+        processed_img = preprocess_image_for_ocr(image_path)
         
         # Extract text
         result = reader.readtext(
-            temp_path,
+            processed_img,
             detail=0,
             paragraph=True,
             width_ths=0.7,
             height_ths=0.5
         )
         
-        # Clean up
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-            
         text = "\n".join(result).strip()
-        return text
+        return text, correct_text(text)
         
     except Exception as e:
         print(f"Error in text extraction: {e}")
-        return ""
-def process_receipts(input_dir: str, output_file: str):
-    """Process all receipt images in a directory and save to a single Excel file"""
+        return "", ""
+
+def process_receipts(input_dir: str, output_file: str, dataset_dir: str = None):
+    """
+    Process all receipt images in a directory and save to a single Excel file
+    
+    With dataset_dir, the extracted records are also appended to the
+    Parquet expense dataset the service writes (see expense_dataset.py).
+    """
     if not os.path.exists(input_dir):
         print(f"Input directory {input_dir} does not exist")
         return
     
+    dataset = ExpenseDatasetWriter(dataset_dir, batch_size=1000, flush_interval=0) if dataset_dir else None
+    
     # Initialize EasyOCR reader once
     print("Initializing EasyOCR (this might take a moment)...")
+    reader = easyocr.Reader(['en'])
     
     with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
         all_data = []
@@ -169,11 +205,16 @@ def process_receipts(input_dir: str, output_file: str):
             print(f"\nProcessing {filename}...")
             
             # Extract text and correct it
-            raw_text, corrected_text = extract_text_from_image(image_path)
+            started = time.perf_counter()
+            raw_text, corrected_text = extract_text_from_image(image_path, reader)
+            ocr_ms = round((time.perf_counter() - started) * 1000, 2)
             
-            # Extract structured data
-            receipt_data = extract_receipt_data(corrected_text, filename)
+            # Extract structured data from the raw text; correct_text turns
+            # digits into letters, which would wipe out the prices
+            receipt_data = extract_receipt_data(raw_text, filename)
             all_data.append(receipt_data)
+            if dataset is not None:
+                dataset.add(dataset_record(receipt_data, ocr_ms))
             
             # Save raw and corrected text to separate sheets
             text_df = pd.DataFrame({
@@ -205,11 +246,25 @@ def process_receipts(input_dir: str, output_file: str):
             summary_df = pd.DataFrame(summary_data)
             summary_df.to_excel(writer, sheet_name='Summary', index=False)
     
+    if dataset is not None:
+        dataset.close()
+        print(f"Appended {dataset.stats()['written']} records to {dataset_dir}")
     print(f"\nProcessing complete. Results saved to {output_file}")
 
 if __name__ == "__main__":
-    input_directory = r"c:\Users\HP\odoo\realistic_test_receipts"
-    output_excel = r"c:\Users\HP\odoo\Backend\reports\receipts_analysis.xlsx"
+    repo_root = Path(__file__).resolve().parents[2]
+    parser = argparse.ArgumentParser(description='Extract receipt data from a directory of images')
+    parser.add_argument('input_dir', nargs='?', default=str(repo_root / 'realistic_test_receipts'),
+                        help='Directory of receipt images')
+    parser.add_argument('output_file', nargs='?',
+                        default=str(repo_root / 'Backend' / 'reports' / 'receipts_analysis.xlsx'),
+                        help='Excel workbook to write')
+    parser.add_argument('--dataset', default=os.environ.get('EXPENSE_DATASET_DIR') or None,
+                        help='Parquet expense dataset to append to (defaults to EXPENSE_DATASET_DIR)')
+    args = parser.parse_args()
+    
+    # Use the torch thread count measured by autotune.py instead of every core
+    apply_tuning()
     
-    os.makedirs(os.path.dirname(output_excel), exist_ok=True)
-    process_receipts(input_directory, output_excel)
\ No newline at end of file
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_file)), exist_ok=True)
+    process_receipts(args.input_dir, args.output_file, args.dataset)
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""
+Report Codec Module
+
+JSON reports are stored compressed, with gzip (standard library) or zstd
+(optional ``zstandard`` package), and the encoding is recorded in the file
+extension (``.json.gz``, ``.json.zst``). Reports are compressed once, when
+they are written. A client that accepts the stored encoding gets the stored
+bytes as they are. Only other clients cost a decompression.
+
+Reports are stored inside the API envelope
+(``{"status": "success", "report_id": ..., "data": <report>}``), so the
+stored bytes are the complete response body: one compressed member (frame),
+which every client decodes, and never recompressed. Reports stored before
+the envelope are wrapped when they are served.
+"""
+
+import gzip
+import json
+import zlib
+from typing import Any, Dict, Optional
+
+# Content-Encoding name -> file extension appended to '.json'
+EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 10
+
+# Start of every enveloped report, as written by ``envelope``
+ENVELOPE_HEAD = b'{"status": "success", "report_id": '
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("zstd report compression requires the 'zstandard' package") from e
+    return zstandard
+
+
+def available_encoding(encoding: Optional[str]) -> Optional[str]:
+    """
+    Resolve a configured encoding to one this process can write.
+
+    Args:
+        encoding (str): 'gzip', 'zstd' or None / 'none' for uncompressed.
+
+    Returns:
+        Optional[str]: The encoding, 'gzip' when zstd was requested but
+        ``zstandard`` is not installed, or None.
+    """
+    if not encoding or encoding == 'none':
+        return None
+    if encoding not in EXTENSIONS:
+        raise ValueError(f"Unknown report compression: {encoding}")
+    if encoding == 'zstd':
+        try:
+            _zstandard()
+        except RuntimeError:
+            return 'gzip'
+    return encoding
+
+
+def report_name(report_id: str, encoding: Optional[str]) -> str:
+    """File name of a JSON report stored with an encoding"""
+    return f"{report_id}.json{EXTENSIONS.get(encoding, '')}"
+
+
+def encoding_of(path: str) -> Optional[str]:
+    """Encoding of a stored report, from its extension"""
+    for encoding, extension in EXTENSIONS.items():
+        if path.endswith(f".json{extension}"):
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: Optional[str]) -> bytes:
+    """Compress bytes as one member / frame of an encoding; None returns them as they are"""
+    if encoding == 'gzip':
+        # mtime=0 keeps the output reproducible
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == 'zstd':
+        return _zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def decompress(data: bytes, encoding: Optional[str]) -> bytes:
+    """Decompress every member / frame of an encoded stream"""
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'zstd':
+        zstandard = _zstandard()
+        reader = zstandard.ZstdDecompressor().stream_reader(data, read_across_frames=True)
+        with reader:
+            return reader.read()
+    return data
+
+
+def read_report_bytes(path: str) -> bytes:
+    """Read a stored JSON report, decompressed"""
+    with open(path, 'rb') as f:
+        return decompress(f.read(), encoding_of(path))
+
+
+def envelope(report_id: str, report: bytes) -> bytes:
+    """The API response document around a serialized report"""
+    head = json.dumps({'status': 'success', 'report_id': report_id})
+    return (head[:-1] + ', "data": ').encode('utf-8') + report + b'}'
+
+
+def peek(data: bytes, encoding: Optional[str], size: int) -> bytes:
+    """Decompress only the first ``size`` bytes of an encoded stream"""
+    if encoding == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data, size)
+    if encoding == 'zstd':
+        with _zstandard().ZstdDecompressor().stream_reader(data) as reader:
+            return reader.read(size)
+    return data[:size]
+
+
+def is_enveloped(data: bytes, encoding: Optional[str]) -> bool:
+    """Whether stored report bytes already hold the API envelope"""
+    return peek(data, encoding, len(ENVELOPE_HEAD)) == ENVELOPE_HEAD
+
+
+def read_report(path: str) -> Dict[str, Any]:
+    """Read a stored JSON report, without its envelope"""
+    document = json.loads(read_report_bytes(path))
+    if isinstance(document, dict) and set(document) == {'status', 'report_id', 'data'}:
+        return document['data']
+    return document
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows an encoding.
+
+    Args:
+        accept_encoding (str): Header value, e.g. ``"gzip, deflate, br;q=0.9"``.
+        encoding (str): 'gzip' or 'zstd'.
+
+    Returns:
+        bool: True if the encoding (or ``*``) is listed with a non-zero q.
+    """
+    if not accept_encoding:
+        return False
+    names = {encoding, 'x-gzip'} if encoding == 'gzip' else {encoding}
+    wildcard = False
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name in names:
+            return quality > 0
+        if name == '*':
+            wildcard = quality > 0
+    return wildcard
@@ -8,15 +8,17 @@ well-formatted and documented output files with text correction capabilities.
 
 import os
 import json
+import logging
 import re
 import string
-import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional, List, Union
-from textblob import TextBlob
 import unicodedata
 
+logger = logging.getLogger(__name__)
+
 class TextCorrector:
     """
     Handles text correction and cleaning operations.
@@ -62,10 +64,11 @@ class TextCorrector:
             return text
             
         try:
+            from textblob import TextBlob
             blob = TextBlob(text)
             return str(blob.correct())
         except Exception as e:
-            print(f"Error in spelling correction: {e}")
+            logger.warning("Error in spelling correction: %s", e)
             return text
     
     @staticmethod
@@ -83,6 +86,7 @@ class TextCorrector:
             return text
             
         try:
+            from textblob import TextBlob
             blob = TextBlob(text)
             # Correct some common grammar issues
             corrected = str(blob.correct())
@@ -92,7 +96,7 @@ class TextCorrector:
             corrected = re.sub(r"\b(wont)\b", "won't", corrected, flags=re.IGNORECASE)
             return corrected
         except Exception as e:
-            print(f"Error in grammar correction: {e}")
+            logger.warning("Error in grammar correction: %s", e)
             return text
     
     @staticmethod
@@ -133,22 +137,47 @@ class ReportGenerator:
     Includes text correction and cleaning features.
     """
     
-    def __init__(self, base_dir: str = 'reports'):
+    def __init__(self, base_dir: str = 'reports', storage=None, compression: Optional[str] = None):
         """
         Initialize the ReportGenerator.
         
         Args:
             base_dir (str): Base directory to save generated reports.
                            Defaults to 'reports'.
+            storage (Storage): Backend that stores the reports, by artifact
+                               type 'json' and 'xlsx'. Defaults to plain
+                               files under ``base_dir/json`` and ``base_dir/xlsx``.
+            compression (str): Encoding of JSON reports, 'gzip' or 'zstd'
+                               (see ``report_codec``). Defaults to plain JSON.
         """
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(exist_ok=True, parents=True)
+        self.storage = storage
+        self.compression = compression
         self.text_corrector = TextCorrector()
     
+    @contextmanager
+    def _output(self, kind: str, name: str):
+        # Yields the path to write to; with a storage backend it is published atomically on exit
+        if self.storage is not None:
+            with self.storage.writer(kind, name) as path:
+                yield path
+            return
+        output_dir = self.base_dir / kind
+        output_dir.mkdir(exist_ok=True, parents=True)
+        yield str(output_dir / name)
+    
+    def _output_path(self, kind: str, name: str) -> str:
+        if self.storage is not None:
+            return self.storage.path(kind, name)
+        return str(self.base_dir / kind / name)
+    
     def generate_reports(self, report_id: str, data: Dict[str, Any]) -> Dict[str, str]:
         """
         Generate reports in all available formats.
         
+        The data is cleaned once and shared by all writers.
+        
         Args:
             report_id (str): Unique identifier for the report.
             data (Dict[str, Any]): The receipt data to generate reports from.
@@ -156,9 +185,10 @@ class ReportGenerator:
         Returns:
             Dict[str, str]: Dictionary containing paths to the generated files.
         """
+        cleaned_data = self.clean_data(data)
         return {
-            'json': self.generate_json_report(report_id, data),
-            'xlsx': self.generate_excel_report(report_id, data)
+            'json': self.write_json_report(report_id, cleaned_data),
+            'xlsx': self.write_excel_report(report_id, cleaned_data)
         }
     
     def clean_data(self, data: Union[Dict, List, str]) -> Union[Dict, List, str]:
@@ -200,19 +230,30 @@ class ReportGenerator:
         Returns:
             str: Path to the generated JSON file.
         """
-        # Clean and correct the data
-        cleaned_data = self.clean_data(data)
+        return self.write_json_report(report_id, self.clean_data(data))
+    
+    def write_json_report(self, report_id: str, cleaned_data: Dict[str, Any]) -> str:
+        """
+        Write already cleaned receipt data as a JSON report.
         
-        # Create reports/json directory if it doesn't exist
-        json_dir = self.base_dir / 'json'
-        json_dir.mkdir(exist_ok=True)
+        Args:
+            report_id (str): Unique identifier for the report.
+            cleaned_data (Dict[str, Any]): Output of ``clean_data``.
+            
+        Returns:
+            str: Path to the generated JSON file.
+        """
+        from odoo.ML.preprocessing.report_codec import compress, envelope, report_name
         
-        # Save as JSON
-        json_path = json_dir / f"{report_id}.json"
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(cleaned_data, f, indent=2, ensure_ascii=False)
+        # Save as the complete API response, compressed once here rather
+        # than on every download
+        name = report_name(report_id, self.compression)
+        content = json.dumps(cleaned_data, indent=2, ensure_ascii=False).encode('utf-8')
+        with self._output('json', name) as json_path:
+            with open(json_path, 'wb') as f:
+                f.write(compress(envelope(report_id, content), self.compression))
             
-        return str(json_path)
+        return self._output_path('json', name)
     
     def generate_excel_report(self, report_id: str, data: Dict[str, Any]) -> str:
         """
@@ -225,8 +266,20 @@ class ReportGenerator:
         Returns:
             str: Path to the generated Excel file.
         """
-        # Clean and correct the data
-        cleaned_data = self.clean_data(data)
+        return self.write_excel_report(report_id, self.clean_data(data))
+    
+    def write_excel_report(self, report_id: str, cleaned_data: Dict[str, Any]) -> str:
+        """
+        Write already cleaned receipt data as an Excel report.
+        
+        Args:
+            report_id (str): Unique identifier for the report.
+            cleaned_data (Dict[str, Any]): Output of ``clean_data``.
+            
+        Returns:
+            str: Path to the generated Excel file.
+        """
+        import pandas as pd
         
         # Create Excel data
         excel_data = []
@@ -264,15 +317,11 @@ class ReportGenerator:
         # Create DataFrame
         df = pd.DataFrame(excel_data)
         
-        # Create output directory if it doesn't exist
-        output_dir = self.base_dir / 'xlsx'
-        output_dir.mkdir(exist_ok=True, parents=True)
-        
         # Save the Excel file
-        output_path = output_dir / f"{report_id}.xlsx"
-        df.to_excel(output_path, index=False, engine='openpyxl', header=False)
+        with self._output('xlsx', f"{report_id}.xlsx") as output_path:
+            df.to_excel(output_path, index=False, engine='openpyxl', header=False)
         
-        return str(output_path)
+        return self._output_path('xlsx', f"{report_id}.xlsx")
 
 # Example usage
 if __name__ == "__main__":
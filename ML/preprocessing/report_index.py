@@ -0,0 +1,514 @@
+"""
+Report Index Module
+
+Records every processed receipt in an embedded SQLite database (WAL mode),
+so reports can be listed and filtered without scanning the report files.
+Listings use keyset pagination. Each page continues from the sort key of
+the previous page's last row, through an index on that key, so a page
+costs the same at any depth and with millions of rows. Filters keep that
+property: the equality filters (category, merchant) lead an index for
+every sort key, and a range filter (dates, amounts) is only accepted when
+the listing is sorted by the same column. No listing is ever sorted in a
+temporary B-tree.
+
+The receipt text (OCR output, merchant, category and item descriptions) is
+kept in an FTS5 full-text index that shares the reports' rowids, for ranked
+word search with snippets. Perceptual hashes of the receipt photos are kept
+with one index key per band (see image_hash) for near-duplicate lookups.
+
+Usage (index reports, and their text, written before the index existed):
+    python report_index.py --backfill reports/json --db reports/index.sqlite3
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id TEXT PRIMARY KEY,
+    uploaded_at TEXT NOT NULL,
+    merchant TEXT,
+    merchant_key TEXT,
+    date TEXT,
+    amount REAL,
+    currency TEXT,
+    category TEXT,
+    status TEXT,
+    file_hash TEXT,
+    date_defaulted INTEGER
+);
+CREATE INDEX IF NOT EXISTS reports_uploaded_at ON reports (uploaded_at, report_id);
+CREATE INDEX IF NOT EXISTS reports_date ON reports (date, report_id);
+CREATE INDEX IF NOT EXISTS reports_amount ON reports (amount, report_id);
+CREATE INDEX IF NOT EXISTS reports_category ON reports (category, date, report_id);
+CREATE INDEX IF NOT EXISTS reports_category_uploaded_at ON reports (category, uploaded_at, report_id);
+CREATE INDEX IF NOT EXISTS reports_category_amount ON reports (category, amount, report_id);
+CREATE INDEX IF NOT EXISTS reports_merchant ON reports (merchant_key, date, report_id);
+CREATE INDEX IF NOT EXISTS reports_merchant_uploaded_at ON reports (merchant_key, uploaded_at, report_id);
+CREATE INDEX IF NOT EXISTS reports_merchant_amount ON reports (merchant_key, amount, report_id);
+CREATE INDEX IF NOT EXISTS reports_file_hash ON reports (file_hash);
+CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO index_meta (key, value) VALUES ('version', 0);
+CREATE VIRTUAL TABLE IF NOT EXISTS report_text USING fts5 (
+    merchant, category, items, raw_text,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+-- 64-bit dHashes of earlier releases cannot be compared with the current hashes
+DROP TABLE IF EXISTS image_hashes;
+CREATE TABLE IF NOT EXISTS receipt_hashes (report_id TEXT PRIMARY KEY, hash TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS receipt_hash_bands (band_key INTEGER NOT NULL, report_id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS receipt_hash_bands_key ON receipt_hash_bands (band_key, report_id);
+"""
+
+COLUMNS = ['report_id', 'uploaded_at', 'merchant', 'date', 'amount', 'currency', 'category', 'status', 'file_hash',
+           'date_defaulted']
+# Columns added after the first release, with their types, for existing databases
+ADDED_COLUMNS = {'date_defaulted': 'INTEGER'}
+SORT_KEYS = ['uploaded_at', 'date', 'amount']
+# Range filters and the one sort key an index can serve them with
+RANGE_FILTER_SORTS = {'date_from': 'date', 'date_to': 'date', 'min_amount': 'amount', 'max_amount': 'amount'}
+MAX_PAGE_SIZE = 200
+MAX_SEARCH_OFFSET = 1000
+TEXT_FIELDS = ['merchant', 'category', 'items', 'raw_text']
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_cursor(sort_value: Any, report_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, report_id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    """
+    Decode a pagination cursor.
+
+    Raises:
+        ValueError: The cursor is malformed.
+    """
+    try:
+        sort_value, report_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception as e:
+        raise ValueError('Invalid cursor') from e
+    return sort_value, str(report_id)
+
+
+class ReportIndex:
+    """
+    SQLite index of processed reports.
+
+    Each thread uses its own connection. WAL mode lets readers list reports
+    while another thread or worker process is writing.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the ReportIndex.
+
+        Args:
+            path (str): Database file; created with its schema if missing.
+        """
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+            existing = {row['name'] for row in connection.execute('PRAGMA table_info(reports)')}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in existing:
+                    try:
+                        connection.execute(f"ALTER TABLE reports ADD COLUMN {column} {column_type}")
+                    except sqlite3.OperationalError as e:
+                        # Another worker process added it first
+                        if 'duplicate column' not in str(e):
+                            raise
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        # A connection is never used across a fork
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def add(self, record: Dict[str, Any], text: Optional[Dict[str, str]] = None):
+        """
+        Insert or update a report.
+
+        Args:
+            record (Dict[str, Any]): Values for ``COLUMNS``; missing ones are NULL.
+            text (Dict[str, str]): Searchable ``TEXT_FIELDS`` of the report.
+        """
+        values = {column: record.get(column) for column in COLUMNS}
+        values['merchant_key'] = (values['merchant'] or '').lower()
+        names = list(values)
+        with self._connect() as connection:
+            # An upsert keeps the rowid, which is also the report's full-text rowid
+            connection.execute(
+                f"INSERT INTO reports ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)}) "
+                f"ON CONFLICT (report_id) DO UPDATE SET "
+                f"{', '.join(f'{name} = excluded.{name}' for name in names[1:])}",
+                [values[name] for name in names]
+            )
+            if text is not None:
+                rowid = connection.execute(
+                    'SELECT rowid FROM reports WHERE report_id = ?', (values['report_id'],)).fetchone()[0]
+                self._set_text(connection, rowid, text)
+            self._bump_version(connection)
+
+    def _bump_version(self, connection: sqlite3.Connection):
+        connection.execute("UPDATE index_meta SET value = value + 1 WHERE key = 'version'")
+
+    def version(self) -> int:
+        """Counter increased by every change, in any process; cheap to poll for cache invalidation"""
+        return self._connect().execute("SELECT value FROM index_meta WHERE key = 'version'").fetchone()[0]
+
+    def rows_after(self, rowid: int, columns: List[str]) -> List[Tuple]:
+        """
+        Read reports added after a rowid, in rowid order.
+
+        Args:
+            rowid (int): Last rowid already read; 0 reads everything.
+            columns (List[str]): Columns to read, after the rowid.
+
+        Returns:
+            List[Tuple]: ``(rowid, *columns)`` rows.
+        """
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        cursor = self._connect().execute(
+            f"SELECT rowid, {', '.join(columns)} FROM reports WHERE rowid > ? ORDER BY rowid", (rowid,))
+        # Plain tuples; sqlite3.Row objects are slow to build in bulk
+        cursor.row_factory = None
+        return cursor.fetchall()
+
+    def _set_text(self, connection: sqlite3.Connection, rowid: int, text: Dict[str, str]):
+        connection.execute('DELETE FROM report_text WHERE rowid = ?', (rowid,))
+        connection.execute(
+            f"INSERT INTO report_text (rowid, {', '.join(TEXT_FIELDS)}) "
+            f"VALUES (?, {', '.join('?' for _ in TEXT_FIELDS)})",
+            [rowid] + [text.get(field) or '' for field in TEXT_FIELDS]
+        )
+
+    def has_text(self, report_id: str) -> bool:
+        """Whether a report's text is in the full-text index"""
+        return self._connect().execute(
+            'SELECT 1 FROM reports JOIN report_text ON report_text.rowid = reports.rowid '
+            'WHERE reports.report_id = ?', (report_id,)).fetchone() is not None
+
+    def text(self, report_id: str) -> Optional[Dict[str, str]]:
+        """Get a report's ``TEXT_FIELDS`` from the full-text index, or None"""
+        row = self._connect().execute(
+            f"SELECT {', '.join(f'report_text.{field}' for field in TEXT_FIELDS)} "
+            'FROM reports JOIN report_text ON report_text.rowid = reports.rowid '
+            'WHERE reports.report_id = ?', (report_id,)).fetchone()
+        return dict(row) if row else None
+
+    def add_image_hash(self, report_id: str, value: int):
+        """
+        Record the perceptual hash of a report's receipt photo.
+
+        Args:
+            report_id (str): Report ID.
+            value (int): 256-bit hash from ``image_hash.phash``.
+        """
+        from odoo.ML.preprocessing.image_hash import band_key, bands, to_hex
+
+        with self._connect() as connection:
+            connection.execute('DELETE FROM receipt_hash_bands WHERE report_id = ?', (report_id,))
+            connection.execute('INSERT OR REPLACE INTO receipt_hashes (report_id, hash) VALUES (?, ?)',
+                               (report_id, to_hex(value)))
+            connection.executemany(
+                'INSERT INTO receipt_hash_bands (band_key, report_id) VALUES (?, ?)',
+                [(band_key(band, band_value), report_id) for band, band_value in enumerate(bands(value))]
+            )
+
+    def similar_images(self, value: int, max_distance: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Find reports whose photo hash is within a Hamming distance of a hash.
+
+        Args:
+            value (int): 256-bit hash from ``image_hash.phash``.
+            max_distance (int): Largest distance, at most image_hash.MAX_DISTANCE.
+            limit (int): Most reports returned.
+
+        Returns:
+            List[Dict[str, Any]]: ``report_id`` and ``distance`` of the
+            matches, closest (then oldest) first.
+        """
+        from odoo.ML.preprocessing.image_hash import (
+            MAX_DISTANCE, band_key, band_probes, bands, hamming, probe_radius
+        )
+
+        max_distance = max(0, min(int(max_distance), MAX_DISTANCE))
+        radius = probe_radius(max_distance)
+        # The probes are integers computed here, so they are inlined rather
+        # than bound; hundreds of parameters would approach SQLite's limit
+        keys = [
+            str(band_key(band, probe))
+            for band, band_value in enumerate(bands(value))
+            for probe in band_probes(band_value, radius)
+        ]
+        cursor = self._connect().execute(
+            'SELECT rowid, report_id, hash FROM receipt_hashes WHERE report_id IN '
+            f"(SELECT report_id FROM receipt_hash_bands WHERE band_key IN ({', '.join(keys)}))")
+        cursor.row_factory = None
+        matches = []
+        for rowid, report_id, stored in cursor:
+            distance = hamming(value, int(stored, 16))
+            if distance <= max_distance:
+                matches.append((distance, rowid, report_id))
+        matches.sort()
+        return [{'report_id': report_id, 'distance': distance} for distance, _, report_id in matches[:limit]]
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """Get one indexed report, or None"""
+        row = self._connect().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+        return dict(row) if row else None
+
+    def remove(self, report_id: str):
+        """Drop a report from the index"""
+        with self._connect() as connection:
+            connection.execute(
+                'DELETE FROM report_text WHERE rowid = (SELECT rowid FROM reports WHERE report_id = ?)',
+                (report_id,))
+            connection.execute('DELETE FROM reports WHERE report_id = ?', (report_id,))
+            connection.execute('DELETE FROM receipt_hashes WHERE report_id = ?', (report_id,))
+            connection.execute('DELETE FROM receipt_hash_bands WHERE report_id = ?', (report_id,))
+            self._bump_version(connection)
+
+    def count(self) -> int:
+        """Number of indexed reports"""
+        return self._connect().execute('SELECT COUNT(*) FROM reports').fetchone()[0]
+
+    def list(self, limit: int = 50, cursor: Optional[str] = None, sort: str = 'uploaded_at',
+             descending: bool = True, date_from: Optional[str] = None, date_to: Optional[str] = None,
+             category: Optional[str] = None, merchant: Optional[str] = None,
+             min_amount: Optional[float] = None, max_amount: Optional[float] = None) -> Dict[str, Any]:
+        """
+        List reports, one page at a time.
+
+        Args:
+            limit (int): Page size, at most MAX_PAGE_SIZE.
+            cursor (str): ``next_cursor`` of the previous page.
+            sort (str): One of SORT_KEYS. Reports without a value for it
+                        are not listed. Date filters need ``date`` and
+                        amount filters ``amount`` (RANGE_FILTER_SORTS).
+            descending (bool): Newest / largest first.
+            date_from (str): Earliest receipt date (YYYY-MM-DD), inclusive.
+            date_to (str): Latest receipt date (YYYY-MM-DD), inclusive.
+            category (str): Exact category.
+            merchant (str): Merchant name, case-insensitive.
+            min_amount (float): Smallest amount, inclusive.
+            max_amount (float): Largest amount, inclusive.
+
+        Returns:
+            Dict[str, Any]: ``reports`` on this page and ``next_cursor``,
+            None on the last page.
+
+        Raises:
+            ValueError: Unknown sort key, a range filter on another column
+                        than the sort key, or malformed cursor.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+        ranges = {'date_from': date_from, 'date_to': date_to, 'min_amount': min_amount, 'max_amount': max_amount}
+        for name, value in ranges.items():
+            if value is not None and value != '' and RANGE_FILTER_SORTS[name] != sort:
+                raise ValueError(f"{name} needs sort={RANGE_FILTER_SORTS[name]}")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        # Reports without a value for the sort key cannot be paged by it
+        conditions, params = [f"{sort} IS NOT NULL"], []
+        if date_from:
+            conditions.append('date >= ?')
+            params.append(date_from)
+        if date_to:
+            conditions.append('date <= ?')
+            params.append(date_to)
+        if category:
+            conditions.append('category = ?')
+            params.append(category)
+        if merchant:
+            conditions.append('merchant_key = ?')
+            params.append(merchant.lower())
+        if min_amount is not None:
+            conditions.append('amount >= ?')
+            params.append(min_amount)
+        if max_amount is not None:
+            conditions.append('amount <= ?')
+            params.append(max_amount)
+        if cursor:
+            sort_value, last_id = decode_cursor(cursor)
+            operator = '<' if descending else '>'
+            # A row-value comparison lets SQLite seek the (sort, report_id) index
+            conditions.append(f"({sort}, report_id) {operator} (?, ?)")
+            params.extend([sort_value, last_id])
+
+        direction = 'DESC' if descending else 'ASC'
+        where = f"WHERE {' AND '.join(conditions)}"
+        rows = self._connect().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM reports {where} "
+            f"ORDER BY {sort} {direction}, report_id {direction} LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        reports = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = reports[-1]
+            next_cursor = encode_cursor(last[sort], last['report_id'])
+        return {'reports': reports, 'next_cursor': next_cursor}
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Find reports containing every word of a query, best matches first.
+
+        Args:
+            query (str): Words to find; a trailing ``*`` matches a prefix.
+            limit (int): Page size, at most MAX_PAGE_SIZE.
+            offset (int): Matches to skip, at most MAX_SEARCH_OFFSET.
+
+        Returns:
+            Dict[str, Any]: ``reports`` on this page, each with its ``rank``
+            and a ``snippet`` of the matching text, and ``next_offset``,
+            None on the last page.
+        """
+        match = fts_query(query)
+        if not match:
+            return {'reports': [], 'next_offset': None}
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        offset = max(0, min(int(offset), MAX_SEARCH_OFFSET))
+        rows = self._connect().execute(
+            f"SELECT {', '.join(f'reports.{column}' for column in COLUMNS)}, "
+            "bm25(report_text, 4.0, 2.0, 2.0, 1.0) AS rank, "
+            "snippet(report_text, -1, '[', ']', '...', 12) AS snippet "
+            "FROM report_text JOIN reports ON reports.rowid = report_text.rowid "
+            "WHERE report_text MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+            (match, limit + 1, offset)
+        ).fetchall()
+
+        reports = [dict(row) for row in rows[:limit]]
+        more = len(rows) > limit and offset + limit <= MAX_SEARCH_OFFSET
+        return {'reports': reports, 'next_offset': offset + limit if more else None}
+
+    def backfill(self, report_paths: Iterable[str]) -> int:
+        """
+        Index JSON reports whose record or text is not in the index yet.
+
+        Args:
+            report_paths (Iterable[str]): Paths of JSON reports, compressed
+                                          or not.
+
+        Returns:
+            int: Number of reports added or completed.
+        """
+        from odoo.ML.preprocessing.report_codec import read_report
+
+        added = 0
+        for path in report_paths:
+            report_id = os.path.basename(path).split('.', 1)[0]
+            if self.has_text(report_id):
+                continue
+            try:
+                report = read_report(path)
+            except (OSError, ValueError):
+                continue
+            existing = self.get(report_id)
+            record = existing or record_from_report(report, report_id)
+            self.add(record, text_from_report(report))
+            added += 1
+        return added
+
+
+def fts_query(query: str) -> str:
+    """
+    Turn user input into an FTS5 query that matches every word.
+
+    Each word is quoted, so punctuation such as ``INV-0042`` or ``#1234`` is
+    searched as text rather than parsed as query syntax.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return ' '.join(terms)
+
+
+def text_from_report(report: Dict[str, Any]) -> Dict[str, str]:
+    """Build the searchable text of a report from its report data"""
+    expense_data = report.get('expense_data') or {}
+    items = expense_data.get('items') or []
+    return {
+        'merchant': expense_data.get('merchant') or '',
+        'category': expense_data.get('category') or '',
+        'items': '\n'.join(str(item.get('description', '')) for item in items if isinstance(item, dict)),
+        'raw_text': report.get('raw_text') or ''
+    }
+
+
+def record_from_report(report: Dict[str, Any], report_id: Optional[str] = None,
+                       file_hash: Optional[str] = None) -> Dict[str, Any]:
+    """Build an index record from report data as written to the JSON report"""
+    expense_data = report.get('expense_data') or {}
+    amount = expense_data.get('amount')
+    try:
+        amount = float(amount) if amount is not None else None
+    except (TypeError, ValueError):
+        amount = None
+    return {
+        'report_id': report.get('report_id') or report_id,
+        'uploaded_at': report.get('uploaded_at') or '',
+        'merchant': expense_data.get('merchant'),
+        'date': expense_data.get('date'),
+        'amount': amount,
+        'currency': expense_data.get('currency'),
+        'category': expense_data.get('category'),
+        'status': report.get('status'),
+        'file_hash': file_hash,
+        'date_defaulted': int(bool(expense_data.get('date_defaulted')))
+    }
+
+
+def json_report_paths(directory: str) -> Iterable[str]:
+    """Paths of the JSON reports under a directory, compressed or not"""
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(('.json', '.json.gz', '.json.zst')) and not name.startswith('.'):
+                yield os.path.join(root, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the report index')
+    parser.add_argument('--db', default=os.path.join('reports', 'index.sqlite3'), help='Index database')
+    parser.add_argument('--backfill', metavar='DIR', help='Index the JSON reports under DIR')
+    args = parser.parse_args()
+
+    index = ReportIndex(args.db)
+    if args.backfill:
+        added = index.backfill(json_report_paths(args.backfill))
+        print(f"Indexed {added} reports from {args.backfill}")
+    print(f"{index.count()} reports in {args.db}")
+
+
+if __name__ == '__main__':
+    main()
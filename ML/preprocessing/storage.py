@@ -0,0 +1,289 @@
+"""
+Storage Module
+
+Stores uploads and reports by artifact type ("uploads", "json", "xlsx").
+Files are spread over hash-prefix shard directories
+(``<root>/<aa>/<bb>/<name>``), so no directory grows past a few thousand
+entries. Writes go to a temporary file in the target directory and are
+renamed into place, so readers never see a partial file. Files written
+before sharding are still found in their old flat directories.
+
+``LocalStorage`` keeps everything on the local filesystem. Another backend
+(e.g. an S3-compatible store) can replace it by implementing the ``Storage``
+methods. ``find`` must then return a local copy of the object.
+A ``RetentionCollector`` thread deletes artifacts older than their type's
+retention period, for the types given one (nothing is expired by default),
+and temporary files left behind by interrupted writes.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Temporary files older than this are leftovers of crashed writes
+STALE_TEMP_SECONDS = 3600
+
+
+class Storage:
+    """Interface of a storage backend; artifacts are addressed by type and file name"""
+
+    def path(self, kind: str, name: str) -> str:
+        """Location an artifact is (or would be) stored at"""
+        raise NotImplementedError
+
+    def writer(self, kind: str, name: str):
+        """Context manager yielding a local path to write; the artifact is published on exit"""
+        raise NotImplementedError
+
+    def find(self, kind: str, name: str) -> Optional[str]:
+        """Local path of an artifact, or None if it does not exist"""
+        raise NotImplementedError
+
+    def find_any(self, kind: str, names: List[str], legacy_names: Optional[List[str]] = None) -> Optional[str]:
+        """Local path of the first of several names of one artifact that exists, or None"""
+        for name in names:
+            path = self.find(kind, name)
+            if path is not None:
+                return path
+        return None
+
+    def delete(self, kind: str, name: str) -> bool:
+        """Delete an artifact; returns False if it did not exist"""
+        raise NotImplementedError
+
+    def remove(self, location: str) -> bool:
+        """Delete the artifact at a location returned by ``scan``; returns False if it was gone"""
+        raise NotImplementedError
+
+    def scan(self, kind: str) -> Iterator[Tuple[str, float]]:
+        """Yield the location and modification time of every stored artifact of a type"""
+        raise NotImplementedError
+
+
+class LocalStorage(Storage):
+    """
+    Hash-prefix sharded storage on the local filesystem.
+    """
+
+    def __init__(self, roots: Dict[str, str], legacy_dirs: Optional[Dict[str, List[str]]] = None):
+        """
+        Initialize the LocalStorage.
+
+        Args:
+            roots (Dict[str, str]): Root directory of each artifact type.
+            legacy_dirs (Dict[str, List[str]]): Flat directories other than
+                                                the root searched when an
+                                                artifact is not in its shard.
+                                                They are never cleaned.
+        """
+        self.roots = {kind: Path(root) for kind, root in roots.items()}
+        self.legacy_dirs = {kind: [Path(d) for d in dirs] for kind, dirs in (legacy_dirs or {}).items()}
+        self._created = set()
+        self._lock = threading.Lock()
+
+    def _shard_path(self, kind: str, name: str) -> Path:
+        # Every file of one report (e.g. id.json, id.json.gz) shares a shard
+        digest = hashlib.md5(name.split('.', 1)[0].encode('utf-8')).hexdigest()
+        return self.roots[kind] / digest[:2] / digest[2:4] / name
+
+    def path(self, kind: str, name: str) -> str:
+        """Sharded path of an artifact, whether or not it exists"""
+        return str(self._shard_path(kind, name))
+
+    def _ensure_dir(self, directory: Path):
+        # Each shard directory is created once per process, not stat'ed on every write
+        if directory in self._created:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._created.add(directory)
+
+    @contextmanager
+    def writer(self, kind: str, name: str):
+        """
+        Write an artifact atomically.
+
+        Yields:
+            str: Temporary path in the shard directory. It keeps the
+            artifact's extension for writers that check it. It is renamed
+            to the final path when the block exits without error, and
+            removed otherwise.
+        """
+        target = self._shard_path(kind, name)
+        self._ensure_dir(target.parent)
+        temp = target.parent / f".{target.stem}.{uuid.uuid4().hex[:8]}.tmp{target.suffix}"
+        try:
+            yield str(temp)
+            os.replace(temp, target)
+        finally:
+            if temp.exists():
+                temp.unlink()
+
+    def find(self, kind: str, name: str) -> Optional[str]:
+        """
+        Locate an artifact in its shard, then in the flat root and legacy directories.
+
+        Returns:
+            Optional[str]: Path of the artifact, or None if it does not exist.
+        """
+        target = self._shard_path(kind, name)
+        if target.exists():
+            return str(target)
+        for directory in [self.roots[kind]] + self.legacy_dirs.get(kind, []):
+            legacy = directory / name
+            if legacy.exists():
+                return str(legacy)
+        return None
+
+    def find_any(self, kind: str, names: List[str], legacy_names: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Locate the first of several names of one artifact (e.g. its encodings).
+
+        The names share a stem and so a shard, which is listed once. Only
+        when none is there are the flat root and legacy directories
+        searched, for ``legacy_names`` (all names by default).
+
+        Returns:
+            Optional[str]: Path of the artifact, or None if it does not exist.
+        """
+        shard = self._shard_path(kind, names[0]).parent
+        try:
+            present = set(os.listdir(shard))
+        except FileNotFoundError:
+            present = set()
+        for name in names:
+            if name in present:
+                return str(shard / name)
+        for name in (names if legacy_names is None else legacy_names):
+            for directory in [self.roots[kind]] + self.legacy_dirs.get(kind, []):
+                legacy = directory / name
+                if legacy.exists():
+                    return str(legacy)
+        return None
+
+    def delete(self, kind: str, name: str) -> bool:
+        """Delete an artifact from its shard or legacy directory"""
+        path = self.find(kind, name)
+        return path is not None and self.remove(path)
+
+    def remove(self, location: str) -> bool:
+        """Delete a file by path"""
+        try:
+            os.remove(location)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def scan(self, kind: str) -> Iterator[Tuple[str, float]]:
+        """Yield the path and modification time of every artifact of a type under its root"""
+        root = self.roots[kind]
+        if not root.is_dir():
+            return
+        for entry in os.scandir(root):
+            if entry.is_file(follow_symlinks=False):
+                # Flat file written before sharding
+                yield entry.path, entry.stat().st_mtime
+            elif entry.is_dir() and len(entry.name) == 2:
+                for shard in os.scandir(entry.path):
+                    if shard.is_dir() and len(shard.name) == 2:
+                        for item in os.scandir(shard.path):
+                            if item.is_file(follow_symlinks=False):
+                                yield item.path, item.stat().st_mtime
+
+
+class RetentionCollector:
+    """
+    Deletes stored artifacts once they are older than their type's retention period.
+
+    Runs in a daemon thread. When every worker process runs one, a lock file
+    lets only one of them collect at a time; the others skip that round.
+    """
+
+    def __init__(self, storage: Storage, retention_days: Dict[str, float], interval: float,
+                 lock_path: Optional[str] = None):
+        """
+        Initialize the RetentionCollector.
+
+        Args:
+            storage (Storage): Backend to clean.
+            retention_days (Dict[str, float]): Days to keep each artifact
+                                               type; 0 keeps it forever.
+            interval (float): Seconds between two collections.
+            lock_path (str): File locked during a collection, shared by
+                             the collectors of all processes.
+        """
+        self.storage = storage
+        self.retention_days = retention_days
+        self.interval = interval
+        self.lock_path = lock_path
+        self._stop = threading.Event()
+        self._thread = None
+
+    def collect(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Delete expired artifacts and leftover temporary files once.
+
+        Returns:
+            Dict[str, int]: Files deleted per artifact type.
+        """
+        now = now or time.time()
+        deleted = {}
+        for kind, days in self.retention_days.items():
+            count = 0
+            for path, mtime in self.storage.scan(kind):
+                is_temp = os.path.basename(path).startswith('.') and '.tmp' in path
+                expired = days > 0 and now - mtime > days * 86400
+                if (expired or (is_temp and now - mtime > STALE_TEMP_SECONDS)) and self.storage.remove(path):
+                    count += 1
+            deleted[kind] = count
+        return deleted
+
+    @contextmanager
+    def _exclusive(self):
+        # Yields whether this process holds the lock; without fcntl every process collects
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        if fcntl is None or not self.lock_path:
+            yield True
+            return
+        with open(self.lock_path, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self._exclusive() as acquired:
+                    if not acquired:
+                        continue
+                    deleted = self.collect()
+                logger.info("Retention collection finished", extra={'fields': {'deleted': deleted}})
+            except Exception:
+                logger.exception("Retention collection failed")
+
+    def start(self) -> threading.Thread:
+        """Run collections every ``interval`` seconds in a daemon thread"""
+        self._thread = threading.Thread(target=self._run, name='retention-gc', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Stop the collection thread"""
+        self._stop.set()
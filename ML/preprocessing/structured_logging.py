@@ -0,0 +1,171 @@
+"""
+Structured Logging Module
+
+JSON logging for the receipt processing service. Records are handed to a
+background thread through a queue, so request threads never block on
+stdout. Every record carries the correlation id of the request that produced
+it (the ``report_id``), and structured fields such as stage timings can be
+attached with ``extra={'fields': {...}}``.
+
+Verbose records can be sampled per request: with a sample rate of 0.1 all
+DEBUG and INFO records of roughly one request in ten are kept, while
+warnings and errors are always kept.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+_correlation_id = contextvars.ContextVar('correlation_id', default=None)
+_listener = None
+_queue_handler = None
+
+
+def set_correlation_id(correlation_id: Optional[str]):
+    """Tag all following log records of the current request with an id"""
+    _correlation_id.set(correlation_id)
+
+
+def get_correlation_id() -> Optional[str]:
+    """Get the correlation id of the current request, if any"""
+    return _correlation_id.get()
+
+
+class CorrelationFilter(logging.Filter):
+    """
+    Adds the correlation id to each record and samples verbose records.
+
+    Runs in the thread that logs, where the request context is available.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def _sampled(self, correlation_id: Optional[str]) -> bool:
+        if self.sample_rate >= 1.0:
+            return True
+        if correlation_id is None:
+            return random.random() < self.sample_rate
+        # Hash the id so that a request is either logged completely or not at all
+        return zlib.crc32(correlation_id.encode('utf-8')) % 10000 < self.sample_rate * 10000
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = _correlation_id.get()
+        return record.levelno >= logging.WARNING or self._sampled(record.correlation_id)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that keeps the exception text and structured fields separate"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'report_id': getattr(record, 'correlation_id', None),
+            'pid': record.process
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable single-line format for local development"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = (f"{datetime.fromtimestamp(record.created).strftime('%H:%M:%S')} "
+                f"{record.levelname:<7} [{getattr(record, 'correlation_id', None) or '-'}] "
+                f"{record.getMessage()}")
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+def _restart_after_fork():
+    """Give a forked worker its own queue and listener thread"""
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener.queue = log_queue
+    _listener._thread = None
+    _listener.start()
+
+
+def configure_logging(level: str = 'INFO', sample_rate: float = 1.0, fmt: str = 'json') -> QueueListener:
+    """
+    Route all logging through a queue to a background writer thread.
+
+    Args:
+        level (str): Minimum level that is logged.
+        sample_rate (float): Fraction of requests whose DEBUG and INFO
+                             records are kept.
+        fmt (str): ``json`` for structured output, ``text`` for a readable
+                   single-line format.
+
+    Returns:
+        QueueListener: The running listener that writes to stdout.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    _queue_handler = _NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(CorrelationFilter(sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _NonBlockingQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
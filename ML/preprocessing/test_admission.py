@@ -0,0 +1,81 @@
+"""
+Tests for admission control: image header parsing and the job budget.
+
+Usage:
+    python -m pytest ML/preprocessing/test_admission.py
+"""
+
+import struct
+import threading
+import time
+
+import pytest
+
+from odoo.ML.preprocessing.admission import (
+    AdmissionController, AdmissionRejected, estimate_job_bytes, read_image_size
+)
+
+
+def png_header(width, height):
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+
+
+def jpeg_header(width, height, sof=0xC0):
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    # A comment segment holding 0xFF bytes, which must be skipped by length
+    comment = b'\xff\xfe' + struct.pack('>H', 6) + b'\xff\xff\xff\xff'
+    sof_segment = bytes([0xFF, sof]) + struct.pack('>HBHHB', 11, 8, height, width, 1) + b'\x01\x11\x00'
+    return b'\xff\xd8' + app0 + comment + sof_segment + b'\xff\xda'
+
+
+@pytest.mark.parametrize('content, size', [
+    (png_header(1240, 1754), (1240, 1754)),
+    (jpeg_header(4032, 3024), (4032, 3024)),
+    (jpeg_header(640, 480, sof=0xC2), (640, 480)),  # Progressive
+    (jpeg_header(640, 480)[:34], None),  # Cut off inside the frame header
+    (b'%PDF-1.7\n', None),
+    (b'', None),
+], ids=['png', 'jpeg', 'progressive-jpeg', 'truncated-jpeg', 'pdf', 'empty'])
+def test_read_image_size(tmp_path, content, size):
+    path = tmp_path / 'image'
+    path.write_bytes(content)
+    assert read_image_size(str(path)) == size
+
+
+def test_estimate_job_bytes():
+    assert estimate_job_bytes((1000, 2000), 12.5, 1000, 99) == 25_001_000
+    assert estimate_job_bytes(None, 12.5, 1000, 99) == 99
+
+
+def test_jobs_beyond_the_budget_wait_then_time_out():
+    controller = AdmissionController(memory_budget=100, max_concurrent=4, max_queue=1, max_wait=0.05)
+    first = controller.acquire(60)
+    with pytest.raises(AdmissionRejected, match='Timed out') as rejected:
+        controller.acquire(60)
+    assert rejected.value.retry_after >= 1
+    controller.release(first)
+    assert controller.acquire(60) == 60
+    assert controller.stats()['rejected'] == 1
+
+
+def test_full_queue_rejects_at_once():
+    controller = AdmissionController(memory_budget=100, max_concurrent=1, max_queue=1, max_wait=5)
+    controller.acquire(10)
+    waiting = threading.Thread(target=lambda: controller.release(controller.acquire(10)))
+    waiting.start()
+    while controller.stats()['waiting'] == 0:
+        time.sleep(0.001)
+    with pytest.raises(AdmissionRejected, match='Too many'):
+        controller.acquire(10)
+    controller.release(10)
+    waiting.join()
+    assert controller.stats()['admitted'] == 2
+
+
+def test_oversized_job_runs_alone():
+    controller = AdmissionController(memory_budget=100, max_concurrent=4, max_queue=0, max_wait=0)
+    with controller.admit(500) as charged:
+        assert charged == 100
+        with pytest.raises(AdmissionRejected):
+            controller.acquire(1)
+    assert controller.stats()['running'] == 0
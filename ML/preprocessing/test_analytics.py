@@ -0,0 +1,100 @@
+"""
+Tests for the incrementally maintained spend analytics.
+
+Usage:
+    python -m pytest ML/preprocessing/test_analytics.py
+"""
+
+import pytest
+
+pytest.importorskip('pandas')
+
+from odoo.ML.preprocessing.analytics import SpendAnalytics
+from odoo.ML.preprocessing.report_index import ReportIndex
+
+
+def add(report_index, report_id, amount, date='2026-01-05', category='Meals', merchant='Coffee House',
+        currency='USD', date_defaulted=False):
+    report_index.add({'report_id': report_id, 'uploaded_at': report_id, 'merchant': merchant, 'date': date,
+                      'amount': amount, 'currency': currency, 'category': category,
+                      'date_defaulted': date_defaulted})
+
+
+@pytest.fixture
+def report_index(tmp_path):
+    index = ReportIndex(str(tmp_path / 'index.sqlite3'))
+    add(index, 'a', 10.0)
+    add(index, 'b', 30.0, category='Travel', merchant='Rail Co')
+    add(index, 'c', 20.0, date='2026-02-10')
+    return index
+
+
+def totals(result, key='category'):
+    return {group[key]: (group['count'], group['total']) for group in result['groups']}
+
+
+def test_summary_groups_by_key_and_currency(report_index):
+    add(report_index, 'd', 7.0, currency='EUR')
+    result = SpendAnalytics(report_index).summary(group_by=['category'], percentiles=[50])
+    assert result['group_by'] == ['category', 'currency']
+    assert result['receipts'] == 4
+    assert [(g['category'], g['currency'], g['count'], g['total'], g['p50']) for g in result['groups']] == [
+        ('Meals', 'EUR', 1, 7.0, 7.0),
+        ('Meals', 'USD', 2, 30.0, 15.0),
+        ('Travel', 'USD', 1, 30.0, 30.0),
+    ]
+
+
+def test_filters_and_periods(report_index):
+    analytics = SpendAnalytics(report_index)
+    by_month = analytics.summary(group_by=['month'])
+    assert totals(by_month, 'month') == {'2026-01': (2, 40.0), '2026-02': (1, 20.0)}
+    assert analytics.summary(merchant='coffee')['receipts'] == 2
+    assert analytics.summary(date_from='2026-02-01')['receipts'] == 1
+    with pytest.raises(ValueError):
+        analytics.summary(group_by=['colour'])
+
+
+def test_defaulted_dates_are_undated(report_index):
+    # No date was read, so the index holds the day the receipt was processed
+    add(report_index, 'd', 5.0, date='2026-02-11', date_defaulted=True)
+    analytics = SpendAnalytics(report_index)
+    assert totals(analytics.summary(group_by=['month']), 'month') == {
+        '2026-01': (2, 40.0), '2026-02': (1, 20.0), 'undated': (1, 5.0)}
+    assert totals(analytics.summary(group_by=['week']), 'week')['undated'] == (1, 5.0)
+    assert analytics.summary(date_from='2026-02-01')['receipts'] == 1
+    assert analytics.summary()['receipts'] == 4
+
+
+def test_refresh_appends_new_reports_only(report_index, monkeypatch):
+    analytics = SpendAnalytics(report_index)
+    assert analytics.refresh()
+    assert not analytics.refresh()
+
+    reads = []
+    rows_after = report_index.rows_after
+
+    def counted(rowid, columns):
+        reads.append(rowid)
+        return rows_after(rowid, columns)
+
+    monkeypatch.setattr(report_index, 'rows_after', counted)
+    add(report_index, 'd', 5.0)
+    assert analytics.refresh()
+    # Only the rows after the last one read, not a reload from 0
+    assert reads == [3]
+    assert totals(analytics.summary())['Meals'] == (3, 35.0)
+
+
+def test_updates_reload_and_drop_cached_results(report_index):
+    analytics = SpendAnalytics(report_index)
+    assert analytics.summary()['cached'] is False
+    assert analytics.summary()['cached'] is True
+
+    # An update changes the version without adding rows, so everything is reloaded
+    add(report_index, 'a', 100.0)
+    result = analytics.summary()
+    assert result['cached'] is False
+    assert totals(result)['Meals'] == (2, 120.0)
+    report_index.remove('b')
+    assert 'Travel' not in totals(analytics.summary())
@@ -0,0 +1,67 @@
+"""
+Tests for archival transcoding and the thumbnail endpoint.
+
+Usage:
+    python -m pytest ML/preprocessing/test_archival.py
+"""
+
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+np = pytest.importorskip('numpy')
+
+from odoo.ML.preprocessing.storage import LocalStorage
+
+
+@pytest.fixture
+def storage(tmp_path, service, monkeypatch):
+    local = LocalStorage({kind: str(tmp_path / kind) for kind in ['uploads', 'archive', 'thumbnails']})
+    monkeypatch.setattr(service, 'storage', local)
+    monkeypatch.setitem(service.app.config, 'ARCHIVE_FORMAT', 'jpeg')
+    monkeypatch.setitem(service.app.config, 'ARCHIVE_UPLOADS', False)
+    return local
+
+
+@pytest.fixture
+def upload(tmp_path):
+    image = np.full((1600, 1200, 3), 235, np.uint8)
+    cv2.putText(image, 'TOTAL 12.00', (100, 800), cv2.FONT_HERSHEY_SIMPLEX, 4, (20, 20, 20), 8)
+    path = tmp_path / 'receipt.jpg'
+    cv2.imwrite(str(path), image)
+    return str(path)
+
+
+def test_thumbnail_is_written_and_served(service, storage, upload):
+    service.run_archival(upload, 'r1')
+
+    thumbnail_path = storage.find('thumbnails', 'r1.jpg')
+    assert thumbnail_path is not None
+    assert storage.find('archive', 'r1.jpg') is not None
+    thumbnail = cv2.imread(thumbnail_path, cv2.IMREAD_UNCHANGED)
+    assert max(thumbnail.shape) == service.app.config['THUMBNAIL_MAX_SIDE']
+    assert thumbnail.ndim == 2
+
+    client = service.app.test_client()
+    response = client.get('/api/receipt/r1/thumbnail')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    with open(thumbnail_path, 'rb') as f:
+        assert response.data == f.read()
+    assert response.cache_control.public and response.cache_control.immutable
+    # Browsers revalidate with the ETag instead of downloading it again
+    revalidated = client.get('/api/receipt/r1/thumbnail', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_missing_thumbnail_is_not_found(service, storage):
+    response = service.app.test_client().get('/api/receipt/unknown/thumbnail')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Thumbnail not found'}
+
+
+def test_pdf_uploads_are_not_archived(service, storage, tmp_path):
+    pdf = tmp_path / 'receipt.pdf'
+    pdf.write_bytes(b'%PDF-1.7\n')
+    service.run_archival(str(pdf), 'r2')
+    assert storage.find('thumbnails', 'r2.jpg') is None
+    assert service.app.test_client().get('/api/receipt/r2/thumbnail').status_code == 404
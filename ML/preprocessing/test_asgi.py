@@ -0,0 +1,96 @@
+"""
+Tests for the ASGI upload endpoint's body size limit.
+
+Usage:
+    python -m pytest ML/preprocessing/test_asgi.py
+"""
+
+import json
+
+import pytest
+
+for dependency in ['starlette', 'a2wsgi', 'multipart']:
+    pytest.importorskip(dependency)
+
+import anyio
+
+BOUNDARY = 'receipt-boundary'
+LIMIT = 64 * 1024
+CHUNK_SIZE = 16 * 1024
+
+
+@pytest.fixture
+def asgi(service, monkeypatch):
+    from odoo.ML.preprocessing import asgi
+
+    monkeypatch.setitem(service.app.config, 'MAX_CONTENT_LENGTH', LIMIT)
+    return asgi
+
+
+def multipart_chunks(filename, size):
+    yield (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+           'Content-Type: application/octet-stream\r\n\r\n').encode()
+    for _ in range(size // CHUNK_SIZE):
+        yield b'\xff' * CHUNK_SIZE
+    yield f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def post_upload(asgi, chunks, content_length=None):
+    """
+    Send an upload to the ASGI app one chunk per message, as a server does.
+
+    Returns the status, the JSON body and the bytes the app received.
+    """
+    chunks = list(chunks)
+    headers = [(b'content-type', f'multipart/form-data; boundary={BOUNDARY}'.encode())]
+    if content_length is not None:
+        headers.append((b'content-length', str(content_length).encode()))
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': '/api/upload', 'raw_path': b'/api/upload', 'root_path': '',
+        'query_string': b'', 'headers': headers, 'client': ('127.0.0.1', 1), 'server': ('test', 80),
+        'app': asgi.application,
+    }
+    received, messages = [0], []
+
+    async def receive():
+        if not chunks:
+            return {'type': 'http.disconnect'}
+        chunk = chunks.pop(0)
+        received[0] += len(chunk)
+        return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunks)}
+
+    async def send(message):
+        messages.append(message)
+
+    anyio.run(asgi.application, scope, receive, send)
+    status = next(m['status'] for m in messages if m['type'] == 'http.response.start')
+    body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+    return status, json.loads(body), received[0]
+
+
+def uploads(service):
+    return [path for path, _ in service.storage.scan('uploads')]
+
+
+def test_chunked_upload_past_the_limit_is_cut_off(asgi, service):
+    before = uploads(service)
+    status, body, received = post_upload(asgi, multipart_chunks('receipt.jpg', 64 * LIMIT))
+    assert status == 413
+    assert body == {'error': 'File too large'}
+    # Reading stopped at the limit instead of spooling the whole body
+    assert received <= LIMIT + CHUNK_SIZE
+    assert uploads(service) == before
+
+
+def test_chunked_upload_within_the_limit_is_parsed(asgi):
+    status, body, _ = post_upload(asgi, multipart_chunks('receipt.txt', LIMIT // 2))
+    assert status == 400
+    assert body == {'error': 'Unsupported file type'}
+
+
+def test_declared_length_past_the_limit_is_rejected_unread(asgi):
+    status, body, received = post_upload(asgi, multipart_chunks('receipt.jpg', 2 * LIMIT),
+                                         content_length=2 * LIMIT + 200)
+    assert status == 413
+    assert received == 0
@@ -0,0 +1,61 @@
+"""
+Tests for the text benchmark's regression gate.
+
+Usage:
+    python -m pytest ML/preprocessing/test_benchmark_text.py
+"""
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def timings():
+    """What the benchmark run measures; tests change it between runs"""
+    return {'typical.extract_date': {'calls': 1, 'best_seconds': 1.0, 'per_call_us': 1.0}}
+
+
+@pytest.fixture
+def benchmark(service, monkeypatch, timings):
+    from odoo.ML.preprocessing import benchmark_text
+
+    monkeypatch.setattr(benchmark_text, 'build_corpus', lambda size, seed: {})
+    monkeypatch.setattr(benchmark_text, 'run_benchmarks', lambda corpus, repeat: json.loads(json.dumps(timings)))
+    return benchmark_text
+
+
+def exit_code(benchmark, *argv):
+    with pytest.raises(SystemExit) as exited:
+        benchmark.main(list(argv))
+    return exited.value.code
+
+
+def test_missing_baseline_fails_before_the_run(benchmark, tmp_path, monkeypatch, capsys):
+    def run_benchmarks(corpus, repeat):
+        raise AssertionError('benchmarks ran without a baseline')
+
+    monkeypatch.setattr(benchmark, 'run_benchmarks', run_benchmarks)
+    assert exit_code(benchmark, '--baseline', str(tmp_path / 'missing.json')) == 2
+    assert '--save-baseline' in capsys.readouterr().err
+
+
+def test_saved_baseline_gates_later_runs(benchmark, timings, tmp_path):
+    baseline = str(tmp_path / 'baseline.json')
+    benchmark.main(['--save-baseline', baseline])
+    benchmark.main(['--baseline', baseline])
+
+    timings['typical.extract_date']['best_seconds'] = 1.5
+    assert exit_code(benchmark, '--baseline', baseline, '--threshold', '0.25') == 1
+    benchmark.main(['--baseline', baseline, '--threshold', '0.6'])
+
+
+def test_stage_missing_from_the_baseline_fails(benchmark, timings, tmp_path):
+    baseline = str(tmp_path / 'baseline.json')
+    benchmark.main(['--save-baseline', baseline])
+    timings['typical.extract_items'] = dict(timings['typical.extract_date'])
+    assert exit_code(benchmark, '--baseline', baseline) == 2
+
+
+def test_no_baseline_only_prints(benchmark, tmp_path):
+    benchmark.main(['--no-baseline', '--baseline', str(tmp_path / 'missing.json')])
@@ -0,0 +1,101 @@
+"""
+Tests for the Parquet expense dataset writer.
+
+Usage:
+    python -m pytest ML/preprocessing/test_expense_dataset.py
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('pandas')
+
+from odoo.ML.preprocessing import expense_dataset
+from odoo.ML.preprocessing.expense_dataset import ExpenseDatasetWriter, expense_record, read_dataset
+
+
+def record(report_id, date):
+    return expense_record(report_id, 'upload', f"{report_id}.jpg", {
+        'merchant': 'Coffee House', 'date': date, 'amount': 4.5, 'currency': 'USD',
+        'category': 'Meals', 'items': [{'description': 'Coffee', 'quantity': 1, 'price': 4.5}]
+    })
+
+
+def partitions(root):
+    return sorted(name for name in os.listdir(root) if name.startswith('month='))
+
+
+def test_flush_writes_month_partitions(tmp_path):
+    writer = ExpenseDatasetWriter(str(tmp_path), batch_size=10, flush_interval=0)
+    writer.add(record('a', '2026-01-15'))
+    writer.add(record('b', '2026-02-03'))
+    assert writer.stats()['buffered'] == 2
+
+    assert writer.flush() == 2
+    assert partitions(tmp_path) == ['month=2026-01', 'month=2026-02']
+    frame = read_dataset(str(tmp_path))
+    assert sorted(frame['report_id']) == ['a', 'b']
+    assert writer.stats() == {'buffered': 0, 'written': 2, 'failed_writes': 0, 'spooled_batches': 0}
+
+
+def test_batch_size_triggers_a_write(tmp_path):
+    writer = ExpenseDatasetWriter(str(tmp_path), batch_size=2, flush_interval=0)
+    writer.add(record('a', '2026-01-15'))
+    writer.add(record('b', '2026-01-16'))
+    assert writer.stats()['written'] == 2
+
+
+def test_failed_batch_is_spooled_and_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(expense_dataset, 'RETRY_SECONDS', 3600)
+    writer = ExpenseDatasetWriter(str(tmp_path), batch_size=10, flush_interval=0)
+    write = writer._write
+
+    def fail(records):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(writer, '_write', fail)
+    writer.add(record('a', '2026-01-15'))
+    assert writer.flush() == 0
+    assert partitions(tmp_path) == []
+    assert writer.stats()['spooled_batches'] == 1
+    assert writer.stats()['failed_writes'] == 1
+
+    # Another writer (e.g. after a restart) picks the batch up with its own
+    monkeypatch.setattr(writer, '_write', write)
+    writer.add(record('b', '2026-01-16'))
+    assert writer.flush() == 2
+    assert writer.stats()['spooled_batches'] == 0
+    assert sorted(read_dataset(str(tmp_path))['report_id']) == ['a', 'b']
+
+
+def test_failed_multi_month_batch_publishes_nothing(tmp_path, monkeypatch):
+    import pyarrow.parquet as pq
+
+    monkeypatch.setattr(expense_dataset, 'RETRY_SECONDS', 3600)
+    write_table = pq.write_table
+    calls = []
+
+    def fail_second(table, path, **kwargs):
+        calls.append(path)
+        if len(calls) == 2:
+            raise OSError('No space left on device')
+        write_table(table, path, **kwargs)
+
+    monkeypatch.setattr(pq, 'write_table', fail_second)
+    writer = ExpenseDatasetWriter(str(tmp_path), batch_size=10, flush_interval=0)
+    writer.add(record('a', '2026-01-15'))
+    writer.add(record('b', '2026-02-03'))
+    assert writer.flush() == 0
+    for partition in partitions(tmp_path):
+        assert os.listdir(tmp_path / partition) == []
+
+    monkeypatch.setattr(pq, 'write_table', write_table)
+    assert writer.flush() == 2
+    assert sorted(read_dataset(str(tmp_path))['report_id']) == ['a', 'b']
+
+
+def test_available_does_not_import_pyarrow(monkeypatch):
+    monkeypatch.setattr(expense_dataset.importlib.util, 'find_spec', lambda name: None)
+    assert expense_dataset.available() is False
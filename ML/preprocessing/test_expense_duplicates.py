@@ -0,0 +1,128 @@
+"""
+Tests for field-level duplicate expense detection.
+
+Usage:
+    python -m pytest ML/preprocessing/test_expense_duplicates.py
+"""
+
+import threading
+
+import pytest
+
+from odoo.ML.preprocessing.expense_duplicates import ExpenseDuplicateIndex, normalize_merchant
+from odoo.ML.preprocessing.report_index import ReportIndex
+
+
+def expense(merchant='Coffee House', date='2026-01-02', amount=12.30, currency='USD', **fields):
+    return dict(merchant=merchant, date=date, amount=amount, currency=currency, **fields)
+
+
+def indexed(report_index, report_id, data):
+    report_index.add({'report_id': report_id, 'uploaded_at': report_id, **data,
+                      'date_defaulted': int(bool(data.get('date_defaulted')))})
+
+
+@pytest.fixture
+def report_index(tmp_path):
+    return ReportIndex(str(tmp_path / 'index.sqlite3'))
+
+
+@pytest.mark.parametrize('name, key', [
+    ('The Coffee-House Ltd.', 'coffeehouse'),
+    ('COFFEE HOUSE', 'coffeehouse'),
+    ('Café  Nord GmbH', 'cafenord'),
+    ('Unknown Merchant', None),
+    ('', None),
+    (None, None),
+])
+def test_normalize_merchant(name, key):
+    assert normalize_merchant(name) == key
+
+
+def test_matches_within_tolerance_only():
+    index = ExpenseDuplicateIndex(tolerance=0.01)
+    assert index.add('a', expense())
+    assert index.find(expense(merchant='COFFEE HOUSE LTD', amount=12.31, currency='usd')) == [
+        {'report_id': 'a', 'amount': 12.3, 'difference': 0.01}]
+    assert index.find(expense(amount=12.32)) == []
+    assert index.find(expense(date='2026-01-03')) == []
+    assert index.find(expense(currency='EUR')) == []
+    assert index.find(expense(), exclude='a') == []
+
+
+def test_tolerance_spans_neighbouring_buckets():
+    index = ExpenseDuplicateIndex(tolerance=0.5)
+    index.add('a', expense(amount=10.49))
+    assert [m['report_id'] for m in index.find(expense(amount=10.51))] == ['a']
+    assert [m['report_id'] for m in index.find(expense(amount=9.99))] == ['a']
+    assert index.find(expense(amount=11.0)) == []
+
+
+def test_unmatchable_expenses_are_skipped():
+    index = ExpenseDuplicateIndex()
+    assert not index.add('a', expense(date_defaulted=True))
+    assert not index.add('b', expense(merchant='Unknown Merchant'))
+    assert not index.add('c', expense(amount=0))
+    assert len(index) == 0
+    index.add('d', expense())
+    # A defaulted date is the processing day, so it never matches either way
+    assert index.find(expense(date_defaulted=True)) == []
+
+
+def test_replacing_and_discarding_an_expense():
+    index = ExpenseDuplicateIndex()
+    index.add('a', expense())
+    index.add('a', expense(amount=20))
+    assert index.find(expense()) == []
+    assert [m['report_id'] for m in index.find(expense(amount=20))] == ['a']
+    index.discard('a')
+    assert index.find(expense(amount=20)) == [] and len(index) == 0
+
+
+def test_refresh_follows_the_report_index(report_index):
+    index = ExpenseDuplicateIndex(report_index)
+    indexed(report_index, 'a', expense())
+    indexed(report_index, 'b', expense(date_defaulted=True))
+    assert [m['report_id'] for m in index.check(expense())] == ['a']
+
+    indexed(report_index, 'c', expense(amount=12.305))
+    assert [m['report_id'] for m in index.check(expense())] == ['a', 'c']
+
+    report_index.remove('a')
+    assert [m['report_id'] for m in index.check(expense())] == ['c']
+
+
+def test_check_and_add_sees_concurrent_uploads(report_index):
+    index = ExpenseDuplicateIndex(report_index)
+    barrier = threading.Barrier(8)
+    results = {}
+
+    def upload(n):
+        barrier.wait()
+        results[n] = index.check_and_add(f'r{n}', expense())
+
+    threads = [threading.Thread(target=upload, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Exactly one upload came first; every other one saw all before it
+    assert sorted(len(matches) for matches in results.values()) == list(range(8))
+
+
+def test_pending_expenses_survive_a_reload(report_index):
+    index = ExpenseDuplicateIndex(report_index)
+    indexed(report_index, 'a', expense(amount=50))
+    assert index.check_and_add('new', expense()) == []
+    # A removal forces a full reload before the new report reaches the index
+    report_index.remove('a')
+    assert [m['report_id'] for m in index.check(expense())] == ['new']
+    indexed(report_index, 'new', expense())
+    assert [m['report_id'] for m in index.check(expense(), exclude='x')] == ['new']
+
+
+def test_extracted_expense_records_a_defaulted_date(service):
+    undated = service.extract_expense_data('ACME HARDWARE\nHammer 12.50\nTotal 12.50')
+    assert undated['date_defaulted'] is True
+    dated = service.extract_expense_data('ACME HARDWARE\nDate: 03/02/2026\nHammer 12.50\nTotal 12.50')
+    assert dated['date_defaulted'] is False and dated['date'] == '2026-02-03'
@@ -0,0 +1,80 @@
+"""
+Tests for perceptual image hashes and their multi-index lookup helpers.
+
+Usage:
+    python -m pytest ML/preprocessing/test_image_hash.py
+"""
+
+import random
+from itertools import combinations
+from math import comb
+from pathlib import Path
+
+import pytest
+
+from odoo.ML.preprocessing.image_hash import (
+    BAND_BITS, BANDS, DEFAULT_MAX_DISTANCE, HASH_BITS, MAX_DISTANCE, band_probes, bands, hamming, probe_radius
+)
+
+RECEIPTS = sorted((Path(__file__).resolve().parents[2] / 'realistic_test_receipts').glob('*.jpg'))
+
+
+def test_bands_split_the_hash_most_significant_first():
+    value = sum(band << (BAND_BITS * (BANDS - 1 - band)) for band in range(BANDS))
+    assert bands(value) == list(range(BANDS))
+
+
+@pytest.mark.parametrize('radius', [0, 1, 2])
+def test_band_probes_are_every_value_within_the_radius(radius):
+    probes = band_probes(0x1234, radius)
+    assert len(probes) == len(set(probes)) == sum(comb(BAND_BITS, k) for k in range(radius + 1))
+    assert all(hamming(probe, 0x1234) <= radius for probe in probes)
+
+
+def test_probe_radius_finds_every_hash_within_the_distance():
+    rng = random.Random(7)
+    for max_distance in range(MAX_DISTANCE + 1):
+        radius = probe_radius(max_distance)
+        for _ in range(50):
+            value = rng.getrandbits(HASH_BITS)
+            other = value
+            for bit in rng.sample(range(HASH_BITS), max_distance):
+                other ^= 1 << bit
+            # Pigeonhole: some band differs by at most the radius, so one probe hits
+            assert any(hamming(a, b) <= radius for a, b in zip(bands(value), bands(other)))
+    assert BANDS * (probe_radius(MAX_DISTANCE) + 1) > MAX_DISTANCE
+
+
+@pytest.fixture(scope='module')
+def receipts():
+    cv2 = pytest.importorskip('cv2')
+    assert len(RECEIPTS) >= 20
+    return {path.name: cv2.imread(str(path)) for path in RECEIPTS}
+
+
+def test_distinct_real_receipts_stay_above_the_threshold(receipts):
+    from odoo.ML.preprocessing.image_hash import phash
+
+    # The bundled receipts share one template, the hard case for a coarse hash
+    hashes = {name: phash(image) for name, image in receipts.items()}
+    for (name, value), (other_name, other) in combinations(hashes.items(), 2):
+        assert hamming(value, other) > DEFAULT_MAX_DISTANCE, (name, other_name)
+
+
+def test_photos_of_one_real_receipt_stay_within_the_threshold(receipts):
+    cv2 = pytest.importorskip('cv2')
+    from odoo.ML.preprocessing.image_hash import phash
+
+    for name, image in receipts.items():
+        height, width = image.shape[:2]
+        recompressed = cv2.imdecode(cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 40])[1], 1)
+        photos = [
+            cv2.resize(image, (width * 2 // 3, height * 2 // 3), interpolation=cv2.INTER_AREA),
+            recompressed,
+            cv2.convertScaleAbs(image, alpha=0.85, beta=20),
+            # On a darker table
+            cv2.copyMakeBorder(image, 40, 40, 40, 40, cv2.BORDER_CONSTANT, value=(120, 120, 120)),
+        ]
+        for photo in photos:
+            assert hamming(phash(image), phash(photo)) <= DEFAULT_MAX_DISTANCE, name
+        assert phash(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)) == phash(image)
@@ -0,0 +1,79 @@
+"""
+Import-time budget for the service modules.
+
+Importing the app must not load the OCR, reporting or correction stacks
+(torch, OpenCV, pandas, TextBlob) nor touch the network; those are loaded at
+first use. The import is timed in a fresh interpreter and must stay within
+IMPORT_TIME_BUDGET seconds (default 1.0).
+
+Usage:
+    python -m pytest ML/preprocessing/test_import_time.py
+"""
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BUDGET_SECONDS = float(os.environ.get('IMPORT_TIME_BUDGET', 1.0))
+HEAVY_MODULES = ['easyocr', 'torch', 'cv2', 'numpy', 'pandas', 'textblob', 'PIL', 'requests']
+MODULES = ['odoo.ML.preprocessing.app', 'odoo.ML.preprocessing.ocr_engine',
+           'odoo.ML.preprocessing.report_generator']
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _import_in_fresh_interpreter(module: str, cwd: Path) -> dict:
+    env = dict(os.environ, PYTHONPATH=str(_package_parent(cwd)))
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=cwd, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _package_parent(cwd: Path) -> Path:
+    """Directory holding an ``odoo`` package: the checkout's parent, or a symlink next to ``cwd``"""
+    if REPO_ROOT.name == 'odoo':
+        return REPO_ROOT.parent
+    parent = cwd.parent / 'site'
+    if not (parent / 'odoo').exists():
+        parent.mkdir(exist_ok=True)
+        try:
+            (parent / 'odoo').symlink_to(REPO_ROOT, target_is_directory=True)
+        except OSError:
+            pytest.skip('the repository is not checked out as odoo and cannot be symlinked')
+    return parent
+
+
+@pytest.fixture(autouse=True)
+def _requires_service_environment():
+    for dependency in ['flask', 'flask_cors', 'prometheus_client']:
+        if importlib.util.find_spec(dependency) is None:
+            pytest.skip(f'{dependency} is not installed')
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import_does_not_load_heavy_dependencies(module, tmp_path):
+    result = _import_in_fresh_interpreter(module, tmp_path)
+    assert result['loaded'] == [], f"{module} imported {result['loaded']} at import time"
+
+
+def test_app_import_within_budget(tmp_path):
+    # Warm the bytecode and filesystem caches, then measure
+    _import_in_fresh_interpreter(MODULES[0], tmp_path)
+    result = _import_in_fresh_interpreter(MODULES[0], tmp_path)
+    assert result['seconds'] <= BUDGET_SECONDS, (
+        f"importing the app took {result['seconds']:.2f}s, budget is {BUDGET_SECONDS:.2f}s")
@@ -0,0 +1,125 @@
+"""
+Tests for progressive OCR: which image each pass reads and what is reused.
+
+Usage:
+    python -m pytest ML/preprocessing/test_ocr_tiers.py
+"""
+
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+np = pytest.importorskip('numpy')
+
+RECEIPT_TEXT = 'ACME CAFE\nDate: 03/02/2026\nCoffee 4.50\nTotal 4.50'
+
+
+@pytest.fixture
+def receipt(tmp_path, service, monkeypatch):
+    monkeypatch.setitem(service.app.config, 'OCR_AUTO_ORIENT', False)
+    monkeypatch.setitem(service.app.config, 'DUPLICATE_DETECTION', False)
+    monkeypatch.setitem(service.app.config, 'OCR_PROGRESSIVE', True)
+    image = np.full((1600, 1200, 3), 230, np.uint8)
+    cv2.putText(image, 'TOTAL 4.50', (100, 800), cv2.FONT_HERSHEY_SIMPLEX, 4, (20, 20, 20), 8)
+    path = tmp_path / 'receipt.png'
+    cv2.imwrite(str(path), image)
+    return str(path)
+
+
+def fake_ocr(service, monkeypatch, results):
+    images = []
+
+    def run_ocr(image):
+        images.append(image)
+        return results[len(images) - 1]
+
+    monkeypatch.setattr(service, 'run_ocr', run_ocr)
+    return images
+
+
+def test_both_tiers_read_the_preprocessed_image(service, receipt, monkeypatch):
+    images = fake_ocr(service, monkeypatch, [('blurred', 0.1), (RECEIPT_TEXT, 0.9)])
+
+    text, details = service.extract_text_with_details(receipt)
+
+    assert text == RECEIPT_TEXT
+    assert details['tier'] == 'full_res'
+    assert details['escalation_reason'] == 'low_confidence'
+    assert details['parsed'] is None
+    low_res, full_res = images
+    for image in images:
+        # Grayscale and binarized, whatever the scale
+        assert image.ndim == 2
+        assert set(np.unique(image)) <= {0, 255}
+    assert max(low_res.shape) == service.app.config['OCR_LOW_RES_MAX_SIDE']
+    assert full_res.shape == (1600, 1200)
+
+
+def test_accepted_low_res_fields_are_not_parsed_again(service, receipt, monkeypatch):
+    fake_ocr(service, monkeypatch, [(RECEIPT_TEXT, 0.9)])
+    calls = []
+    extract_total_amount = service.extract_total_amount
+
+    def counted(text):
+        calls.append(text)
+        return extract_total_amount(text)
+
+    monkeypatch.setattr(service, 'extract_total_amount', counted)
+
+    text, details = service.extract_text_with_details(receipt)
+    assert details['tier'] == 'low_res'
+    assert details['parsed']['total_amount'] == 4.5
+    expense_data = service.extract_expense_data(text, details.pop('parsed'))
+
+    assert len(calls) == 1
+    assert expense_data['amount'] == 4.5
+    assert expense_data['items'] == service.extract_expense_data(text)['items']
+
+
+@pytest.fixture
+def earlier_receipt(tmp_path, service, receipt, monkeypatch):
+    """An indexed report of the same photo, whose text is reused when confirmed"""
+    from odoo.ML.preprocessing.image_hash import phash
+    from odoo.ML.preprocessing.report_index import ReportIndex
+
+    monkeypatch.setitem(service.app.config, 'DUPLICATE_DETECTION', True)
+    monkeypatch.setitem(service.app.config, 'DUPLICATE_REUSE_OCR', True)
+    index = ReportIndex(str(tmp_path / 'index.sqlite3'))
+    monkeypatch.setattr(service, 'report_index', index)
+    index.add({'report_id': 'earlier', 'uploaded_at': '2026-03-01T00:00:00', 'date': '2026-02-03',
+               'amount': 4.5, 'file_hash': 'another file'}, {'raw_text': 'EARLIER TEXT'})
+    index.add_image_hash('earlier', phash(cv2.imread(receipt)))
+    return index
+
+
+def test_duplicate_text_is_reused_once_the_low_res_pass_confirms_it(service, receipt, earlier_receipt, monkeypatch):
+    images = fake_ocr(service, monkeypatch, [(RECEIPT_TEXT, 0.9)])
+
+    text, details = service.extract_text_with_details(receipt)
+
+    assert text == 'EARLIER TEXT'
+    assert details['tier'] == 'reused' and details['reused_from'] == 'earlier'
+    assert len(images) == 1
+
+
+def test_similar_receipt_with_other_fields_is_read_anew(service, receipt, earlier_receipt, monkeypatch):
+    other = RECEIPT_TEXT.replace('4.50', '7.20')
+    fake_ocr(service, monkeypatch, [(other, 0.9)])
+
+    text, details = service.extract_text_with_details(receipt)
+
+    assert details['duplicates'][0]['report_id'] == 'earlier'
+    assert text == other
+    assert details['tier'] == 'low_res'
+
+
+def test_same_file_is_reused_without_ocr(service, receipt, earlier_receipt, monkeypatch):
+    from odoo.ML.preprocessing.report_index import file_sha256
+
+    earlier_receipt.add({'report_id': 'earlier', 'uploaded_at': '2026-03-01T00:00:00',
+                         'file_hash': file_sha256(receipt)}, {'raw_text': 'EARLIER TEXT'})
+    images = fake_ocr(service, monkeypatch, [])
+
+    text, details = service.extract_text_with_details(receipt)
+
+    assert text == 'EARLIER TEXT' and details['tier'] == 'reused'
+    assert images == []
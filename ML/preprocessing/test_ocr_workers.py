@@ -0,0 +1,117 @@
+"""
+Tests for the OCR worker processes: shared-memory hand-over and recovery
+from dead workers.
+
+The workers run stand-ins for the EasyOCR reader, so no model is loaded.
+
+Usage:
+    python -m pytest ML/preprocessing/test_ocr_workers.py
+"""
+
+import os
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from odoo.ML.preprocessing import ocr_workers
+from odoo.ML.preprocessing.ocr_workers import OcrProcessPool
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _init_stub(languages, torch_threads):
+    pass
+
+
+def _sum_job(name, shape, dtype, kwargs):
+    """Add up the shared image, or fail or die as the test asks"""
+    if kwargs.get('fail'):
+        raise ValueError('unreadable')
+    marker = kwargs.get('die_once')
+    if kwargs.get('die') or (marker and not os.path.exists(marker)):
+        if marker:
+            open(marker, 'w').close()
+        # As when the kernel kills a worker for memory
+        os._exit(1)
+    segment = ocr_workers._attach(name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+        total = int(image.sum())
+        del image
+    finally:
+        segment.close()
+    return str(total), 1.0
+
+
+class StubPool(OcrProcessPool):
+    initializer = staticmethod(_init_stub)
+    job = staticmethod(_sum_job)
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    # Spawned workers import the code by name, so ``odoo`` must be on their path
+    if REPO_ROOT.name == 'odoo':
+        monkeypatch.syspath_prepend(str(REPO_ROOT.parent))
+    else:
+        try:
+            (tmp_path / 'odoo').symlink_to(REPO_ROOT, target_is_directory=True)
+        except OSError:
+            pytest.skip('the repository is not checked out as odoo and cannot be symlinked')
+        monkeypatch.syspath_prepend(str(tmp_path))
+    segments = []
+
+    class RecordedSharedMemory(shared_memory.SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            segments.append(self.name)
+
+    monkeypatch.setattr(ocr_workers.shared_memory, 'SharedMemory', RecordedSharedMemory)
+    stub = StubPool(1)
+    stub.segments = segments
+    yield stub
+    stub.shutdown()
+
+
+def assert_unlinked(name):
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+IMAGE = np.arange(12, dtype=np.uint8).reshape(3, 4)
+
+
+def test_segment_is_unlinked_after_a_job(pool):
+    assert pool.run(IMAGE) == ('66', 1.0)
+    assert len(pool.segments) == 1
+    assert_unlinked(pool.segments[0])
+    assert pool.stats()['busy'] == 0
+
+
+def test_segment_is_unlinked_after_a_failed_job(pool):
+    with pytest.raises(ValueError, match='unreadable'):
+        pool.run(IMAGE, fail=True)
+    assert_unlinked(pool.segments[0])
+    assert pool.stats()['busy'] == 0
+
+
+def test_job_is_retried_once_on_a_fresh_executor_after_a_worker_dies(pool, tmp_path):
+    assert pool.run(IMAGE) == ('66', 1.0)
+    first = pool._executor
+
+    assert pool.run(IMAGE, die_once=str(tmp_path / 'died')) == ('66', 1.0)
+    assert pool._executor is not first
+    assert_unlinked(pool.segments[-1])
+
+
+def test_pool_recovers_after_a_job_kills_every_worker(pool):
+    with pytest.raises(BrokenProcessPool):
+        pool.run(IMAGE, die=True)
+    assert_unlinked(pool.segments[-1])
+
+    assert pool.run(IMAGE) == ('66', 1.0)
+    assert pool.stats() == {'size': 1, 'loaded': 0, 'busy': 0, 'waiting': 0}
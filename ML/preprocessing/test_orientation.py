@@ -0,0 +1,63 @@
+"""
+Tests for orientation detection and correction on the bundled receipts.
+
+Usage:
+    python -m pytest ML/preprocessing/test_orientation.py
+"""
+
+from pathlib import Path
+
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+np = pytest.importorskip('numpy')
+
+from odoo.ML.preprocessing.ocr_engine import correct_orientation, detect_orientation
+
+RECEIPTS = sorted((Path(__file__).resolve().parents[2] / 'realistic_test_receipts').glob('*.jpg'))
+# Clockwise turn applied to the photo, and the turn that undoes it
+TURNS = {90: (cv2.ROTATE_90_CLOCKWISE, 270), 180: (cv2.ROTATE_180, 180),
+         270: (cv2.ROTATE_90_COUNTERCLOCKWISE, 90)}
+# Mostly digits and capitals: the upside-down cue cannot tell (see _is_upside_down)
+UNDECIDED = {'receipt_realistic_22.jpg'}
+
+
+@pytest.fixture(scope='module')
+def upright():
+    """Each receipt as the pipeline straightens it without a quarter turn"""
+    return {path.name: correct_orientation(cv2.imread(str(path))) for path in RECEIPTS}
+
+
+def cases():
+    for path in RECEIPTS:
+        for turn in TURNS:
+            marks = []
+            if path.name in UNDECIDED and turn in (90, 180):
+                marks = [pytest.mark.xfail(reason='upside-down cue too weak', strict=True)]
+            yield pytest.param(path.name, turn, marks=marks, id=f"{path.stem}-{turn}")
+
+
+def test_upright_receipts_are_not_turned(upright):
+    assert len(upright) >= 20
+    for name, (_, orientation) in upright.items():
+        assert orientation['rotation'] == 0, name
+        assert abs(orientation['skew']) <= 2, name
+
+
+@pytest.mark.parametrize('name, turn', list(cases()))
+def test_turned_receipts_are_turned_back(upright, name, turn):
+    rotate_code, expected = TURNS[turn]
+    image, orientation = upright[name]
+    # Turn the original photo, so the skew is found and undone again
+    photo = cv2.rotate(cv2.imread(str(RECEIPTS[0].with_name(name))), rotate_code)
+
+    corrected, turned = correct_orientation(photo)
+
+    assert turned['rotation'] == expected
+    assert turned['skew'] == orientation['skew']
+    # Quarter turns are lossless, so the result matches the upright correction exactly
+    assert np.array_equal(corrected, image)
+
+
+def test_detection_ignores_blank_pages():
+    assert detect_orientation(np.full((300, 200), 255, np.uint8)) == {'rotation': 0, 'skew': 0.0}
@@ -0,0 +1,75 @@
+"""
+Tests for the batch receipt extraction in preprocess.py.
+
+OCR itself is replaced by a reader returning fixed lines, so the tests cover
+the preprocessing, extraction, workbook and dataset steps around it.
+
+Usage:
+    python -m pytest ML/preprocessing/test_preprocess.py
+"""
+
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('easyocr')
+pytest.importorskip('textblob')
+pytest.importorskip('pyarrow')
+pytest.importorskip('openpyxl')
+
+import numpy as np
+
+from odoo.ML.preprocessing import preprocess
+from odoo.ML.preprocessing.expense_dataset import read_dataset
+
+RECEIPT_LINES = ['ACME CAFE', '12 Main Street', 'Date: 03/02/2026', 'Coffee x 1 4.50', 'Total 4.50']
+
+
+class FakeReader:
+    def __init__(self, *args, **kwargs):
+        self.images = []
+
+    def readtext(self, image, **kwargs):
+        self.images.append(image)
+        return RECEIPT_LINES
+
+
+@pytest.fixture
+def receipt_dir(tmp_path):
+    directory = tmp_path / 'images'
+    directory.mkdir()
+    cv2.imwrite(str(directory / 'receipt.jpg'), np.full((64, 48, 3), 255, np.uint8))
+    return directory
+
+
+@pytest.fixture(autouse=True)
+def fake_ocr(monkeypatch):
+    monkeypatch.setattr(preprocess.easyocr, 'Reader', FakeReader)
+
+
+def test_extract_text_returns_raw_and_corrected_text(receipt_dir, monkeypatch):
+    monkeypatch.setattr(preprocess, 'correct_text', str.upper)
+    reader = FakeReader()
+    raw_text, corrected_text = preprocess.extract_text_from_image(str(receipt_dir / 'receipt.jpg'), reader)
+    assert raw_text == '\n'.join(RECEIPT_LINES)
+    assert corrected_text == raw_text.upper()
+    # The reader gets the preprocessed (single channel) image
+    assert reader.images[0].ndim == 2
+
+
+def test_process_receipts_appends_to_dataset(receipt_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocess, 'correct_text', lambda text: text)
+    dataset_dir = tmp_path / 'dataset'
+
+    preprocess.process_receipts(str(receipt_dir), str(tmp_path / 'receipts.xlsx'), str(dataset_dir))
+
+    assert (tmp_path / 'receipts.xlsx').exists()
+    assert [path.name for path in dataset_dir.iterdir()] == ['month=2026-02']
+    frame = read_dataset(str(dataset_dir))
+    assert len(frame) == 1
+    record = frame.iloc[0]
+    assert record['source'] == 'batch'
+    assert record['source_file'] == 'receipt.jpg'
+    assert record['merchant'] == 'ACME CAFE'
+    assert record['amount'] == 4.5
+    assert str(record['date']) == '2026-02-03'
+    assert [item['description'] for item in record['items']] == ['Coffee']
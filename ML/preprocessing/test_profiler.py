@@ -0,0 +1,58 @@
+"""
+Tests for on-demand request profiling and the profile download endpoint.
+
+Usage:
+    python -m pytest ML/preprocessing/test_profiler.py
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+TOKEN = 'profile-secret'
+
+
+@pytest.fixture
+def profiling(tmp_path, service, monkeypatch):
+    monkeypatch.setitem(service.app.config, 'REPORTS_FOLDER', str(tmp_path / 'reports'))
+    monkeypatch.setitem(service.app.config, 'PROFILE_TOKEN', TOKEN)
+    monkeypatch.setitem(service.app.config, 'PROFILE_INTERVAL', 0.001)
+
+    def slow_lookup(report_id, format):
+        time.sleep(0.05)
+        return None
+
+    monkeypatch.setattr(service, 'find_report_path', slow_lookup)
+    return service
+
+
+def test_profiled_request_writes_a_profile_that_the_route_serves(profiling, tmp_path):
+    client = profiling.app.test_client()
+    response = client.get('/api/report/r1.json', headers={'X-Profile-Token': TOKEN})
+    assert response.status_code == 404
+    link = response.headers['X-Profile']
+    profile_id = link.rsplit('/', 1)[1].split('.')[0]
+
+    profiles = tmp_path / 'reports' / 'profiles'
+    assert sorted(os.listdir(profiles)) == [f"{profile_id}.folded", f"{profile_id}.json"]
+    folded = (profiles / f"{profile_id}.folded").read_text()
+    assert 'slow_lookup' in folded
+
+    served = client.get(link, headers={'X-Profile-Token': TOKEN})
+    assert served.status_code == 200
+    assert served.get_data(as_text=True) == folded
+    metadata = client.get(f"/api/profile/{profile_id}.json?profile={TOKEN}").get_json()
+    assert metadata == json.loads((profiles / f"{profile_id}.json").read_text())
+    assert metadata['endpoint'] == 'get_report' and metadata['report_id'] == 'r1'
+    assert metadata['samples'] > 0
+
+
+def test_profiles_need_the_token(profiling, tmp_path):
+    client = profiling.app.test_client()
+    response = client.get('/api/report/r1.json')
+    assert 'X-Profile' not in response.headers
+    assert not (tmp_path / 'reports' / 'profiles').exists()
+    assert client.get(f"/api/profile/{'0' * 32}.folded").status_code == 403
+    assert client.get(f"/api/profile/{'0' * 32}.folded", headers={'X-Profile-Token': TOKEN}).status_code == 404
@@ -0,0 +1,151 @@
+"""
+Tests for compressed JSON report storage and serving.
+
+Usage:
+    python -m pytest ML/preprocessing/test_report_codec.py
+"""
+
+import gzip
+import io
+import json
+import zlib
+
+import pytest
+
+from odoo.ML.preprocessing import report_codec
+from odoo.ML.preprocessing.report_generator import ReportGenerator
+from odoo.ML.preprocessing.storage import LocalStorage
+
+REPORT_ID = 'f3b2c1d0-0000-4000-8000-000000000001'
+REPORT = {'report_id': REPORT_ID, 'status': 'processed', 'expense_data': {'merchant': 'Café Nord', 'amount': 12.5}}
+
+
+def _encodings():
+    encodings = ['gzip']
+    try:
+        report_codec._zstandard()
+        encodings.append('zstd')
+    except RuntimeError:
+        pass
+    return encodings
+
+
+def _decode_single_member(body: bytes, encoding: str) -> bytes:
+    # What clients that stop after the first member / frame see
+    if encoding == 'gzip':
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decoder.decompress(body)
+        assert decoder.eof and decoder.unused_data == b''
+        return data
+    return report_codec._zstandard().ZstdDecompressor().decompressobj().decompress(body)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(roots={'json': str(tmp_path / 'json'), 'xlsx': str(tmp_path / 'xlsx')},
+                        legacy_dirs={'json': [str(tmp_path)]})
+
+
+@pytest.mark.parametrize('encoding', [None] + _encodings())
+def test_compress_round_trip(encoding):
+    data = json.dumps(REPORT).encode('utf-8')
+    compressed = report_codec.compress(data, encoding)
+    assert report_codec.decompress(compressed, encoding) == data
+    assert report_codec.peek(compressed, encoding, 10) == data[:10]
+
+
+def test_report_name_and_encoding():
+    assert report_codec.report_name('abc', 'gzip') == 'abc.json.gz'
+    assert report_codec.report_name('abc', None) == 'abc.json'
+    assert report_codec.encoding_of('x/abc.json.zst') == 'zstd'
+    assert report_codec.encoding_of('x/abc.json') is None
+
+
+@pytest.mark.parametrize('header, encoding, accepted', [
+    ('gzip, deflate, br', 'gzip', True),
+    ('x-gzip', 'gzip', True),
+    ('gzip;q=0', 'gzip', False),
+    ('*;q=0.5', 'zstd', True),
+    ('*, zstd;q=0', 'zstd', False),
+    ('identity', 'gzip', False),
+    (None, 'gzip', False),
+])
+def test_accepts_encoding(header, encoding, accepted):
+    assert report_codec.accepts_encoding(header, encoding) is accepted
+
+
+@pytest.mark.parametrize('encoding', _encodings())
+def test_stored_report_is_one_complete_member(storage, tmp_path, encoding):
+    generator = ReportGenerator(base_dir=str(tmp_path), storage=storage, compression=encoding)
+    path = generator.write_json_report(REPORT_ID, REPORT)
+
+    with open(path, 'rb') as f:
+        stored = f.read()
+    document = json.loads(_decode_single_member(stored, encoding))
+    assert document == {'status': 'success', 'report_id': REPORT_ID, 'data': REPORT}
+    assert report_codec.is_enveloped(stored, encoding)
+    assert report_codec.read_report(path) == REPORT
+
+
+@pytest.mark.parametrize('encoding', _encodings())
+def test_report_download_decodes_in_http_clients(service, storage, tmp_path, monkeypatch, encoding):
+    urllib3 = pytest.importorskip('urllib3')
+    requests = pytest.importorskip('requests')
+    monkeypatch.setattr(service, 'storage', storage)
+    monkeypatch.setitem(service.app.config, 'REPORT_COMPRESSION', encoding)
+    ReportGenerator(base_dir=str(tmp_path), storage=storage, compression=encoding).write_json_report(
+        REPORT_ID, REPORT)
+
+    response = service.app.test_client().get(
+        f'/api/report/{REPORT_ID}.json', headers={'Accept-Encoding': encoding})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == encoding
+    body = response.get_data()
+    expected = {'status': 'success', 'report_id': REPORT_ID, 'data': REPORT}
+
+    assert json.loads(_decode_single_member(body, encoding)) == expected
+    if encoding == 'zstd' and not getattr(urllib3.response, 'HAS_ZSTD', False):
+        pytest.skip('this urllib3 cannot decode zstd')
+    raw = urllib3.HTTPResponse(body=io.BytesIO(body), headers=dict(response.headers),
+                               status=200, preload_content=False)
+    decoded = requests.adapters.HTTPAdapter().build_response(
+        requests.Request('GET', f'http://test/api/report/{REPORT_ID}.json').prepare(), raw)
+    assert decoded.json() == expected
+
+
+def test_report_download_without_accepted_encoding(service, storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(service, 'storage', storage)
+    ReportGenerator(base_dir=str(tmp_path), storage=storage, compression='gzip').write_json_report(
+        REPORT_ID, REPORT)
+
+    response = service.app.test_client().get(f'/api/report/{REPORT_ID}.json', headers={'Accept-Encoding': 'br'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == {'status': 'success', 'report_id': REPORT_ID, 'data': REPORT}
+
+
+def test_reports_stored_before_the_envelope_are_wrapped(service, storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(service, 'storage', storage)
+    # A flat, uncompressed report from before sharding and compression
+    (tmp_path / f'{REPORT_ID}.json').write_text(json.dumps(REPORT), encoding='utf-8')
+    response = service.app.test_client().get(f'/api/report/{REPORT_ID}.json', headers={'Accept-Encoding': 'gzip'})
+    assert response.get_json() == {'status': 'success', 'report_id': REPORT_ID, 'data': REPORT}
+
+    # A compressed report written without the envelope
+    with storage.writer('json', report_codec.report_name('other', 'gzip')) as path:
+        with open(path, 'wb') as f:
+            f.write(gzip.compress(json.dumps(REPORT).encode('utf-8')))
+    body, headers = service.build_report_json('other', storage.find('json', 'other.json.gz'), 'gzip')
+    assert 'Content-Encoding' not in headers
+    assert json.loads(body)['data'] == REPORT
+
+
+def test_find_any_lists_the_shard_once(storage, monkeypatch):
+    names = [report_codec.report_name(REPORT_ID, encoding) for encoding in ['zstd', 'gzip', None]]
+    with storage.writer('json', names[1]) as path:
+        open(path, 'wb').close()
+
+    calls = []
+    monkeypatch.setattr('os.listdir', lambda path, _listdir=__import__('os').listdir: calls.append(path) or _listdir(path))
+    assert storage.find_any('json', names, legacy_names=names[2:]) == storage.path('json', names[1])
+    assert len(calls) == 1
+    assert storage.find_any('json', ['missing.json.gz', 'missing.json'], legacy_names=['missing.json']) is None
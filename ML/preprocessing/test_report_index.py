@@ -0,0 +1,200 @@
+"""
+Tests for the SQLite report index.
+
+Usage:
+    python -m pytest ML/preprocessing/test_report_index.py
+"""
+
+import itertools
+
+import pytest
+
+from odoo.ML.preprocessing.report_index import RANGE_FILTER_SORTS, SORT_KEYS, ReportIndex
+
+CATEGORIES = ['Meals', 'Travel', 'Office']
+MERCHANTS = ['Coffee House', 'Rail Co', 'Paper Mill', 'Hotel Nord']
+
+
+@pytest.fixture
+def report_index(tmp_path):
+    index = ReportIndex(str(tmp_path / 'index.sqlite3'))
+    for n in range(300):
+        index.add({
+            'report_id': f"r{n:03d}",
+            'uploaded_at': f"2026-03-01T00:{n // 60:02d}:{n % 60:02d}",
+            'merchant': MERCHANTS[n % len(MERCHANTS)],
+            'date': f"2026-02-{n % 28 + 1:02d}",
+            'amount': round(5 + n * 0.37, 2),
+            'currency': 'USD',
+            'category': CATEGORIES[n % len(CATEGORIES)],
+        })
+    return index
+
+
+class RecordingConnection:
+    """Passes statements to a connection and keeps them"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, list(params)))
+        return self.connection.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+def list_plan(report_index, monkeypatch, **kwargs):
+    connection = report_index._connect()
+    recording = RecordingConnection(connection)
+    monkeypatch.setattr(report_index, '_connect', lambda: recording)
+    report_index.list(**kwargs)
+    monkeypatch.undo()
+    sql, params = recording.statements[-1]
+    return [row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def supported_listings():
+    equality = [{}, {'category': 'Travel'}, {'merchant': 'coffee house'},
+                {'category': 'Travel', 'merchant': 'Rail Co'}]
+    ranges = {'date': {'date_from': '2026-02-03', 'date_to': '2026-02-20'},
+              'amount': {'min_amount': 10, 'max_amount': 80}}
+    for sort, filters, descending in itertools.product(SORT_KEYS, equality, [True, False]):
+        yield dict(sort=sort, descending=descending, **filters)
+        if sort in ranges:
+            yield dict(sort=sort, descending=descending, **filters, **ranges[sort])
+
+
+@pytest.mark.parametrize('kwargs', list(supported_listings()), ids=repr)
+def test_filtered_listings_walk_an_index(report_index, monkeypatch, kwargs):
+    first = report_index.list(limit=5, **kwargs)
+    assert first['next_cursor']
+    for cursor in [None, first['next_cursor']]:
+        plan = ' | '.join(list_plan(report_index, monkeypatch, limit=5, cursor=cursor, **kwargs))
+        assert 'TEMP B-TREE' not in plan
+        assert 'USING INDEX' in plan or 'USING COVERING INDEX' in plan
+
+
+@pytest.mark.parametrize('sort', SORT_KEYS)
+@pytest.mark.parametrize('name, value', [('date_from', '2026-02-01'), ('date_to', '2026-02-28'),
+                                         ('min_amount', 1.0), ('max_amount', 100.0)])
+def test_range_filters_need_their_sort_key(report_index, sort, name, value):
+    if RANGE_FILTER_SORTS[name] == sort:
+        assert report_index.list(sort=sort, **{name: value})['reports']
+    else:
+        with pytest.raises(ValueError, match=f"{name} needs sort="):
+            report_index.list(sort=sort, **{name: value})
+
+
+def test_merchant_filter_is_case_insensitive(report_index):
+    reports = report_index.list(limit=200, merchant='COFFEE HOUSE')['reports']
+    assert len(reports) == 75
+    assert {report['merchant'] for report in reports} == {'Coffee House'}
+
+
+@pytest.mark.parametrize('sort', SORT_KEYS)
+@pytest.mark.parametrize('descending', [True, False])
+def test_keyset_pages_cover_every_report_once(report_index, sort, descending):
+    seen, cursor = [], None
+    while True:
+        page = report_index.list(limit=7, cursor=cursor, sort=sort, descending=descending)
+        seen.extend(page['reports'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == 300
+    keys = [(report[sort], report['report_id']) for report in seen]
+    assert keys == sorted(keys, reverse=descending)
+
+
+def test_pages_are_stable_while_reports_are_added(report_index):
+    first = report_index.list(limit=10)
+    # Newer than every listed report, so it belongs before the first page
+    report_index.add({'report_id': 'new', 'uploaded_at': '2026-03-02T00:00:00'})
+    second = report_index.list(limit=10, cursor=first['next_cursor'])
+    first_ids = [report['report_id'] for report in first['reports']]
+    second_ids = [report['report_id'] for report in second['reports']]
+    assert 'new' not in second_ids
+    assert not set(first_ids) & set(second_ids)
+    assert second_ids[0] == 'r289'
+
+
+def test_malformed_cursor_is_rejected(report_index):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        report_index.list(cursor='not-a-cursor')
+
+
+@pytest.fixture
+def searchable(tmp_path):
+    index = ReportIndex(str(tmp_path / 'search.sqlite3'))
+    texts = {
+        'a': {'merchant': 'Blue Bottle Coffee', 'category': 'Meals', 'items': 'Latte',
+              'raw_text': 'BLUE BOTTLE COFFEE\nLatte 4.50\nINV-0042'},
+        'b': {'merchant': 'Office Depot', 'category': 'Office', 'items': 'Paper\nCoffee filters',
+              'raw_text': 'OFFICE DEPOT\nPaper 9.99\nCoffee filters 3.49'},
+        'c': {'merchant': 'Café Crème', 'category': 'Meals', 'items': 'Croissant',
+              'raw_text': 'CAFE CREME\nCroissant 2.10'},
+    }
+    for report_id, text in texts.items():
+        index.add({'report_id': report_id, 'uploaded_at': '2026-03-01', 'merchant': text['merchant']}, text)
+    return index
+
+
+def ids(result):
+    return [report['report_id'] for report in result['reports']]
+
+
+def test_search_ranks_merchant_matches_first(searchable):
+    result = searchable.search('coffee')
+    # The merchant column weighs more than an item description
+    assert ids(result) == ['a', 'b']
+    assert '[' in result['reports'][0]['snippet']
+
+
+def test_search_matches_every_word_prefixes_and_accents(searchable):
+    assert ids(searchable.search('coffee paper')) == ['b']
+    assert ids(searchable.search('croiss*')) == ['c']
+    assert ids(searchable.search('creme')) == ['c']
+    # Query syntax in the input is searched as text
+    assert ids(searchable.search('INV-0042')) == ['a']
+    assert ids(searchable.search('"')) == []
+
+
+def test_search_pages_by_offset(searchable):
+    first = searchable.search('coffee', limit=1)
+    assert ids(first) == ['a'] and first['next_offset'] == 1
+    second = searchable.search('coffee', limit=1, offset=first['next_offset'])
+    assert ids(second) == ['b'] and second['next_offset'] is None
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_similar_images_finds_every_hash_within_the_distance(report_index):
+    base = int('8f3c5a5a00fff00f' * 4, 16)
+    # Bits spread over the 16-bit bands, so no single band holds all the differences
+    stored = {
+        'same': base,
+        'near': flip(base, *range(1, 256, 32)),
+        'edge': flip(base, *range(0, 256, 16), *range(1, 240, 16)),
+        'far': flip(base, *range(0, 256, 5)),
+    }
+    for report_id, value in stored.items():
+        report_index.add_image_hash(report_id, value)
+
+    assert report_index.similar_images(base, 31) == [
+        {'report_id': 'same', 'distance': 0},
+        {'report_id': 'near', 'distance': 8},
+        {'report_id': 'edge', 'distance': 31},
+    ]
+    assert [match['report_id'] for match in report_index.similar_images(base, 8)] == ['same', 'near']
+    assert report_index.similar_images(base, 31, limit=1) == [{'report_id': 'same', 'distance': 0}]
+    # Replacing a hash drops the old one's band keys
+    report_index.add_image_hash('same', stored['far'])
+    report_index.remove('near')
+    assert [match['report_id'] for match in report_index.similar_images(base, 31)] == ['edge']
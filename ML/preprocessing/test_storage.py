@@ -0,0 +1,117 @@
+"""
+Tests for sharded artifact storage and retention collection.
+
+Usage:
+    python -m pytest ML/preprocessing/test_storage.py
+"""
+
+import os
+import time
+
+import pytest
+
+from odoo.ML.preprocessing.storage import STALE_TEMP_SECONDS, LocalStorage, RetentionCollector
+
+DAY = 86400
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage({'json': str(tmp_path / 'json'), 'uploads': str(tmp_path / 'uploads')},
+                        legacy_dirs={'json': [str(tmp_path / 'old')]})
+
+
+def store(storage, kind, name, content=b'{}'):
+    with storage.writer(kind, name) as temp_path:
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+    return storage.path(kind, name)
+
+
+def test_encodings_of_a_report_share_a_shard(storage, tmp_path):
+    plain = storage.path('json', 'abc.json')
+    compressed = storage.path('json', 'abc.json.gz')
+    assert os.path.dirname(plain) == os.path.dirname(compressed)
+    shard = os.path.relpath(os.path.dirname(plain), tmp_path / 'json')
+    assert [len(part) for part in shard.split(os.sep)] == [2, 2]
+
+
+def test_writer_publishes_on_success_only(storage):
+    path = store(storage, 'json', 'abc.json', b'{"a": 1}')
+    assert storage.find('json', 'abc.json') == path
+    with pytest.raises(RuntimeError):
+        with storage.writer('json', 'def.json') as temp_path:
+            with open(temp_path, 'w') as f:
+                f.write('partial')
+            raise RuntimeError('render failed')
+    assert storage.find('json', 'def.json') is None
+    assert os.listdir(os.path.dirname(storage.path('json', 'def.json'))) in ([], ['abc.json'])
+
+
+def test_find_falls_back_to_flat_and_legacy_directories(storage, tmp_path):
+    (tmp_path / 'json').mkdir()
+    (tmp_path / 'old').mkdir()
+    (tmp_path / 'json' / 'flat.json').write_text('{}')
+    (tmp_path / 'old' / 'legacy.json').write_text('{}')
+    assert storage.find('json', 'flat.json') == str(tmp_path / 'json' / 'flat.json')
+    assert storage.find('json', 'legacy.json') == str(tmp_path / 'old' / 'legacy.json')
+    assert storage.find('json', 'missing.json') is None
+    assert storage.delete('json', 'legacy.json')
+    assert not storage.delete('json', 'legacy.json')
+
+
+def test_find_any_prefers_the_first_name_present(storage):
+    store(storage, 'json', 'abc.json.gz')
+    store(storage, 'json', 'abc.json.zst')
+    assert storage.find_any('json', ['abc.json.zst', 'abc.json.gz']).endswith('abc.json.zst')
+    assert storage.find_any('json', ['abc.json.br', 'abc.json.gz']).endswith('abc.json.gz')
+    assert storage.find_any('json', ['xyz.json.gz'], legacy_names=['xyz.json']) is None
+
+
+def test_scan_lists_sharded_and_flat_files(storage, tmp_path):
+    sharded = store(storage, 'json', 'abc.json')
+    (tmp_path / 'json' / 'flat.json').write_text('{}')
+    assert sorted(path for path, _ in storage.scan('json')) == sorted([sharded, str(tmp_path / 'json' / 'flat.json')])
+    assert list(storage.scan('uploads')) == []
+
+
+def age(path, seconds, now):
+    os.utime(path, (now - seconds, now - seconds))
+
+
+def test_retention_deletes_expired_artifacts_and_stale_temp_files(storage):
+    now = time.time()
+    old_report = store(storage, 'json', 'old.json')
+    new_report = store(storage, 'json', 'new.json')
+    old_upload = store(storage, 'uploads', 'old.jpg')
+    age(old_report, 10 * DAY, now)
+    age(new_report, DAY, now)
+    age(old_upload, 100 * DAY, now)
+    shard = os.path.dirname(new_report)
+    stale_temp = os.path.join(shard, '.new.1234abcd.tmp.json')
+    fresh_temp = os.path.join(shard, '.new.5678abcd.tmp.json')
+    for path in [stale_temp, fresh_temp]:
+        open(path, 'w').close()
+    age(stale_temp, STALE_TEMP_SECONDS + 60, now)
+
+    # Uploads are kept forever (0 days), but their temporary files would still go
+    collector = RetentionCollector(storage, {'json': 7, 'uploads': 0}, interval=3600)
+    assert collector.collect(now) == {'json': 2, 'uploads': 0}
+    assert not os.path.exists(old_report)
+    assert not os.path.exists(stale_temp)
+    assert os.path.exists(new_report)
+    assert os.path.exists(fresh_temp)
+    assert os.path.exists(old_upload)
+
+
+def test_only_one_collector_holds_the_lock(storage, tmp_path):
+    pytest.importorskip('fcntl')
+    lock_path = str(tmp_path / 'gc.lock')
+    first = RetentionCollector(storage, {'json': 1}, interval=3600, lock_path=lock_path)
+    second = RetentionCollector(storage, {'json': 1}, interval=3600, lock_path=lock_path)
+    with first._exclusive() as acquired:
+        assert acquired
+        with second._exclusive() as also_acquired:
+            assert not also_acquired
+    with second._exclusive() as acquired:
+        assert acquired
@@ -0,0 +1,91 @@
+"""
+Tests for structured logging: correlation ids and per-request sampling.
+
+Usage:
+    python -m pytest ML/preprocessing/test_structured_logging.py
+"""
+
+import json
+import logging
+import threading
+
+import pytest
+
+from odoo.ML.preprocessing import structured_logging
+from odoo.ML.preprocessing.structured_logging import configure_logging, set_correlation_id
+
+
+@pytest.fixture
+def capture(capsys):
+    """Configure logging to the captured stdout; returns a reader of the JSON records"""
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    listeners = []
+
+    def configure(**kwargs):
+        listeners.append(configure_logging(**kwargs))
+
+    def records():
+        listeners[-1].stop()
+        return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    configure.records = records
+    yield configure
+    if listeners[-1]._thread is not None:
+        listeners[-1].stop()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+    structured_logging._listener = structured_logging._queue_handler = None
+    set_correlation_id(None)
+
+
+def test_records_carry_the_correlation_id_of_their_context(capture):
+    capture(level='DEBUG')
+    logger = logging.getLogger('receipts.test')
+
+    set_correlation_id('r1')
+    logger.info("OCR complete", extra={'fields': {'tier': 'low_res'}})
+
+    def other_request():
+        set_correlation_id('r2')
+        logger.info("In another thread")
+
+    thread = threading.Thread(target=other_request)
+    thread.start()
+    thread.join()
+    logger.info("Back in the first request")
+    set_correlation_id(None)
+    logger.warning("Between requests")
+
+    records = capture.records()
+    assert [(record['message'], record['report_id']) for record in records] == [
+        ("OCR complete", 'r1'),
+        ("In another thread", 'r2'),
+        ("Back in the first request", 'r1'),
+        ("Between requests", None),
+    ]
+    assert records[0]['tier'] == 'low_res' and records[0]['logger'] == 'receipts.test'
+
+
+def test_sampling_keeps_whole_requests_and_every_warning(capture):
+    capture(level='DEBUG', sample_rate=0.5)
+    logger = logging.getLogger('receipts.test')
+    for n in range(400):
+        set_correlation_id(f"report-{n}")
+        logger.debug("Processing image")
+        logger.info("OCR complete")
+        logger.warning("Low confidence")
+
+    kept = {}
+    for record in capture.records():
+        kept.setdefault(record['level'], []).append(record['report_id'])
+    assert len(kept['WARNING']) == 400
+    # A sampled request keeps both its verbose records, any other keeps none
+    assert kept['DEBUG'] == kept['INFO']
+    assert 120 < len(kept['INFO']) < 280
+
+
+def test_importing_the_app_leaves_the_root_logger_alone(service):
+    assert structured_logging._listener is None
+    assert not any(isinstance(handler, structured_logging._NonBlockingQueueHandler)
+                   for handler in logging.getLogger().handlers)
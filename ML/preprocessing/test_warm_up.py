@@ -0,0 +1,65 @@
+"""
+Tests for warm-up and the readiness probe that starts it.
+
+Usage:
+    python -m pytest ML/preprocessing/test_warm_up.py
+"""
+
+import time
+
+import pytest
+
+
+@pytest.fixture
+def warm_up(service, monkeypatch):
+    """Warm-up that runs in the request, with the OCR and data loading stubbed"""
+    monkeypatch.setattr(service, 'warmup_state',
+                        {'started': False, 'done': False, 'error': None, 'elapsed_ms': None, 'attempts': 0})
+    monkeypatch.setattr(service, '_warmup_failed_at', None)
+    monkeypatch.setattr(service, 'start_warm_up', service.warm_up)
+    monkeypatch.setattr(service, 'ocr_process_pool', None)
+    monkeypatch.setattr(service, 'expense_duplicates', None)
+    monkeypatch.setattr(service, 'load_warmup_image', lambda: 'warm-up image')
+    monkeypatch.setattr(service, 'preprocess_image', lambda image, max_side=None: image)
+    monkeypatch.setattr(service, 'run_ocr', lambda image: ('WARM UP', 1.0))
+    monkeypatch.setattr(service.spend_analytics, 'refresh', lambda: None)
+    monkeypatch.setitem(service.app.config, 'WARMUP_RETRY_SECONDS', 60)
+    return service
+
+
+def readiness(service):
+    response = service.app.test_client().get('/api/health/ready')
+    return response.get_json()['warmup']
+
+
+def test_failed_warm_up_is_retried_after_the_backoff(warm_up, monkeypatch):
+    failures = ['models not downloaded yet']
+
+    def preload_models():
+        if failures:
+            raise RuntimeError(failures.pop())
+
+    monkeypatch.setattr(warm_up, 'preload_models', preload_models)
+
+    state = readiness(warm_up)
+    assert state['error'] == 'models not downloaded yet'
+    assert not state['done'] and state['attempts'] == 1
+
+    # Still within the first 60s delay
+    assert readiness(warm_up)['attempts'] == 1
+
+    monkeypatch.setattr(warm_up, '_warmup_failed_at', time.monotonic() - 61)
+    state = readiness(warm_up)
+    assert state['done'] and state['error'] is None
+    assert state['attempts'] == 2
+    # A finished warm-up is never started again
+    assert not warm_up.warm_up_due()
+
+
+def test_retry_delay_doubles_per_failure(warm_up, monkeypatch):
+    warm_up.warmup_state.update(started=True, error='failed', attempts=3)
+    monkeypatch.setattr(warm_up, '_warmup_failed_at', time.monotonic() - 200)
+    # 60s, 120s, then 240s
+    assert not warm_up.warm_up_due()
+    monkeypatch.setattr(warm_up, '_warmup_failed_at', time.monotonic() - 241)
+    assert warm_up.warm_up_due()